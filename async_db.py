@@ -0,0 +1,129 @@
+"""Async storage API for handlers, the scheduler and persistence.
+
+The functions below are the storage backend interface. With the default
+SQLite backend they mirror database.py: SQLite calls are blocking, so each
+one is handed to a worker thread instead of running on the event loop.
+Writes go through a single writer thread (SQLite only allows one writer
+anyway); reads use a small pool of reader threads, which WAL mode lets run
+while a write is in progress. Each thread keeps its own long-lived
+connection from database.get_connection().
+
+With DATABASE_BACKEND=postgres the same names come from postgres_db.py
+instead. run_read/run_write always refer to the SQLite threads. With
+metrics enabled every function is timed (see metrics.timed_db).
+"""
+import asyncio
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+
+import database as db
+import metrics
+from config import DATABASE_BACKEND
+
+READER_THREADS = 4
+
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+_readers = ThreadPoolExecutor(max_workers=READER_THREADS, thread_name_prefix="db-reader")
+
+
+async def run_write(fn, *args, **kwargs):
+    """Run a blocking database function on the writer thread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_writer, functools.partial(fn, *args, **kwargs))
+
+
+async def run_read(fn, *args, **kwargs):
+    """Run a blocking, read-only database function on a reader thread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_readers, functools.partial(fn, *args, **kwargs))
+
+
+def _writes(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run_write(fn, *args, **kwargs)
+    return wrapper
+
+
+def _reads(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run_read(fn, *args, **kwargs)
+    return wrapper
+
+
+init_db = _writes(db.init_db)
+create_user = _writes(db.create_user)
+set_can_dm = _writes(db.set_can_dm)
+update_reminder_time = _writes(db.update_reminder_time)
+set_timezone = _writes(db.set_timezone)
+set_locale = _writes(db.set_locale)
+refresh_utc_offsets = _writes(db.refresh_utc_offsets)
+set_admin = _writes(db.set_admin)
+save_progress = _writes(db.save_progress)
+set_setting = _writes(db.set_setting)
+create_broadcast = _writes(db.create_broadcast)
+set_broadcast_status_message = _writes(db.set_broadcast_status_message)
+record_broadcast_deliveries = _writes(db.record_broadcast_deliveries)
+finish_broadcast = _writes(db.finish_broadcast)
+save_persisted_state = _writes(db.save_persisted_state)
+archive_progress = _writes(db.archive_progress)
+vacuum_step = _writes(db.vacuum_step)
+claim_reminders = _writes(db.claim_reminders)
+claim_nudges = _writes(db.claim_nudges)
+release_reminders = _writes(db.release_reminders)
+release_pending_reminders = _writes(db.release_pending_reminders)
+release_nudges = _writes(db.release_nudges)
+record_reminder_outcomes = _writes(db.record_reminder_outcomes)
+prune_reminder_log = _writes(db.prune_reminder_log)
+
+get_users_for_reminders = _reads(db.get_users_for_reminders)
+get_users_due_for_reminder = _reads(db.get_users_due_for_reminder)
+get_reminder_minutes = _reads(db.get_reminder_minutes)
+get_user = _reads(db.get_user)
+get_all_users = _reads(db.get_all_users)
+get_timezones = _reads(db.get_timezones)
+get_today_progress = _reads(db.get_today_progress)
+get_weekly_stats = _reads(db.get_weekly_stats)
+get_monthly_stats = _reads(db.get_monthly_stats)
+get_windowed_stats = _reads(db.get_windowed_stats)
+get_all_users_weekly_stats = _reads(db.get_all_users_weekly_stats)
+# Also moves the rollup window forward, a short write once a day
+get_all_users_stats = _reads(db.get_all_users_stats)
+get_today_all_progress = _reads(db.get_today_all_progress)
+get_setting = _reads(db.get_setting)
+get_unfinished_broadcasts = _reads(db.get_unfinished_broadcasts)
+get_pending_broadcast_recipients = _reads(db.get_pending_broadcast_recipients)
+get_broadcast_counts = _reads(db.get_broadcast_counts)
+load_persisted_user_data = _reads(db.load_persisted_user_data)
+load_persisted_conversations = _reads(db.load_persisted_conversations)
+
+
+async def shutdown() -> None:
+    """Stop the worker threads and close their connections."""
+    _writer.shutdown(wait=True)
+    _readers.shutdown(wait=True)
+    db.close_all_connections()
+
+
+if DATABASE_BACKEND == "postgres":
+    from postgres_db import (  # noqa: F811
+        init_db, create_user, set_can_dm, update_reminder_time, set_admin, save_progress,
+        set_setting, create_broadcast, set_broadcast_status_message,
+        record_broadcast_deliveries, finish_broadcast, save_persisted_state,
+        get_users_for_reminders, get_users_due_for_reminder, get_user, get_all_users,
+        get_today_progress, get_weekly_stats, get_monthly_stats, get_windowed_stats,
+        get_all_users_weekly_stats, get_all_users_stats, get_today_all_progress,
+        get_setting, get_unfinished_broadcasts, get_pending_broadcast_recipients,
+        get_broadcast_counts, load_persisted_user_data, load_persisted_conversations,
+        archive_progress, vacuum_step, set_timezone, set_locale, get_timezones, refresh_utc_offsets,
+        get_reminder_minutes, claim_reminders, claim_nudges, record_reminder_outcomes, prune_reminder_log,
+        release_reminders, release_pending_reminders, release_nudges,
+        shutdown,
+    )
+
+if metrics.ENABLED:
+    for _name, _fn in list(globals().items()):
+        if inspect.iscoroutinefunction(_fn) and not _name.startswith("_") and _name not in ("run_read", "run_write"):
+            globals()[_name] = metrics.timed_db(_fn)
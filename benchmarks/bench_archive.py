@@ -0,0 +1,131 @@
+"""Archival of old daily progress: lock hold time, file size, correctness.
+
+Fills a database with history, archives everything older than
+--keep-days (ARCHIVE_AFTER_DAYS) in batches as the nightly job does, then
+releases the freed pages with vacuum_step. Reports the longest single
+batch (how long the write lock is held), the file size before and after,
+and checks that every sampled user's 7/30/365-day and all-time stats are
+unchanged. Then checks that an export still adds up to those all-time
+stats, and that importing it back changes nothing.
+
+Usage: python benchmarks/bench_archive.py [--users N] [--days D] [--keep-days K]
+"""
+import argparse
+import os
+import random
+from collections import defaultdict
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+_tmpdir = tempfile.mkdtemp(prefix="teabot-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "bench.db")
+
+import database as db  # noqa: E402
+import progress_io  # noqa: E402
+from config import DATABASE_PATH  # noqa: E402
+
+WINDOWS = (7, 30, 365, None)
+
+
+def seed(users: int, days: int) -> None:
+    rng = random.Random(0)
+    start = date.today() - timedelta(days=days - 1)
+    db.import_progress(
+        (100_000 + u, (start + timedelta(days=d)).isoformat(),
+         rng.randint(0, 20), rng.randint(0, 500), rng.randint(0, 1), rng.randint(0, 30), rng.randint(0, 1))
+        for u in range(users) for d in range(days)
+    )
+
+
+def export_totals(path: str) -> dict[int, dict]:
+    """All-time totals by telegram_id, from an export of days and archived months."""
+    totals = defaultdict(lambda: dict.fromkeys(("quran_pages", "salawat_count", "tahajjud_days",
+                                                "book_pages", "fasting_days", "days_logged"), 0))
+    with open(path, newline="", encoding="utf-8") as file:
+        for row in progress_io.read_rows(file, "csv"):
+            t = totals[row[0]]
+            t["quran_pages"] += row[2]
+            t["salawat_count"] += row[3]
+            t["tahajjud_days"] += row[4]
+            t["book_pages"] += row[5]
+            t["fasting_days"] += row[6]
+            t["days_logged"] += row[7] if len(row) == len(progress_io.ARCHIVE_FIELDS) else 1
+    return totals
+
+
+def file_size() -> int:
+    with db.get_connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return sum(
+        os.path.getsize(DATABASE_PATH + suffix)
+        for suffix in ("", "-wal") if os.path.exists(DATABASE_PATH + suffix)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=1000)
+    parser.add_argument("--keep-days", type=int, default=400, help="days kept row by row, as ARCHIVE_AFTER_DAYS")
+    args = parser.parse_args()
+
+    db.init_db()
+    with db.get_connection() as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2, "new database is not INCREMENTAL"
+    seed(args.users, args.days)
+    telegram_ids = {u.id: u.telegram_id for u in db.get_all_users()}
+    sample = random.Random(1).sample(list(telegram_ids), 50)
+    expected = {user_id: db.get_windowed_stats(user_id, WINDOWS) for user_id in sample}
+    size_before = file_size()
+
+    before = date.today() - timedelta(days=args.keep_days)
+    batches = []
+    start = time.perf_counter()
+    while True:
+        t = time.perf_counter()
+        moved = db.archive_progress(before)
+        if not moved:
+            break
+        batches.append(time.perf_counter() - t)
+    archive_time = time.perf_counter() - start
+    archived = (args.days - args.keep_days) * args.users
+    print(
+        f"archived {archived} of {args.users * args.days} rows in {len(batches)} batches, "
+        f"{archive_time:.1f}s; longest batch {max(batches) * 1000:.1f} ms"
+    )
+
+    steps = []
+    start = time.perf_counter()
+    while True:
+        t = time.perf_counter()
+        left = db.vacuum_step()
+        steps.append(time.perf_counter() - t)
+        if not left:
+            break
+    print(
+        f"vacuum: {len(steps)} steps, {time.perf_counter() - start:.1f}s, longest {max(steps) * 1000:.1f} ms; "
+        f"file {size_before / 2**20:.1f} MiB -> {file_size() / 2**20:.1f} MiB"
+    )
+
+    mismatched = [u for u in sample if db.get_windowed_stats(u, WINDOWS) != expected[u]]
+    print("stats unchanged" if not mismatched else f"{len(mismatched)} users' stats changed")
+
+    export_path = os.path.join(_tmpdir, "export.csv")
+    exported = progress_io.export_file(export_path, "csv")
+    totals = export_totals(export_path)
+    uncovered = [u for u in sample if totals[telegram_ids[u]] != expected[u][None]]
+    print(f"export: {exported} rows" + (f", {len(uncovered)} users' totals missing" if uncovered else ", covers all-time stats"))
+    with open(export_path, newline="", encoding="utf-8") as file:
+        progress_io.import_progress(file, "csv")
+    reimported = [u for u in sample if db.get_windowed_stats(u, WINDOWS) != expected[u]]
+    print("re-import unchanged" if not reimported else f"re-import changed {len(reimported)} users' stats")
+    db.close_all_connections()
+    sys.exit(1 if mismatched or uncovered or reimported else 0)
+
+
+if __name__ == "__main__":
+    main()
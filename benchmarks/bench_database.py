@@ -0,0 +1,95 @@
+"""Throughput of the public database functions, per-call vs pooled connections.
+
+Usage: python benchmarks/bench_database.py [--users N] [--seconds S]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+_tmpdir = tempfile.mkdtemp(prefix="teabot-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "bench.db")
+
+import database as db  # noqa: E402
+
+pooled_connection = db.get_connection
+
+
+@contextmanager
+def per_call_connection():
+    """The original behaviour: connect and close around every call."""
+    conn = sqlite3.connect(db.DATABASE_PATH)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def seed(users: int) -> list[int]:
+    ids = []
+    today = date.today()
+    for i in range(users):
+        user = db.create_user(telegram_id=1_000_000 + i, username=f"user{i}", can_dm=True)
+        ids.append(user.id)
+        for d in range(30):
+            db.save_progress(user.id, today - timedelta(days=d), i % 20, 100, d % 2 == 0, 5, False)
+    db.set_setting("current_book", "Benchmark")
+    return ids
+
+
+def workloads(user_ids: list[int]):
+    n = len(user_ids)
+    today = date.today()
+    return {
+        "get_user": lambda i: db.get_user(1_000_000 + i % n),
+        "get_setting": lambda i: (db.clear_settings_cache(), db.get_setting("current_book")),
+        "get_today_progress": lambda i: db.get_today_progress(user_ids[i % n]),
+        "get_weekly_stats": lambda i: db.get_weekly_stats(user_ids[i % n]),
+        "get_monthly_stats": lambda i: db.get_monthly_stats(user_ids[i % n]),
+        "save_progress": lambda i: db.save_progress(user_ids[i % n], today, i % 20, 100, True, 5, False),
+        "update_reminder_time": lambda i: db.update_reminder_time(1_000_000 + i % n, "20:00"),
+    }
+
+
+def measure(fn, seconds: float) -> float:
+    count = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        fn(count)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    db.init_db()
+    user_ids = seed(args.users)
+    # Measure the queries themselves, not the in-memory caches in front of them
+    db.USER_CACHE_SIZE = 0
+    db.clear_user_cache()
+
+    print(f"{'function':<24}{'per-call ops/s':>16}{'pooled ops/s':>16}{'speedup':>10}")
+    for name, fn in workloads(user_ids).items():
+        db.get_connection = per_call_connection
+        before = measure(fn, args.seconds)
+        db.get_connection = pooled_connection
+        after = measure(fn, args.seconds)
+        print(f"{name:<24}{before:>16,.0f}{after:>16,.0f}{after / before:>9.1f}x")
+
+    db.close_connection()
+
+
+if __name__ == "__main__":
+    main()
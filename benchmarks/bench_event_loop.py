@@ -0,0 +1,99 @@
+"""Latency of concurrent /today lookups while a slow write is in flight.
+
+Runs the same scenario twice: with the write done inline on the event loop
+(how the handlers used to call database.py) and through async_db. Exits
+non-zero if the async path still lets the write delay the reads.
+
+Usage: python benchmarks/bench_event_loop.py [--write-seconds S]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+_tmpdir = tempfile.mkdtemp(prefix="teabot-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "bench.db")
+
+import async_db  # noqa: E402
+import database as db  # noqa: E402
+
+TELEGRAM_ID = 1_000_000
+READERS = 20
+
+
+def slow_write(user_id: int, seconds: float) -> None:
+    """Hold the write lock for `seconds`, like a save_progress stuck on fsync."""
+    with db.get_connection() as conn:
+        conn.execute(
+            "UPDATE daily_progress SET quran_pages = quran_pages + 1 WHERE user_id = ?",
+            (user_id,)
+        )
+        time.sleep(seconds)
+        conn.commit()
+
+
+async def today_lookup_async(started: float) -> float:
+    user = await async_db.get_user(TELEGRAM_ID)
+    await async_db.get_today_progress(user.id)
+    await async_db.get_setting("current_book")
+    return time.perf_counter() - started
+
+
+async def today_lookup_blocking(started: float) -> float:
+    user = db.get_user(TELEGRAM_ID)
+    db.get_today_progress(user.id)
+    db.get_setting("current_book")
+    return time.perf_counter() - started
+
+
+async def blocking_scenario(user_id: int, seconds: float) -> list[float]:
+    async def writer():
+        slow_write(user_id, seconds)
+
+    started = time.perf_counter()
+    write_task = asyncio.create_task(writer())
+    latencies = await asyncio.gather(*(today_lookup_blocking(started) for _ in range(READERS)))
+    await write_task
+    return list(latencies)
+
+
+async def async_scenario(user_id: int, seconds: float) -> list[float]:
+    started = time.perf_counter()
+    write_task = asyncio.create_task(async_db.run_write(slow_write, user_id, seconds))
+    latencies = await asyncio.gather(*(today_lookup_async(started) for _ in range(READERS)))
+    await write_task
+    return list(latencies)
+
+
+async def main_async(seconds: float) -> int:
+    user = db.create_user(telegram_id=TELEGRAM_ID, username="bench", can_dm=True)
+    db.save_progress(user.id, date.today(), 1, 1, True, 1, False)
+    db.set_setting("current_book", "Benchmark")
+
+    blocking = await blocking_scenario(user.id, seconds)
+    concurrent = await async_scenario(user.id, seconds)
+
+    print(f"slow write: {seconds * 1000:.0f} ms, {READERS} concurrent /today lookups")
+    print(f"inline database calls: worst reply after {max(blocking) * 1000:.1f} ms")
+    print(f"async_db:              worst reply after {max(concurrent) * 1000:.1f} ms")
+
+    await async_db.shutdown()
+    return 0 if max(concurrent) < seconds / 2 else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--write-seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    db.init_db()
+    sys.exit(asyncio.run(main_async(args.write_seconds)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""Handler latency on a synthetic database: /start, /today, /stats, /weekly,
+/results, the full /log conversation and a reminder tick.
+
+Drives the real handler functions through async_db with fake Telegram
+objects (checks/fakes.py), so the numbers cover the handler and its
+storage calls but no network. Each scenario picks random synthetic users;
+with --concurrency above 1 that many run at once, like a busy minute.
+
+The database comes from benchmarks/synthetic.py. Point DATABASE_PATH at a
+file to keep it between runs (`make bench` does); by default a new one is
+generated in a temporary directory. --save writes the results as JSON and
+--compare reports the change against such a file, exiting non-zero if
+any p50 got slower by more than --threshold.
+
+Usage: [DATABASE_PATH=FILE] python benchmarks/bench_handlers.py [--size 1k|100k|1M]
+           [--requests N] [--concurrency C] [--save FILE] [--compare FILE]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone
+from typing import Awaitable, Callable
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "checks"))  # fakes
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+if "DATABASE_PATH" not in os.environ:
+    os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="teabot-bench-"), "bench.db")
+
+import async_db  # noqa: E402
+import scheduler  # noqa: E402
+import synthetic  # noqa: E402
+from config import TIMEZONE  # noqa: E402
+from fakes import FakeBot, FakeSendQueue, button_update, command, text_update  # noqa: E402
+from handlers import admin, commands, progress  # noqa: E402
+
+# Leaderboards and reminder ticks scan every user, so they run fewer times
+BOARD_SHARE = 0.05
+TICKS = 5
+REMINDER_MINUTE = dt_time(20, 0)
+
+
+class FixedClock(datetime):
+    """Makes the scheduler tick at REMINDER_MINUTE in TIMEZONE, the busiest minute.
+
+    The date moves a day forward with each tick, so nobody has been
+    reminded yet.
+    """
+    days = 0
+
+    @classmethod
+    def now(cls, tz=None):
+        zone = ZoneInfo(TIMEZONE)
+        day = datetime.now(zone).date() + timedelta(days=cls.days)
+        return cls.combine(day, REMINDER_MINUTE, zone).astimezone(tz)
+
+
+async def measure(calls: int, concurrency: int, request: Callable[[], Awaitable[None]]) -> list[float]:
+    latencies = []
+
+    async def client(share: int):
+        for _ in range(share):
+            start = time.perf_counter()
+            await request()
+            latencies.append(time.perf_counter() - start)
+
+    shares = [calls // concurrency + (i < calls % concurrency) for i in range(concurrency)]
+    await asyncio.gather(*(client(share) for share in shares if share))
+    return latencies
+
+
+def summarize(latencies: list[float]) -> dict:
+    latencies = sorted(latencies)
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p90, p99 = cuts[49], cuts[89], cuts[98]
+    else:
+        p50 = p90 = p99 = latencies[0]
+    return {"n": len(latencies), "p50": p50, "p90": p90, "p99": p99, "max": latencies[-1]}
+
+
+async def run_scenarios(users: int, requests: int, concurrency: int) -> dict[str, dict]:
+    bot = FakeBot()
+    rng = random.Random(0)
+
+    def some_user() -> int:
+        return synthetic.FIRST_TELEGRAM_ID + rng.randrange(users)
+
+    queue = FakeSendQueue()
+    reminders = scheduler.ReminderScheduler(queue)
+
+    async def simple(handler, text):
+        update, context = command(bot, some_user(), text, bot_data={"reminders": reminders})
+        await handler(update, context)
+
+    async def log_conversation():
+        telegram_id = some_user()
+        update, context = command(bot, telegram_id, "/log")
+        assert await progress.start_logging(update, context) == progress.QURAN
+        steps = (
+            (progress.receive_quran, text_update(bot, telegram_id, "5")),
+            (progress.receive_salawat, text_update(bot, telegram_id, "100")),
+            (progress.receive_tahajjud, button_update(bot, telegram_id, "tahajjud:yes")),
+            (progress.receive_book, text_update(bot, telegram_id, "10")),
+            (progress.receive_fasting, text_update(bot, telegram_id, "жоқ")),
+        )
+        for handler, update in steps:
+            await handler(update, context)
+        assert bot.sent[-1][1].startswith("✅"), bot.sent[-1][1]
+
+    async def reminder_tick():
+        # A new day, checked a minute after the last, as in steady running
+        FixedClock.days += 1
+        reminders._checked_until = FixedClock.now(timezone.utc) - timedelta(minutes=1)
+        await reminders._check_and_send_reminders()
+        await asyncio.gather(*reminders._pending)
+
+    board_requests = max(2, int(requests * BOARD_SHARE))
+    scenarios = {
+        "/start": (requests, lambda: simple(commands.start, "/start")),
+        "/today": (requests, lambda: simple(commands.today, "/today")),
+        "/stats": (requests, lambda: simple(commands.stats, "/stats")),
+        "/weekly": (board_requests, lambda: simple(admin.weekly, "/weekly")),
+        "/results": (board_requests, lambda: simple(admin.results, "/results")),
+        "/log conversation": (requests, log_conversation),
+    }
+
+    results = {}
+    for name, (calls, request) in scenarios.items():
+        results[name] = summarize(await measure(calls, concurrency, request))
+        print_row(name, results[name])
+
+    scheduler.datetime = FixedClock
+    results["reminder tick"] = summarize(await measure(TICKS, 1, reminder_tick))
+    print_row("reminder tick", results["reminder tick"])
+    print(f"{queue.submitted // TICKS} reminders due per tick")
+
+    unregistered = sum(1 for _, text in bot.sent if "/start басыңыз" in text)
+    assert not unregistered, f"{unregistered} replies asked a synthetic user to /start"
+    return results
+
+
+def print_row(name: str, result: dict) -> None:
+    print(
+        f"{name:<18} n={result['n']:<6} p50 {result['p50'] * 1000:8.2f} ms  p90 {result['p90'] * 1000:8.2f} ms  "
+        f"p99 {result['p99'] * 1000:8.2f} ms  max {result['max'] * 1000:8.2f} ms"
+    )
+
+
+def compare(run: dict, baseline_path: str, threshold: float) -> bool:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    settings = ("size", "days", "concurrency")
+    if any(baseline[key] != run[key] for key in settings):
+        sys.exit(
+            f"{baseline_path} ran with " + ", ".join(f"{key}={baseline[key]}" for key in settings)
+            + "; rerun with the same settings to compare"
+        )
+
+    ok = True
+    print(f"\nchange in p50 against {baseline_path}:")
+    for name, result in run["results"].items():
+        if name not in baseline["results"]:
+            continue
+        change = result["p50"] / baseline["results"][name]["p50"] - 1
+        slower = change > threshold
+        ok = ok and not slower
+        print(f"{name:<18} {change:+7.1%}{'  SLOWER' if slower else ''}")
+    return ok
+
+
+async def run(args) -> dict[str, dict]:
+    try:
+        return await run_scenarios(args.users, args.requests, args.concurrency)
+    finally:
+        await async_db.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=synthetic.SIZES, default="1k")
+    parser.add_argument("--days", type=int, help="days of history (default depends on --size)")
+    parser.add_argument("--requests", type=int, default=500, help="calls per scenario")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--save", metavar="FILE", help="write the results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.5, help="allowed p50 slowdown (default: 0.5)")
+    args = parser.parse_args()
+
+    args.users, days = synthetic.SIZES[args.size]
+    days = args.days or days
+    start = time.perf_counter()
+    written = synthetic.generate(args.users, days)
+    synthetic.db.close_all_connections()
+    if written is None:
+        print(f"reusing {synthetic.db.DATABASE_PATH}: {args.users} users, {days} days")
+    else:
+        print(f"generated {args.users} users, {written} progress rows in {time.perf_counter() - start:.1f}s")
+
+    results = asyncio.run(run(args))
+
+    run_info = {"size": args.size, "days": days, "concurrency": args.concurrency, "results": results}
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(run_info, f, indent=2)
+    if args.compare and not compare(run_info, args.compare, args.threshold):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
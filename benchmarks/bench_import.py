@@ -0,0 +1,126 @@
+"""Bulk import/export of daily progress: 1M rows through progress_io.
+
+Writes a synthetic CSV (users x days of history ending today), imports it,
+checks the row count and that the leaderboard rollups still match the raw
+rows, then exports it back and compares. Also times the same rows going
+through save_progress one call at a time, on a sample, for comparison.
+Peak RSS is reported to show memory doesn't scale with the file.
+
+Usage: python benchmarks/bench_import.py [--users N] [--days D] [--format csv|jsonl]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from itertools import islice
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+_tmpdir = tempfile.mkdtemp(prefix="teabot-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "bench.db")
+
+import database as db  # noqa: E402
+import progress_io  # noqa: E402
+
+SAMPLE_ROWS = 20000
+
+
+def synthetic_rows(users: int, days: int, rng: random.Random):
+    start = date.today() - timedelta(days=days - 1)
+    for i in range(users):
+        telegram_id = 100_000 + i
+        for d in range(days):
+            yield (
+                telegram_id, (start + timedelta(days=d)).isoformat(),
+                rng.randint(0, 20), rng.randint(0, 500), rng.randint(0, 1),
+                rng.randint(0, 30), rng.randint(0, 1),
+            )
+
+
+def write_file(path: str, fmt: str, rows) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        if fmt == "csv":
+            writer = csv.writer(out)
+            writer.writerow(db.PROGRESS_EXPORT_FIELDS)
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                out.write(json.dumps(dict(zip(db.PROGRESS_EXPORT_FIELDS, row))) + "\n")
+
+
+def peak_rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def rollups_match() -> bool:
+    leaderboard = {s["user_id"]: s for s in db.get_all_users_stats(30)}
+    since = (date.today() - timedelta(days=30)).isoformat()
+    with db.get_connection() as conn:
+        raw = conn.execute(
+            """SELECT user_id, SUM(quran_pages), COUNT(*) FROM daily_progress
+               WHERE date >= ? GROUP BY user_id""",
+            (since,)
+        ).fetchall()
+    return all(
+        leaderboard[user_id]["quran_pages"] == quran and leaderboard[user_id]["days_logged"] == days
+        for user_id, quran, days in raw
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=1000)
+    parser.add_argument("--format", choices=progress_io.FORMATS, default="csv")
+    args = parser.parse_args()
+    total = args.users * args.days
+
+    db.init_db()
+    source = os.path.join(_tmpdir, f"source.{args.format}")
+    write_file(source, args.format, synthetic_rows(args.users, args.days, random.Random(0)))
+    size_mib = os.path.getsize(source) / 2**20
+    print(f"{total} rows, {args.format} file {size_mib:.1f} MiB, RSS before import {peak_rss_mib():.0f} MiB")
+
+    start = time.perf_counter()
+    with open(source, newline="", encoding="utf-8") as file:
+        imported = progress_io.import_progress(file, args.format)
+    elapsed = time.perf_counter() - start
+    print(f"import:  {imported / elapsed:9.0f} rows/s  ({elapsed:.1f}s), peak RSS {peak_rss_mib():.0f} MiB")
+
+    exported_path = os.path.join(_tmpdir, f"export.{args.format}")
+    start = time.perf_counter()
+    exported = progress_io.export_file(exported_path, args.format)
+    elapsed = time.perf_counter() - start
+    print(f"export:  {exported / elapsed:9.0f} rows/s  ({elapsed:.1f}s), peak RSS {peak_rss_mib():.0f} MiB")
+
+    # Per-call baseline on a sample, re-saving existing days
+    sample = list(islice(synthetic_rows(args.users, args.days, random.Random(0)), SAMPLE_ROWS))
+    user_ids = {u.telegram_id: u.id for u in db.get_all_users()}
+    start = time.perf_counter()
+    for telegram_id, day, quran, salawat, tahajjud, book, fasted in sample:
+        db.save_progress(
+            user_ids[telegram_id], date.fromisoformat(day), quran, salawat,
+            bool(tahajjud), book, bool(fasted)
+        )
+    elapsed = time.perf_counter() - start
+    print(f"save_progress per row: {len(sample) / elapsed:9.0f} rows/s  ({len(sample)} row sample)")
+
+    with open(source, newline="", encoding="utf-8") as original, \
+            open(exported_path, newline="", encoding="utf-8") as exported_file:
+        original_rows = sorted(progress_io.read_rows(original, args.format))
+        round_trip = original_rows == sorted(progress_io.read_rows(exported_file, args.format))
+
+    ok = imported == exported == total and round_trip and rollups_match()
+    print(f"row counts match: {imported == exported == total}, round trip identical: {round_trip}")
+    print("OK" if ok else "MISMATCH")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
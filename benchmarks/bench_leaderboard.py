@@ -0,0 +1,53 @@
+"""/weekly leaderboard: rollup read vs the original aggregate query.
+
+Seeds random history and times both. checks/check_leaderboard.py checks
+that they agree.
+
+Usage: python benchmarks/bench_leaderboard.py [--users N] [--days D]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "checks"))  # check_leaderboard
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+_tmpdir = tempfile.mkdtemp(prefix="teabot-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "bench.db")
+
+import database as db  # noqa: E402
+from check_leaderboard import aggregate_query, seed  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    today = date.today()
+    db.init_db()
+
+    user_ids = seed(args.users, args.days, today, rng)
+    db.get_all_users_weekly_stats()
+
+    runs = 20
+    start = time.perf_counter()
+    for _ in range(runs):
+        aggregate_query(today - timedelta(days=7))
+    before = (time.perf_counter() - start) / runs
+    start = time.perf_counter()
+    for _ in range(runs):
+        db.get_all_users_weekly_stats()
+    after = (time.perf_counter() - start) / runs
+    print(f"/weekly for {len(user_ids):,} users, {args.days} days of history:")
+    print(f"aggregate query {before * 1000:.1f} ms, rollup read {after * 1000:.1f} ms ({before / after:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
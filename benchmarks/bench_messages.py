@@ -0,0 +1,87 @@
+"""Cost of the reminder text in a fan-out, per recipient.
+
+Compares building the text for each recipient (an f-string after reading
+current_book, as reminders used to), rendering the catalog template for
+each, and one cached text per language shared by every recipient, as the
+scheduler does. Also reports the memory the texts of one fan-out hold.
+
+Usage: python benchmarks/bench_messages.py [--recipients N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+_tmpdir = tempfile.mkdtemp(prefix="teabot-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "bench.db")
+
+import database as db  # noqa: E402
+import messages  # noqa: E402
+
+
+def fstring_text(locale) -> str:
+    book_name = db.get_setting("current_book") or "таңдалған кітап"
+    return (
+        "Ассаламу алейкум! Күнделікті прогресс уақыты келді.\n\n"
+        "Прогресті жазу үшін /log басыңыз:\n"
+        "- Құран беттері\n"
+        "- Салауат саны\n"
+        "- Тахажжуд намазы\n"
+        f"- \"{book_name}\" беттері\n"
+        "- Ораза"
+    )
+
+
+def rendered_text(locale) -> str:
+    return messages.render("reminder", locale, book=db.get_setting("current_book"))
+
+
+def fan_out(text_for, locales: list) -> list[str]:
+    return [text_for(locale) for locale in locales]
+
+
+def shared(locales: list) -> list[str]:
+    book = db.get_setting("current_book")
+    texts = {locale: messages.render_cached("reminder", locale, book=book) for locale in set(locales)}
+    return [texts[locale] for locale in locales]
+
+
+def measure(fn) -> tuple[float, int]:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    messages.clear_cache()
+    tracemalloc.start()
+    texts = fn()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del texts
+    return elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--recipients", type=int, default=50_000)
+    args = parser.parse_args()
+
+    db.init_db()
+    db.set_setting("current_book", "Benchmark")
+    # Mostly the default language
+    locales = [("ru" if i % 5 == 0 else None) for i in range(args.recipients)]
+
+    print(f"{args.recipients:,} recipients")
+    for label, fn in (
+        ("f-string each", lambda: fan_out(fstring_text, locales)),
+        ("template each", lambda: fan_out(rendered_text, locales)),
+        ("per language", lambda: shared(locales)),
+    ):
+        elapsed, size = measure(fn)
+        print(f"{label:<14} {elapsed / args.recipients * 1e6:6.2f} us/recipient  {size / 1024:8.0f} KiB of texts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Overhead of the metrics wrappers, and a scrape of the /metrics endpoint.
+
+Metrics are enabled for this run. Times a trivial handler and a cached
+storage call with and without their timing wrapper, then serves /metrics
+on a free local port and checks that it lists what was recorded, including
+the send queue and user cache series read at scrape time.
+
+Usage: python benchmarks/bench_metrics.py [--calls N]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+os.environ["METRICS_PORT"] = "9"  # Enables metrics; the server below uses a free port
+_tmpdir = tempfile.mkdtemp(prefix="teabot-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "bench.db")
+
+import async_db  # noqa: E402
+import database as db  # noqa: E402
+import metrics  # noqa: E402
+
+
+async def per_call(fn, calls: int, *args) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        await fn(*args)
+    return (time.perf_counter() - start) / calls
+
+
+async def scrape(port: int) -> str:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+    response = (await reader.read()).decode()
+    writer.close()
+    return response
+
+
+async def run(calls: int) -> bool:
+    async def handler(update, context):
+        return None
+
+    timed = metrics.instrumented(handler)
+    plain = await per_call(handler, calls, None, None)
+    wrapped = await per_call(timed, calls, None, None)
+    print(f"handler: {plain * 1e9:.0f} ns plain, {wrapped * 1e9:.0f} ns timed (+{(wrapped - plain) * 1e9:.0f} ns)")
+
+    await async_db.init_db()
+    user = await async_db.create_user(1001, "alice")
+    calls = calls // 10  # Each one is a thread hop
+    await per_call(async_db.get_user, calls, user.telegram_id)  # Warm up the reader threads
+    plain = await per_call(async_db.get_user.__wrapped__, calls, user.telegram_id)
+    wrapped = await per_call(async_db.get_user, calls, user.telegram_id)
+    print(f"get_user: {plain * 1e6:.1f} us plain, {wrapped * 1e6:.1f} us timed (+{(wrapped - plain) * 1e6:.2f} us)")
+
+    metrics.REMINDERS.inc("sent")
+    metrics.REMINDER_LAG.observe(3.2)
+    metrics.SEND_SECONDS.observe(0.3, "sent")
+    metrics.SEND_QUEUE_DEPTH.track(lambda: {"": 7})
+    metrics.track_user_cache(db.user_cache_stats)
+    server = metrics.create_server(port=0)
+    await server.start()
+    try:
+        body = await scrape(server.port)
+    finally:
+        await server.stop()
+        await async_db.shutdown()
+
+    expected = (
+        'teabot_handler_seconds_count{handler="handler"}',
+        'teabot_db_seconds_bucket{function="get_user",le="+Inf"}',
+        'teabot_reminders_total{outcome="sent"} 1',
+        'teabot_reminder_lag_seconds_bucket{le="5"} 1',
+        'teabot_send_seconds_bucket{outcome="sent",le="0.5"} 1',
+        'teabot_send_queue_depth 7',
+        'teabot_user_cache_total{result="hit"}',
+        'teabot_user_cache_total{result="miss"}',
+        'teabot_user_cache_size 1',
+    )
+    missing = [line for line in expected if line not in body]
+    print("/metrics lists every series" if not missing else f"/metrics is missing {missing}")
+    return not missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200_000)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args.calls)) else 1)
+
+
+if __name__ == "__main__":
+    main()
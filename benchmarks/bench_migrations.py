@@ -0,0 +1,111 @@
+"""Startup cost of init_db and reads during a deferred index build.
+
+Fills a database at the schema from before the first index-only
+migration, as an existing large database would be when upgrading, so
+every later migration is pending, index-only and schema ones mixed. Then
+times the startup call the bot makes, runs the deferred index builds on
+the writer thread as the bot does after startup, and measures read latency
+from the reader threads while they run. Finally times init_db on an
+up-to-date database.
+
+Usage: python benchmarks/bench_migrations.py [--users N] [--days D]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+_tmpdir = tempfile.mkdtemp(prefix="teabot-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "bench.db")
+
+import async_db  # noqa: E402
+import database as db  # noqa: E402
+import migrations  # noqa: E402
+
+
+def seed(users: int, days: int) -> list[int]:
+    """Insert users and their history, returning the users' ids.
+
+    Written as plain SQL against the older schema: the database functions
+    expect every migration to have been applied.
+    """
+    rng = random.Random(0)
+    start = date.today() - timedelta(days=days - 1)
+    with db.get_connection() as conn:
+        conn.executemany("INSERT INTO users (telegram_id) VALUES (?)", [(100_000 + u,) for u in range(users)])
+        user_ids = [row[0] for row in conn.execute("SELECT id FROM users")]
+        conn.executemany(
+            """INSERT INTO daily_progress
+               (user_id, date, quran_pages, salawat_count, tahajjud, book_pages, fasted)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            ((user_id, (start + timedelta(days=d)).isoformat(),
+              rng.randint(0, 20), rng.randint(0, 500), rng.randint(0, 1), rng.randint(0, 30), rng.randint(0, 1))
+             for user_id in user_ids for d in range(days))
+        )
+        conn.commit()
+    return user_ids
+
+
+async def build_while_reading(user_ids: list[int]) -> tuple[float, list[float]]:
+    latencies = []
+    build = asyncio.create_task(async_db.init_db())
+    start = time.perf_counter()
+    while not build.done():
+        t = time.perf_counter()
+        await async_db.get_windowed_stats(random.choice(user_ids), (7, 30))
+        latencies.append(time.perf_counter() - t)
+    applied = await build
+    assert applied and all(m.online for m in migrations.MIGRATIONS if m.name in applied), applied
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=1000)
+    args = parser.parse_args()
+
+    # Apply everything before the first index-only migration
+    first_online = next(m for m in migrations.MIGRATIONS if m.online)
+    with db.get_connection() as conn:
+        for migration in migrations.MIGRATIONS[:first_online.version - 1]:
+            migration.module.upgrade(conn)
+        conn.execute(f"PRAGMA user_version = {first_online.version - 1}")
+        conn.commit()
+    user_ids = seed(args.users, args.days)
+    pending = migrations.MIGRATIONS[first_online.version - 1:]
+    print(f"{args.users * args.days} daily_progress rows, {len(pending)} migrations pending from {first_online.name}")
+
+    start = time.perf_counter()
+    applied = db.init_db(include_online=False)
+    with db.get_connection() as conn:
+        deferred = migrations.deferred_versions(conn)
+    print(
+        f"startup init_db: {(time.perf_counter() - start) * 1000:.2f} ms; "
+        f"applied {len(applied)}, deferred {len(deferred)}"
+    )
+    assert deferred == {m.version for m in pending if m.online}, deferred
+
+    elapsed, latencies = asyncio.run(build_while_reading(user_ids))
+    latencies.sort()
+    print(
+        f"deferred build: {elapsed:.2f}s; {len(latencies)} reads meanwhile, "
+        f"p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms"
+    )
+
+    runs = 1000
+    start = time.perf_counter()
+    for _ in range(runs):
+        db.init_db()
+    print(f"init_db when current: {(time.perf_counter() - start) / runs * 1e6:.1f} us")
+    asyncio.run(async_db.shutdown())
+
+
+if __name__ == "__main__":
+    main()
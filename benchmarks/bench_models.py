@@ -0,0 +1,87 @@
+"""Mapping user rows to model objects: the old sqlite3.Row mapping vs the row factory.
+
+Usage: python benchmarks/bench_models.py [--users N]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+_tmpdir = tempfile.mkdtemp(prefix="teabot-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "bench.db")
+
+import database as db  # noqa: E402
+
+
+@dataclass
+class LegacyUser:
+    id: int
+    telegram_id: int
+    username: Optional[str]
+    reminder_time: str
+    is_admin: bool
+    can_dm: bool
+    created_at: datetime
+
+
+def legacy_row_to_user(row) -> LegacyUser:
+    return LegacyUser(
+        id=row["id"],
+        telegram_id=row["telegram_id"],
+        username=row["username"],
+        reminder_time=row["reminder_time"],
+        is_admin=bool(row["is_admin"]),
+        can_dm=bool(row["can_dm"]) if "can_dm" in row.keys() else False,
+        created_at=datetime.fromisoformat(row["created_at"]) if isinstance(row["created_at"], str) else row["created_at"]
+    )
+
+
+def legacy_get_all_users() -> list:
+    with db.get_connection() as conn:
+        cursor = conn.execute("SELECT * FROM users")
+        return [legacy_row_to_user(row) for row in cursor.fetchall()]
+
+
+def measure(fn) -> tuple[float, int]:
+    fn()  # Warm the page cache
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    users = fn()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del users
+    return elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100_000)
+    args = parser.parse_args()
+
+    db.init_db()
+    with db.get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (telegram_id, username, can_dm) VALUES (?, ?, 1)",
+            [(1_000_000 + i, f"user{i}") for i in range(args.users)]
+        )
+        conn.commit()
+
+    before, before_mem = measure(legacy_get_all_users)
+    after, after_mem = measure(db.get_all_users)
+    print(f"{args.users:,} rows ({sqlite3.sqlite_version=})")
+    print(f"sqlite3.Row + dataclass: {before * 1000:7.1f} ms, {before_mem / 2**20:6.1f} MiB")
+    print(f"row factory + slots:     {after * 1000:7.1f} ms, {after_mem / 2**20:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""The cron and timer reminder engines on a synthetic database.
+
+First counts what a day costs each engine: the cron engine wakes and
+queries every minute, the timer engine only at minutes someone has a
+reminder at (plus a quarter-hourly in-memory DST check). Then runs the
+timer engine for real: --moved users who haven't logged today get their
+reminder moved to the next minute with /settime's calls, and the run
+reports how long after the start of that minute their reminders were
+handed to the send queue. Takes up to two minutes of wall-clock time.
+
+Usage: [DATABASE_PATH=FILE] python benchmarks/bench_reminder_engines.py [--size 1k|100k|1M] [--moved N]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "checks"))  # fakes
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+if "DATABASE_PATH" not in os.environ:
+    os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="teabot-bench-"), "bench.db")
+
+import async_db  # noqa: E402
+import scheduler  # noqa: E402
+import synthetic  # noqa: E402
+from fakes import FakeSendQueue  # noqa: E402
+
+# Seconds of warning the moved users' minute must leave
+MIN_LEAD = 5
+
+
+class TimedSendQueue(FakeSendQueue):
+    def __init__(self):
+        super().__init__()
+        self.submitted_at: dict[int, float] = {}
+
+    def submit(self, chat_id: int, text: str, **kwargs) -> asyncio.Future:
+        self.submitted_at[chat_id] = time.time()
+        return super().submit(chat_id, text, **kwargs)
+
+
+async def run(moved: int) -> None:
+    minutes = await async_db.get_reminder_minutes()
+    checks = 24 * 60 * 60 // scheduler.TRANSITION_CHECK_INTERVAL
+    print(f"cron engine:  {24 * 60} wakeups, {24 * 60} due-user queries a day")
+    print(f"timer engine: {len(minutes) + checks} wakeups, {len(minutes)} due-user queries a day")
+
+    queries = 0
+    get_due = async_db.get_users_due_for_reminder
+
+    async def counting_get_due(*args):
+        nonlocal queries
+        queries += 1
+        return await get_due(*args)
+
+    scheduler.db.get_users_due_for_reminder = counting_get_due
+    queue = TimedSendQueue()
+    reminders = scheduler.ReminderScheduler(queue, engine="timer")
+    reminders.start()
+    try:
+        # Let the engine load its timers, then move users to the next minute
+        await asyncio.sleep(1)
+        fire_at = datetime.now(timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        if (fire_at - datetime.now(timezone.utc)).total_seconds() < MIN_LEAD:
+            fire_at += timedelta(minutes=1)
+        # Users who have logged today get no reminder, so move ones who haven't
+        ids = []
+        telegram_id = synthetic.FIRST_TELEGRAM_ID
+        while len(ids) < moved:
+            telegram_id += 1
+            user = await async_db.get_user(telegram_id)
+            if not await async_db.get_today_progress(user.id, fire_at.astimezone(user.zone).date()):
+                ids.append(telegram_id)
+        start = time.perf_counter()
+        for telegram_id in ids:
+            user = await async_db.get_user(telegram_id)
+            local_time = fire_at.astimezone(user.zone).strftime("%H:%M")
+            await async_db.update_reminder_time(telegram_id, local_time)
+            await reminders.reschedule(telegram_id)
+        reschedule_ms = (time.perf_counter() - start) / moved * 1000
+        print(f"moved {moved} users to {fire_at:%H:%M} UTC ({reschedule_ms:.2f} ms per update + reschedule)")
+
+        queries = 0
+        await asyncio.sleep((fire_at - datetime.now(timezone.utc)).total_seconds() + 2)
+        late = sorted(queue.submitted_at[i] - fire_at.timestamp() for i in ids if i in queue.submitted_at)
+        print(f"{len(late)}/{moved} reminded, {queries} due-user queries while waiting")
+        if late:
+            print(f"handed to the send queue {late[0] * 1000:.1f}-{late[-1] * 1000:.1f} ms after the minute began")
+        assert len(late) == moved, "some moved users weren't reminded"
+    finally:
+        await reminders.stop()
+        await async_db.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=synthetic.SIZES, default="1k")
+    parser.add_argument("--moved", type=int, default=100, help="users moved to the next minute")
+    args = parser.parse_args()
+
+    users, days = synthetic.SIZES[args.size]
+    synthetic.generate(users, days)
+    synthetic.db.close_all_connections()
+    asyncio.run(run(min(args.moved, users // 2)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Cost of finding the users due for a reminder in one scheduler tick.
+
+Compares a full scan (get_users_for_reminders, then each user's local time
+checked in Python) with get_users_due_for_reminder: an indexed lookup by
+UTC minute that also leaves out users who have already logged today. A
+fifth of the users have their own timezone; --logged sets the share who
+have logged.
+
+Usage: python benchmarks/bench_reminders.py [--users N] [--ticks T]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+_tmpdir = tempfile.mkdtemp(prefix="teabot-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "bench.db")
+
+import database as db  # noqa: E402
+import timezones  # noqa: E402
+
+# Most people keep the default time and zone; the rest are spread out.
+POPULAR_TIME = "20:00"
+OTHER_ZONES = ("Europe/Moscow", "Europe/Istanbul", "Asia/Tashkent", "Europe/Berlin", "America/New_York")
+
+
+def seed(users: int, logged: float, popular: datetime) -> None:
+    """Users, and a `logged` share of them with progress for their day at `popular`."""
+    rng = random.Random(0)
+    rows = []
+    progress = []
+    for i in range(users):
+        if rng.random() < 0.3:
+            reminder_time = POPULAR_TIME
+        else:
+            reminder_time = f"{rng.randrange(24):02d}:{rng.randrange(60):02d}"
+        zone = rng.choice(OTHER_ZONES) if rng.random() < 0.2 else None
+        offset = timezones.utc_offset(zone)
+        rows.append((
+            1_000_000 + i, f"user{i}", reminder_time, int(rng.random() < 0.9),
+            zone, offset, timezones.utc_minute(reminder_time, offset)
+        ))
+        if rng.random() < logged:
+            progress.append((1_000_000 + i, popular.astimezone(timezones.get_zone(zone)).date().isoformat()))
+    with db.get_connection() as conn:
+        conn.executemany(
+            """INSERT INTO users
+               (telegram_id, username, reminder_time, can_dm, timezone, utc_offset, reminder_utc_minute)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            rows
+        )
+        conn.executemany(
+            "INSERT INTO daily_progress (user_id, date) VALUES ((SELECT id FROM users WHERE telegram_id = ?), ?)",
+            progress
+        )
+        conn.commit()
+
+
+def full_scan(now: datetime) -> list:
+    """Every DM-able user, checked against their local time (logged or not)."""
+    return [u for u in db.get_users_for_reminders() if now.astimezone(u.zone).strftime("%H:%M") == u.reminder_time]
+
+
+def indexed(now: datetime) -> list:
+    users, _ = db.get_users_due_for_reminder(now)
+    return users
+
+
+def time_ticks(fn, times: list[datetime]) -> float:
+    start = time.perf_counter()
+    for t in times:
+        fn(t)
+    return (time.perf_counter() - start) / len(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--logged", type=float, default=0.5, help="share of users who already logged today")
+    args = parser.parse_args()
+
+    midnight = datetime.combine(date.today(), dt_time(), timezone.utc)
+    quiet = [midnight + timedelta(hours=i % 24, minutes=(7 + 3 * i) % 60) for i in range(args.ticks)]
+    popular = datetime.combine(date.today(), dt_time.fromisoformat(POPULAR_TIME), timezones.get_zone(None))
+    popular = popular.astimezone(timezone.utc)
+
+    db.init_db()
+    seed(args.users, args.logged, popular)
+    print(f"{args.users:,} users, {args.logged:.0%} already logged")
+
+    for label, times in (("quiet minute", quiet), ("popular minute", [popular] * args.ticks)):
+        scanned = len(full_scan(times[0]))
+        due = len(indexed(times[0]))
+        before = time_ticks(full_scan, times)
+        after = time_ticks(indexed, times)
+        print(
+            f"{label:<16} full scan {scanned:>7,} due {before * 1000:8.2f} ms/tick"
+            f"  indexed {due:>7,} not logged {after * 1000:8.2f} ms/tick  ({before / after:.0f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
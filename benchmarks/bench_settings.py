@@ -0,0 +1,51 @@
+"""Per-reminder cost of reading current_book, with and without the settings cache.
+
+Usage: python benchmarks/bench_settings.py [--reminders N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+_tmpdir = tempfile.mkdtemp(prefix="teabot-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "bench.db")
+
+import database as db  # noqa: E402
+
+
+def reminder_text() -> str:
+    book_name = db.get_setting("current_book") or "таңдалған кітап"
+    return f"- \"{book_name}\" беттері"
+
+
+def uncached_reminder_text() -> str:
+    db.clear_settings_cache()
+    return reminder_text()
+
+
+def per_call(fn, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reminders", type=int, default=50_000)
+    args = parser.parse_args()
+
+    db.init_db()
+    db.set_setting("current_book", "Benchmark")
+
+    before = per_call(uncached_reminder_text, args.reminders)
+    after = per_call(reminder_text, args.reminders)
+    print(f"uncached: {before * 1e6:7.2f} us/reminder")
+    print(f"cached:   {after * 1e6:7.2f} us/reminder ({before / after:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
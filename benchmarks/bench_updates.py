@@ -0,0 +1,86 @@
+"""Throughput of PerChatUpdateProcessor on synthetic updates, with ordering check.
+
+Feeds updates to the processor the way Application does (one task per
+update, in arrival order) with handlers that take a random few
+milliseconds, like a handler awaiting the database and Telegram. Checks that
+each user's updates completed in the order they arrived.
+
+Usage: python benchmarks/bench_updates.py [--updates N] [--users U] [--workers W]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+
+from telegram import Chat, Message, Update, User  # noqa: E402
+
+from update_processor import PerChatUpdateProcessor  # noqa: E402
+
+
+def synthetic_updates(count: int, users: int, rng: random.Random) -> list[Update]:
+    now = datetime.now(timezone.utc)
+    updates = []
+    for i in range(count):
+        uid = 100_000 + rng.randrange(users)
+        message = Message(
+            message_id=i,
+            date=now,
+            chat=Chat(id=uid, type=Chat.PRIVATE),
+            from_user=User(id=uid, first_name="Bench", is_bot=False),
+            text=str(i),
+        )
+        updates.append(Update(update_id=i, message=message))
+    return updates
+
+
+async def replay(updates: list[Update], workers: int, rng: random.Random) -> tuple[float, dict]:
+    processor = PerChatUpdateProcessor(workers)
+    completed: dict[int, list[int]] = defaultdict(list)
+
+    async def handle(update: Update):
+        await asyncio.sleep(rng.uniform(0.001, 0.02))
+        completed[update.effective_user.id].append(update.update_id)
+
+    await processor.initialize()
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(processor.process_update(u, handle(u))) for u in updates]
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    await processor.shutdown()
+    return elapsed, completed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=64)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    updates = synthetic_updates(args.updates, args.users, rng)
+    arrival: dict[int, list[int]] = defaultdict(list)
+    for u in updates:
+        arrival[u.effective_user.id].append(u.update_id)
+
+    ok = True
+    for workers in (1, args.workers):
+        elapsed, completed = asyncio.run(replay(updates, workers, rng))
+        in_order = completed == arrival
+        ok = ok and in_order
+        print(
+            f"workers={workers:<4} {len(updates) / elapsed:8.0f} updates/s"
+            f"  ({elapsed:.2f}s)  per-user order preserved: {in_order}"
+        )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
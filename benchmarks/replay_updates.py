@@ -0,0 +1,108 @@
+"""POST recorded Telegram updates to a running webhook-mode bot.
+
+Each line of the input file is one update as Telegram sends it. With
+WEBHOOK_URL unset the bot never talks to Telegram to receive updates, so
+this drives it locally; it still calls the Bot API at startup and to
+reply, so it needs a real token and network access. checks/check_webhook.py runs
+the same replay in-process with no network. Reports acknowledgement
+latency.
+
+An acknowledgement only means the update was queued, so the bot must run
+with METRICS_PORT set: the replay then waits for teabot_updates_total on
+its /metrics to rise by the number of updates, and fails if it doesn't
+within --wait seconds.
+
+Usage: python benchmarks/replay_updates.py updates.jsonl \\
+           [--url http://127.0.0.1:8080/telegram] [--secret S] [--concurrency N] \\
+           [--metrics-url http://127.0.0.1:9090/metrics] [--wait SECONDS]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def post(url: str, secret: str, body: bytes) -> tuple[int, float]:
+    request = urllib.request.Request(
+        url,
+        data=body,
+        method="POST",
+        headers={
+            "Content-Type": "application/json",
+            "X-Telegram-Bot-Api-Secret-Token": secret,
+        },
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - start
+
+
+def processed(metrics_url: str) -> float:
+    """The bot's teabot_updates_total."""
+    with urllib.request.urlopen(metrics_url, timeout=10) as response:
+        for line in response.read().decode().splitlines():
+            name, _, value = line.partition(" ")
+            if name == "teabot_updates_total":
+                return float(value)
+    return 0.0
+
+
+def wait_processed(metrics_url: str, target: float, timeout: float) -> float:
+    deadline = time.monotonic() + timeout
+    while True:
+        count = processed(metrics_url)
+        if count >= target or time.monotonic() >= deadline:
+            return count
+        time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("updates")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/telegram")
+    parser.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET", ""))
+    parser.add_argument("--concurrency", type=int, default=8)
+    metrics_port = int(os.getenv("METRICS_PORT", "0") or 0)
+    parser.add_argument(
+        "--metrics-url",
+        default=f"http://127.0.0.1:{metrics_port}/metrics" if metrics_port else None,
+        help="the bot's /metrics, to check the updates were processed (default: from METRICS_PORT)"
+    )
+    parser.add_argument("--wait", type=float, default=30.0, help="seconds to wait for processing")
+    args = parser.parse_args()
+    if not args.metrics_url:
+        parser.error("set METRICS_PORT or --metrics-url, to check that the bot processed the updates")
+
+    with open(args.updates, "rb") as f:
+        bodies = [line.strip() for line in f if line.strip()]
+
+    before = processed(args.metrics_url)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(lambda body: post(args.url, args.secret, body), bodies))
+    elapsed = time.perf_counter() - start
+    accepted = sum(1 for status, _ in results if status == 200)
+    done = wait_processed(args.metrics_url, before + accepted, args.wait) - before
+
+    statuses = [status for status, _ in results]
+    latencies = sorted(latency for _, latency in results)
+    print(f"{len(bodies)} updates in {elapsed:.2f}s ({len(bodies) / elapsed:.0f}/s)")
+    print(f"status codes: { {code: statuses.count(code) for code in set(statuses)} }")
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=20, method="inclusive")
+        p50, p95 = cuts[9], cuts[18]
+        print(f"ack latency p50={p50 * 1000:.1f} ms p95={p95 * 1000:.1f} ms max={latencies[-1] * 1000:.1f} ms")
+    print(f"processed {done:.0f} of {accepted} accepted updates")
+    sys.exit(0 if accepted == len(bodies) and done >= accepted else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Synthetic users and daily progress for benchmarking.
+
+Users get Telegram IDs from FIRST_TELEGRAM_ID up, DM permission, and
+reminder times clustered the way real ones are: most keep the default or
+pick a round evening time. Each user logs a random share of days (mean
+about 40%), so history is uneven like a real group's.
+
+Generating the larger sizes takes minutes, so a database is reused if it
+was generated with the same parameters (recorded in the settings table).
+Importers set DATABASE_PATH before importing this module.
+
+Usage: DATABASE_PATH=bench-100k.db python benchmarks/synthetic.py [--size 100k] [--days D]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from itertools import islice
+from typing import Iterator, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+
+import database as db  # noqa: E402
+import timezones  # noqa: E402
+from config import DEFAULT_REMINDER_TIME  # noqa: E402
+
+# Users, days of history
+SIZES = {
+    "1k": (1_000, 3 * 365),
+    "100k": (100_000, 365),
+    "1M": (1_000_000, 60),
+}
+
+FIRST_TELEGRAM_ID = 100_000
+ADMIN_TELEGRAM_ID = FIRST_TELEGRAM_ID
+POPULAR_TIMES = ("20:00", "21:00", "21:30", "22:00", "05:30")
+USER_BATCH_SIZE = 10_000
+
+# Marks a database as generated here, with its parameters
+MARKER_KEY = "synthetic"
+
+
+def user_rows(users: int, seed: int = 0) -> Iterator[tuple]:
+    """(telegram_id, username, reminder_time, utc_offset, reminder_utc_minute) for each user."""
+    rng = random.Random(seed)
+    offset = timezones.utc_offset(None)
+    for u in range(users):
+        roll = rng.random()
+        if roll < 0.4:
+            reminder_time = DEFAULT_REMINDER_TIME
+        elif roll < 0.8:
+            reminder_time = rng.choice(POPULAR_TIMES)
+        else:
+            reminder_time = f"{rng.randrange(24):02d}:{rng.randrange(60):02d}"
+        yield (
+            FIRST_TELEGRAM_ID + u, f"user{u}", reminder_time,
+            offset, timezones.utc_minute(reminder_time, offset)
+        )
+
+
+def progress_rows(users: int, days: int, seed: int = 0) -> Iterator[tuple]:
+    """PROGRESS_EXPORT_FIELDS tuples for `days` of history ending today."""
+    rng = random.Random(seed + 1)
+    start = date.today() - timedelta(days=days - 1)
+    dates = [(start + timedelta(days=d)).isoformat() for d in range(days)]
+    for u in range(users):
+        activity = rng.betavariate(2, 3)  # Share of days this user logs
+        for day in dates:
+            if rng.random() < activity:
+                yield (
+                    FIRST_TELEGRAM_ID + u, day, rng.randint(0, 20), rng.randint(0, 500),
+                    int(rng.random() < 0.3), rng.randint(0, 30), int(rng.random() < 0.1)
+                )
+
+
+def _marker(users: int, days: int, seed: int) -> str:
+    return f"users={users} days={days} seed={seed}"
+
+
+def generate(users: int, days: int, seed: int = 0) -> Optional[int]:
+    """Fill the database at DATABASE_PATH, unless it already holds this data.
+
+    Returns the number of progress rows written, or None if the existing
+    data was reused. Refuses to touch a database it didn't generate.
+    """
+    db.init_db()
+    marker = _marker(users, days, seed)
+    existing = db.get_setting(MARKER_KEY)
+    if existing == marker:
+        return None
+    with db.get_connection() as conn:
+        has_users = conn.execute("SELECT 1 FROM users LIMIT 1").fetchone()
+    if existing is not None or has_users:
+        raise SystemExit(f"{db.DATABASE_PATH} already holds other data; point DATABASE_PATH at a new file")
+
+    rows = user_rows(users, seed)
+    with db.get_connection() as conn:
+        while batch := list(islice(rows, USER_BATCH_SIZE)):
+            conn.executemany(
+                """INSERT INTO users
+                   (telegram_id, username, reminder_time, utc_offset, reminder_utc_minute, can_dm)
+                   VALUES (?, ?, ?, ?, ?, 1)""",
+                batch
+            )
+            conn.commit()
+    db.set_admin(ADMIN_TELEGRAM_ID)
+    written = db.import_progress(progress_rows(users, days, seed))
+    db.set_setting("current_book", "Бенчмарк кітабы")
+    db.set_setting(MARKER_KEY, marker)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=SIZES, default="1k")
+    parser.add_argument("--days", type=int, help="days of history (default depends on --size)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if "DATABASE_PATH" not in os.environ:
+        sys.exit("Set DATABASE_PATH to the file to generate, so the bot's database isn't touched")
+
+    users, days = SIZES[args.size]
+    start = time.perf_counter()
+    written = generate(users, args.days or days, args.seed)
+    if written is None:
+        print(f"{db.DATABASE_PATH} already holds this data")
+    else:
+        print(f"{users} users, {written} progress rows in {time.perf_counter() - start:.1f}s")
+    db.close_all_connections()
+
+
+if __name__ == "__main__":
+    main()
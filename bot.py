@@ -1,12 +1,23 @@
+import asyncio
 import logging
+from typing import Optional
+
 from telegram.ext import Application, CommandHandler
+from telegram.request import BaseRequest
 
+import async_db
 import database as db
-from config import BOT_TOKEN
-from handlers.commands import start, today, stats, settime
-from handlers.progress import get_progress_handler
-from handlers.admin import setbook, broadcast, makeadmin, results, weekly
+import metrics
+from broadcaster import Broadcaster
+from config import BOT_MODE, BOT_TOKEN, DATABASE_BACKEND, MAX_CONCURRENT_UPDATES, PERSISTENCE_INTERVAL
+from delivery import SendQueue
+from handlers.commands import start, today, stats, settime, settz, lang
+from handlers.progress import get_expired_prompt_handler, get_progress_handler
+from handlers.admin import setbook, broadcast, makeadmin, results, weekly, export
+from persistence import DatabasePersistence
 from scheduler import ReminderScheduler
+from update_processor import PerChatUpdateProcessor
+from webhook import create_server, run_webhook
 
 # Set up logging
 logging.basicConfig(
@@ -16,47 +27,104 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def main():
-    # Initialize database
-    db.init_db()
-    logger.info("Database initialized")
+def build_application(request: Optional[BaseRequest] = None) -> Application:
+    """The bot: handlers, send queue, broadcaster, scheduler and their lifecycle.
 
-    # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
+    `request` replaces the HTTP client for Bot API calls, e.g. with an
+    offline stand-in (see checks/check_webhook.py).
+    """
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(PerChatUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .persistence(DatabasePersistence(update_interval=PERSISTENCE_INTERVAL))
+    )
+    if request is not None:
+        builder = builder.request(request)
+    application = builder.build()
 
     # Add handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("today", today))
     application.add_handler(CommandHandler("stats", stats))
     application.add_handler(CommandHandler("settime", settime))
+    application.add_handler(CommandHandler("settz", settz))
+    application.add_handler(CommandHandler("lang", lang))
     application.add_handler(CommandHandler("setbook", setbook))
     application.add_handler(CommandHandler("broadcast", broadcast))
     application.add_handler(CommandHandler("makeadmin", makeadmin))
     application.add_handler(CommandHandler("results", results))
     application.add_handler(CommandHandler("weekly", weekly))
+    application.add_handler(CommandHandler("export", export))
 
-    # Add conversation handler for progress logging
+    # Add conversation handler for progress logging, then one for its
+    # buttons pressed when the conversation has moved on
     application.add_handler(get_progress_handler())
+    application.add_handler(get_expired_prompt_handler())
+
+    # Shared outgoing queue; users who block the bot stop getting DMs
+    async def on_blocked(telegram_id: int):
+        await async_db.set_can_dm(telegram_id, False)
+
+    send_queue = SendQueue(application.bot, on_blocked=on_blocked)
+    application.bot_data["send_queue"] = send_queue
+
+    broadcaster = Broadcaster(application.bot, send_queue)
+    application.bot_data["broadcaster"] = broadcaster
 
-    # Set up scheduler
-    scheduler = ReminderScheduler(application.bot)
+    # Set up scheduler; /start, /settime and /settz tell it about changes
+    scheduler = ReminderScheduler(send_queue)
+    application.bot_data["reminders"] = scheduler
+
+    metrics_server = metrics.create_server() if metrics.ENABLED else None
+    metrics.SEND_QUEUE_DEPTH.track(lambda: {"": send_queue.depth})
+    if DATABASE_BACKEND == "sqlite":
+        metrics.track_user_cache(db.user_cache_stats)
 
     # Start scheduler when bot starts
     async def post_init(app):
+        if DATABASE_BACKEND == "sqlite":
+            # Deferred index builds, queued on the writer thread
+            app.create_task(async_db.init_db(), name="deferred_migrations")
+        send_queue.start()
+        await broadcaster.resume()
         scheduler.start()
         logger.info("Scheduler started")
+        if metrics_server:
+            await metrics_server.start()
 
     # Stop scheduler when bot stops
     async def post_shutdown(app):
-        scheduler.stop()
+        if metrics_server:
+            await metrics_server.stop()
+        await scheduler.stop()
+        await broadcaster.stop()
+        await send_queue.stop()
+        await async_db.shutdown()
         logger.info("Scheduler stopped")
 
     application.post_init = post_init
     application.post_shutdown = post_shutdown
+    return application
+
+
+def main():
+    # Initialize database (the postgres backend does this when its
+    # connection pool first opens, on the bot's event loop). Pending index
+    # builds are left for after startup.
+    if DATABASE_BACKEND == "sqlite":
+        db.init_db(include_online=False)
+        db.close_connection()
+        logger.info("Database initialized")
+
+    application = build_application()
 
     # Run the bot
-    logger.info("Starting bot...")
-    application.run_polling()
+    logger.info("Starting bot in %s mode...", BOT_MODE)
+    if BOT_MODE == "webhook":
+        asyncio.run(run_webhook(application, create_server(application)))
+    else:
+        application.run_polling()
 
 
 if __name__ == "__main__":
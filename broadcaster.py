@@ -0,0 +1,120 @@
+"""Background delivery of /broadcast messages.
+
+A broadcast is stored with one row per recipient, so an interrupted job
+picks up where it stopped after a restart and never re-sends to users whose
+delivery was already recorded. Progress is shown by editing a single status
+message in the admin's chat. Messages go out in the send queue's BULK lane,
+so reminders due during a broadcast aren't held up behind it.
+"""
+import asyncio
+import logging
+
+from telegram import Bot
+from telegram.error import TelegramError
+
+import async_db as db
+from delivery import BULK, SENT, SendQueue
+from models import Broadcast
+
+logger = logging.getLogger(__name__)
+
+# How often outcomes are written to the database and the status is edited
+FLUSH_INTERVAL = 2.0
+
+
+class Broadcaster:
+    def __init__(self, bot: Bot, send_queue: SendQueue):
+        self.bot = bot
+        self.send_queue = send_queue
+        self._jobs: dict[int, asyncio.Task] = {}
+
+    async def resume(self):
+        """Restart broadcasts that were interrupted by a shutdown."""
+        for broadcast in await db.get_unfinished_broadcasts():
+            logger.info("Resuming broadcast %d", broadcast.id)
+            self._spawn(broadcast)
+
+    async def stop(self):
+        for task in self._jobs.values():
+            task.cancel()
+        await asyncio.gather(*self._jobs.values(), return_exceptions=True)
+        self._jobs.clear()
+
+    async def start_broadcast(self, message: str, admin_chat_id: int) -> Broadcast:
+        broadcast = await db.create_broadcast(message, admin_chat_id)
+        status = await self.bot.send_message(chat_id=admin_chat_id, text="Хабарлама жіберілуде...")
+        broadcast.status_message_id = status.message_id
+        await db.set_broadcast_status_message(broadcast.id, status.message_id)
+        self._spawn(broadcast)
+        return broadcast
+
+    def _spawn(self, broadcast: Broadcast):
+        task = asyncio.create_task(self._run(broadcast))
+        self._jobs[broadcast.id] = task
+        task.add_done_callback(lambda _: self._jobs.pop(broadcast.id, None))
+
+    async def _run(self, broadcast: Broadcast):
+        text = f"📢 Хабарлама:\n\n{broadcast.message}"
+        counts = await db.get_broadcast_counts(broadcast.id)
+        sent = counts.get(SENT, 0)
+        failed = sum(n for status, n in counts.items() if status not in (SENT, "pending"))
+
+        unflushed: list[tuple[int, str]] = []
+
+        def collect(telegram_id: int, future: asyncio.Future):
+            if not future.cancelled():
+                unflushed.append((telegram_id, future.result()))
+
+        futures = []
+        for telegram_id in await db.get_pending_broadcast_recipients(broadcast.id):
+            future = self.send_queue.submit(telegram_id, text, priority=BULK)
+            future.add_done_callback(lambda f, telegram_id=telegram_id: collect(telegram_id, f))
+            futures.append(future)
+
+        all_done = asyncio.gather(*futures, return_exceptions=True)
+        try:
+            while True:
+                done, _ = await asyncio.wait({all_done}, timeout=FLUSH_INTERVAL)
+                batch = unflushed[:]
+                unflushed.clear()
+                if batch:
+                    await db.record_broadcast_deliveries(broadcast.id, batch)
+                    sent += sum(1 for _, status in batch if status == SENT)
+                    failed += sum(1 for _, status in batch if status != SENT)
+                if done:
+                    break
+                await self._update_status(broadcast, (
+                    "Хабарлама жіберілуде...\n"
+                    f"Жеткізілді: {sent}\n"
+                    f"Қате: {failed}\n"
+                    f"Қалды: {sum(1 for f in futures if not f.done())}"
+                ))
+        except asyncio.CancelledError:
+            # Let messages already being sent finish and record them, so a
+            # restart doesn't deliver them twice
+            in_flight = self.send_queue.cancel(futures)
+            if in_flight:
+                await asyncio.wait(in_flight)
+            if unflushed:
+                await db.record_broadcast_deliveries(broadcast.id, unflushed)
+            raise
+
+        await db.finish_broadcast(broadcast.id)
+        await self._update_status(broadcast, (
+            "Хабарлама жіберілді.\n"
+            f"Жеткізілді: {sent}\n"
+            f"Қате: {failed}"
+        ))
+
+    async def _update_status(self, broadcast: Broadcast, text: str):
+        if broadcast.status_message_id is None:
+            return
+        try:
+            await self.bot.edit_message_text(
+                chat_id=broadcast.admin_chat_id,
+                message_id=broadcast.status_message_id,
+                text=text
+            )
+        except TelegramError as e:
+            # Includes "message is not modified" when nothing changed
+            logger.debug("Could not update broadcast %d status: %s", broadcast.id, e)
@@ -0,0 +1,242 @@
+"""Run every async_db function against the configured storage backend.
+
+Uses a fresh temporary SQLite file by default. To check PostgreSQL, point it
+at an empty scratch database:
+
+    DATABASE_BACKEND=postgres DATABASE_URL=postgresql://localhost/teabot_check \\
+        python checks/check_backend.py
+
+Also times a burst of concurrent /today-style lookups and saves.
+
+Usage: python checks/check_backend.py [--users N]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "check")
+_tmpdir = tempfile.mkdtemp(prefix="teabot-check-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "bench.db")
+
+import async_db as db  # noqa: E402
+import timezones  # noqa: E402
+from config import DATABASE_BACKEND  # noqa: E402
+
+failures = []
+
+
+def check(name: str, ok: bool) -> None:
+    print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    if not ok:
+        failures.append(name)
+
+
+async def check_functions() -> None:
+    await db.init_db()
+    today = date.today()
+
+    def utc(day: date, hour: int, minute: int, second: int = 0) -> datetime:
+        return datetime.combine(day, dt_time(hour, minute, second), timezone.utc)
+
+    async def due_at(
+        utc_minute: int, day: date = today, nudge_after: int = 0
+    ) -> tuple[list[int], list[tuple[int, date]]]:
+        users, nudges = await db.get_users_due_for_reminder(utc(day, *divmod(utc_minute, 60)), nudge_after)
+        return [u.telegram_id for u in users], [(u.telegram_id, day) for u, day in nudges]
+
+    alice = await db.create_user(1001, "alice", can_dm=True)
+    bob = await db.create_user(1002, None)
+    again = await db.create_user(1001, "alice2")
+    check("create_user upserts and keeps can_dm", again.id == alice.id and again.can_dm and again.username == "alice2")
+    check("get_user", (await db.get_user(1002)).id == bob.id and await db.get_user(9999) is None)
+
+    await db.set_can_dm(1002, True)
+    await db.set_can_dm(1001, False)
+    due = await due_at(timezones.utc_minute("20:00", timezones.utc_offset(None)))
+    check("set_can_dm / get_users_due_for_reminder", due == ([1002], []))
+    check("get_users_for_reminders", [u.telegram_id for u in await db.get_users_for_reminders()] == [1002])
+    check("update_reminder_time", await db.update_reminder_time(1002, "21:30") and not await db.update_reminder_time(9999, "21:30"))
+    check("reminder time stored", (await db.get_user(1002)).reminder_time == "21:30")
+    check("set_timezone", await db.set_timezone(1002, "Asia/Tokyo") and not await db.set_timezone(9999, "Asia/Tokyo")
+          and (await db.get_user(1002)).timezone == "Asia/Tokyo")
+    check("reminder rescheduled in UTC", await due_at(12 * 60 + 30) == ([1002], []))
+    check("get_timezones", sorted(await db.get_timezones(), key=str) == ["Asia/Tokyo", None])
+    check("get_reminder_minutes", await db.get_reminder_minutes() == [12 * 60 + 30])
+    check("refresh_utc_offsets", await db.refresh_utc_offsets("Asia/Tokyo", 600) == 1
+          and await db.refresh_utc_offsets("Asia/Tokyo", 600) == 0
+          and await due_at(11 * 60 + 30) == ([1002], []))
+    await db.refresh_utc_offsets("Asia/Tokyo", 540)
+    check("set_locale", await db.set_locale(1002, "ru") and not await db.set_locale(9999, "ru")
+          and (await db.get_user(1002)).locale == "ru" and (await db.get_user(1001)).locale is None)
+    due, _ = await db.get_users_due_for_reminder(datetime.combine(today, dt_time(12, 30), timezone.utc))
+    check("due users have their locale", [u.locale for u in due] == ["ru"])
+    check("set_admin", await db.set_admin(1001) and (await db.get_user(1001)).is_admin)
+    check("get_all_users", sorted(u.telegram_id for u in await db.get_all_users()) == [1001, 1002])
+
+    saved = await db.save_progress(alice.id, today, 5, 100, True, 10, False)
+    await db.save_progress(alice.id, today - timedelta(days=3), 2, 50, False, 4, True)
+    await db.save_progress(alice.id, today - timedelta(days=20), 7, 10, True, 1, True)
+    await db.save_progress(alice.id, today - timedelta(days=400), 9, 9, True, 9, True)
+    await db.save_progress(bob.id, today, 1, 1, False, 1, False)
+    resaved = await db.save_progress(bob.id, today, 3, 30, True, 3, True)
+    check("save_progress returns the row", saved.quran_pages == 5 and saved.tahajjud is True and saved.date == today)
+    check("save_progress overwrites the day", resaved.quran_pages == 3 and resaved.fasted is True)
+    progress = await db.get_today_progress(alice.id)
+    check("get_today_progress", progress.salawat_count == 100 and progress.fasted is False)
+    check("get_today_progress for another date", (await db.get_today_progress(alice.id, today - timedelta(days=3))).quran_pages == 2)
+
+    weekly = await db.get_weekly_stats(alice.id)
+    check("get_weekly_stats", weekly == {
+        "quran_pages": 7, "salawat_count": 150, "tahajjud_days": 1,
+        "book_pages": 14, "fasting_days": 1, "days_logged": 2,
+    })
+    monthly = await db.get_monthly_stats(alice.id)
+    check("get_monthly_stats", monthly["quran_pages"] == 14 and monthly["days_logged"] == 3)
+    windows = await db.get_windowed_stats(alice.id, (7, 30, None))
+    check("get_windowed_stats", windows[7] == weekly and windows[30] == monthly and windows[None]["quran_pages"] == 23)
+    ahead = await db.get_windowed_stats(alice.id, (7,), today + timedelta(days=5))
+    check("get_windowed_stats for another date", ahead[7]["days_logged"] == 1)
+
+    moved = await db.archive_progress(today - timedelta(days=365))
+    archived = await db.get_windowed_stats(alice.id, (7, 30, None))
+    check("archive_progress keeps all-time stats", moved == 1 and archived == windows
+          and await db.archive_progress(today - timedelta(days=365)) == 0)
+    check("vacuum_step", await db.vacuum_step() >= 0)
+
+    claimed = await db.claim_reminders([(alice.id, today), (bob.id, today), (alice.id, today - timedelta(days=9))])
+    check("claim_reminders", sorted(claimed) == sorted([alice.id, bob.id, alice.id])
+          and await db.claim_reminders([(alice.id, today), (bob.id, today + timedelta(days=1))]) == [bob.id])
+    await db.record_reminder_outcomes([(alice.id, today, "sent", utc(today, 20, 0)),
+                                       (bob.id, today, "blocked", utc(today, 12, 30))])
+    check("prune_reminder_log", await db.prune_reminder_log(today - timedelta(days=7)) == 1
+          and await db.prune_reminder_log(today - timedelta(days=7)) == 0
+          and await db.claim_reminders([(alice.id, today)]) == [])
+
+    # Bob (Asia/Tokyo, 21:30) logged today but not tomorrow, and was reminded tomorrow
+    tomorrow = today + timedelta(days=1)
+    check("get_users_due_for_reminder skips users who logged", await due_at(12 * 60 + 30) == ([], [])
+          and await due_at(12 * 60 + 30, tomorrow) == ([1002], []))
+    # The queue was busy, so his reminder went out a minute late
+    await db.record_reminder_outcomes([(bob.id, tomorrow, "sent", utc(tomorrow, 12, 31, 10))])
+    check("get_users_due_for_reminder nudges an hour after the reminder was sent",
+          await due_at(13 * 60 + 31, tomorrow, nudge_after=60) == ([], [(1002, tomorrow)])
+          and await due_at(13 * 60 + 30, tomorrow, nudge_after=60) == ([], [])
+          and await due_at(13 * 60 + 31, today, nudge_after=60) == ([], []))
+    # Moving the reminder to 22:00 (13:00 UTC) afterwards doesn't move the nudge
+    await db.update_reminder_time(1002, "22:00")
+    check("nudges follow the sent reminder, not the new reminder time",
+          await due_at(13 * 60 + 31, tomorrow, nudge_after=60) == ([], [(1002, tomorrow)])
+          and await due_at(14 * 60, tomorrow, nudge_after=60) == ([], []))
+    await db.update_reminder_time(1002, "21:30")
+    check("claim_nudges", await db.claim_nudges([(bob.id, tomorrow)]) == [bob.id]
+          and await db.claim_nudges([(bob.id, tomorrow)]) == []
+          and await due_at(13 * 60 + 31, tomorrow, nudge_after=60) == ([], []))
+
+    # Claims a shutdown or crash left unsent can be claimed again; sent ones can't
+    later = today + timedelta(days=2)
+    await db.claim_reminders([(alice.id, later), (bob.id, later)])
+    await db.record_reminder_outcomes([(alice.id, later, "sent", utc(later, 20, 0))])
+    await db.release_reminders([(alice.id, later), (bob.id, later)])
+    check("release_reminders", await db.claim_reminders([(alice.id, later), (bob.id, later)]) == [bob.id])
+    check("release_pending_reminders", await db.release_pending_reminders() == 1
+          and await db.claim_reminders([(bob.id, later)]) == [bob.id])
+    await db.release_nudges([(bob.id, tomorrow)])
+    check("release_nudges", await db.claim_nudges([(bob.id, tomorrow)]) == [bob.id])
+
+    # At 10:00 UTC it is `today` for Alice (default zone) and Bob (Tokyo) alike
+    midday = datetime.combine(today, dt_time(10), timezone.utc)
+    leaderboard = await db.get_all_users_weekly_stats(midday)
+    check("get_all_users_weekly_stats", [s["user_id"] for s in leaderboard] == [alice.id, bob.id]
+          and leaderboard[0]["quran_pages"] == 7 and leaderboard[1]["tahajjud_days"] == 1)
+    monthly_board = await db.get_all_users_stats(30, midday)
+    check("get_all_users_stats", monthly_board[0]["quran_pages"] == 14 and monthly_board[1]["days_logged"] == 1)
+    today_all = {p["username"]: p for p in await db.get_today_all_progress(midday)}
+    check("get_today_all_progress", today_all["alice2"]["logged"] and today_all["User_1002"]["quran_pages"] == 3)
+
+    # Admin views go by each user's local date. At 20:00 UTC it is already
+    # tomorrow in Tokyo; at 02:00 UTC it is still yesterday in New York.
+    await db.set_timezone(1001, "America/New_York")
+    await db.save_progress(alice.id, today - timedelta(days=8), 4, 0, False, 0, False)
+    await db.save_progress(bob.id, today - timedelta(days=7), 6, 0, False, 0, True)
+    evening = datetime.combine(today, dt_time(20), timezone.utc)
+    early = datetime.combine(today, dt_time(2), timezone.utc)
+    logged_evening = {p["username"]: p["logged"] for p in await db.get_today_all_progress(evening)}
+    logged_early = {p["username"]: p["logged"] for p in await db.get_today_all_progress(early)}
+    check("get_today_all_progress by local date", logged_evening == {"alice2": True, "User_1002": False}
+          and logged_early == {"alice2": False, "User_1002": True})
+    by_user = {s["user_id"]: s for s in await db.get_all_users_weekly_stats(midday)}
+    check("get_all_users_weekly_stats window", by_user[alice.id]["quran_pages"] == 7
+          and by_user[bob.id]["quran_pages"] == 9 and by_user[bob.id]["fasting_days"] == 2)
+    ahead = {s["user_id"]: s for s in await db.get_all_users_weekly_stats(evening)}
+    check("get_all_users_weekly_stats a day ahead", ahead[bob.id]["quran_pages"] == 3
+          and ahead[bob.id]["days_logged"] == 1 and ahead[alice.id]["quran_pages"] == 7)
+    behind = {s["user_id"]: s for s in await db.get_all_users_weekly_stats(early)}
+    check("get_all_users_weekly_stats a day behind", behind[alice.id]["quran_pages"] == 11
+          and behind[alice.id]["days_logged"] == 3 and behind[bob.id]["quran_pages"] == 9)
+
+    check("get_setting missing", await db.get_setting("current_book") is None)
+    await db.set_setting("current_book", "Book A")
+    await db.set_setting("current_book", "Book B")
+    check("set_setting / get_setting", await db.get_setting("current_book") == "Book B")
+
+    broadcast = await db.create_broadcast("hello", 1001)
+    await db.set_broadcast_status_message(broadcast.id, 77)
+    pending = await db.get_pending_broadcast_recipients(broadcast.id)
+    check("create_broadcast addresses every user", sorted(pending) == [1001, 1002])
+    await db.record_broadcast_deliveries(broadcast.id, [(1001, "sent")])
+    check("record_broadcast_deliveries", await db.get_broadcast_counts(broadcast.id) == {"sent": 1, "pending": 1})
+    unfinished = await db.get_unfinished_broadcasts()
+    check("get_unfinished_broadcasts", [b.status_message_id for b in unfinished] == [77])
+    await db.finish_broadcast(broadcast.id)
+    check("finish_broadcast", await db.get_unfinished_broadcasts() == [])
+
+    await db.save_persisted_state({1001: '{"a": 1}', 1002: '{"b": 2}'}, {("log", "[1, 1]"): "3"})
+    await db.save_persisted_state({1002: None}, {("log", "[1, 1]"): "4", ("log", "[2, 2]"): "1"})
+    await db.save_persisted_state({}, {("log", "[2, 2]"): None})
+    check("persisted user_data", await db.load_persisted_user_data() == {1001: '{"a": 1}'})
+    check("persisted conversations", await db.load_persisted_conversations("log") == {"[1, 1]": "4"})
+
+
+async def time_burst(users: int) -> None:
+    ids = [2_000_000 + i for i in range(users)]
+    db_users = await asyncio.gather(*(db.create_user(i, f"u{i}", can_dm=True) for i in ids))
+    today = date.today()
+
+    async def log_and_read(user):
+        await db.save_progress(user.id, today, 1, 1, True, 1, False)
+        await db.get_user(user.telegram_id)
+        await db.get_today_progress(user.id)
+        await db.get_setting("current_book")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(log_and_read(u) for u in db_users))
+    elapsed = time.perf_counter() - start
+    print(f"{users} concurrent save + 3 reads: {elapsed * 1000:.0f} ms ({users / elapsed:.0f} users/s)")
+
+
+async def run(users: int) -> None:
+    try:
+        await check_functions()
+        await time_burst(users)
+    finally:
+        await db.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"backend: {DATABASE_BACKEND}")
+    asyncio.run(run(args.users))
+    print("all checks passed" if not failures else f"{len(failures)} check(s) failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Reminder fan-out through SendQueue against a fake Bot, during a broadcast.
+
+The fake Bot has per-call latency, occasionally times out, answers one
+call with RetryAfter and rejects a few chats with Forbidden. A broadcast is
+queued first and the reminders right after it. The run checks that every
+message gets an outcome, that neither the global nor the per-chat rate
+limit is exceeded, and that the reminders didn't wait for the broadcast:
+their p95 latency must be within what the reminders alone take to send.
+
+Usage: python checks/check_delivery.py [--messages N] [--broadcast N] [--rate R]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "check")
+
+from telegram.error import Forbidden, RetryAfter, TimedOut  # noqa: E402
+
+from delivery import BLOCKED, BULK, PER_CHAT_INTERVAL, SENT, SendQueue  # noqa: E402
+
+# Seconds of reminder latency allowed on top of sending them at the rate
+# limit: the RetryAfter pause and a timed-out send's retries
+LATENCY_SLACK = 3.0
+
+
+class FakeBot:
+    def __init__(self, latency: float = 0.05, blocked_every: int = 97, timeout_rate: float = 0.02):
+        self.latency = latency
+        self.blocked_every = blocked_every
+        self.timeout_rate = timeout_rate
+        self.rng = random.Random(0)
+        self.calls = 0
+        self.sent_at: dict[int, list[float]] = defaultdict(list)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.calls == 50:
+            raise RetryAfter(1)
+        if chat_id % self.blocked_every == 0:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        if self.rng.random() < self.timeout_rate:
+            raise TimedOut("Timed out")
+        self.sent_at[chat_id].append(time.monotonic())
+
+
+def max_per_second(timestamps: list[float]) -> int:
+    timestamps = sorted(timestamps)
+    best = 0
+    start = 0
+    for end, ts in enumerate(timestamps):
+        while ts - timestamps[start] >= 1.0:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run(messages: int, broadcast: int, rate: float) -> int:
+    bot = FakeBot()
+    blocked = []
+
+    async def on_blocked(chat_id: int):
+        blocked.append(chat_id)
+
+    queue = SendQueue(bot, rate=rate, on_blocked=on_blocked)
+    queue.start()
+
+    start = time.monotonic()
+    done_at: dict[asyncio.Future, float] = {}
+
+    def finished(future: asyncio.Future):
+        done_at[future] = time.monotonic()
+
+    bulk = [queue.submit(500_000 + i, "broadcast", priority=BULK) for i in range(broadcast)]
+    futures = [queue.submit(1000 + i, "reminder") for i in range(2)]
+    # Several messages to one chat at once, picked up by different workers
+    # while they all wait on the global limiter
+    futures += [queue.submit(999, "burst") for _ in range(3)]
+    futures += [queue.submit(1000 + i, "reminder") for i in range(2, messages)]
+    # A few users get a second message straight away (e.g. a manual reminder)
+    futures += [queue.submit(1000 + i, "again") for i in range(1, 11)]
+    for future in futures:
+        future.add_done_callback(finished)
+    reminders = len(futures)
+    futures += bulk
+    peak_depth = queue.depth
+    outcomes = await asyncio.gather(*futures)
+    elapsed = time.monotonic() - start
+    await queue.stop()
+    reminder_p95 = percentile([at - start for at in done_at.values()], 0.95)
+    reminder_budget = reminders / rate + LATENCY_SLACK
+
+    all_sends = [ts for stamps in bot.sent_at.values() for ts in stamps]
+    per_chat_gap = min(
+        (b - a for stamps in bot.sent_at.values() for a, b in zip(stamps, stamps[1:])),
+        default=PER_CHAT_INTERVAL
+    )
+    stats = queue.stats
+
+    print(f"{len(futures)} messages in {elapsed:.1f}s ({len(futures) / elapsed:.1f} msg/s, limit {rate:g})")
+    print(f"sent={stats.sent} blocked={stats.blocked} failed={stats.failed} retries={stats.retries}")
+    print(f"peak queue depth={peak_depth} latency avg={stats.latency_avg:.2f}s max={stats.latency_max:.2f}s")
+    print(f"busiest second={max_per_second(all_sends)} msgs, smallest same-chat gap={per_chat_gap:.2f}s")
+    print(f"{reminders} reminders behind a {broadcast}-message broadcast: "
+          f"p95 latency {reminder_p95:.1f}s (budget {reminder_budget:.1f}s)")
+
+    ok = (
+        len(outcomes) == len(futures)
+        and outcomes.count(BLOCKED) == len(blocked)
+        and outcomes.count(SENT) == len(all_sends)
+        and max_per_second(all_sends) <= rate
+        and per_chat_gap >= PER_CHAT_INTERVAL * 0.99
+        and reminder_p95 <= reminder_budget
+    )
+    print("all checks passed" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--broadcast", type=int, default=300, help="broadcast messages queued ahead of the reminders")
+    parser.add_argument("--rate", type=float, default=30)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.messages, args.broadcast, args.rate)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Drive the command handlers with fake Telegram objects and check their replies.
+
+Runs /start, /today, the /log conversation, /stats, /results, /weekly,
+/settz and a reminder check through async_db on a fresh database, with
+FakeBot recording the replies (checks/fakes.py). Then presses /log's
+yes/no buttons out of turn through the whole Application, with
+OfflineRequest, and checks they are answered as expired.
+benchmarks/bench_handlers.py times the same handlers on a large
+synthetic database.
+
+Uses a fresh temporary SQLite file by default; set DATABASE_BACKEND and
+DATABASE_URL as for check_backend.py to use PostgreSQL.
+
+Usage: python checks/check_handlers.py
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123:check")
+_tmpdir = tempfile.mkdtemp(prefix="teabot-check-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "check.db")
+
+from telegram import Update  # noqa: E402
+from telegram.ext import ConversationHandler  # noqa: E402
+
+import async_db as db  # noqa: E402
+import bot  # noqa: E402
+import messages  # noqa: E402
+from fakes import (  # noqa: E402
+    FakeBot, FakeSendQueue, OfflineRequest, button_json, button_update, command, message_json, text_update,
+)
+from handlers import admin, commands, progress  # noqa: E402
+from scheduler import ReminderScheduler  # noqa: E402
+
+LOGGER = 4_000_001  # Logs progress
+IDLE = 4_000_002  # Doesn't, so gets a reminder
+STALE = 4_000_003  # Presses old buttons
+
+failures = []
+
+
+def check(name: str, ok: bool) -> None:
+    print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    if not ok:
+        failures.append(name)
+
+
+async def run() -> None:
+    await db.init_db()
+    bot = FakeBot()
+    queue = FakeSendQueue()
+    reminders = ReminderScheduler(queue, engine="cron")
+
+    async def reply(handler, telegram_id: int, text: str) -> str:
+        update, context = command(bot, telegram_id, text, bot_data={"reminders": reminders})
+        await handler(update, context)
+        return bot.sent[-1][1]
+
+    check("/today before /start asks to /start",
+          await reply(commands.today, LOGGER, "/today") == messages.render("need_start"))
+    await reply(commands.start, LOGGER, "/start")
+    await reply(commands.start, IDLE, "/start")
+    user = await db.get_user(LOGGER)
+    check("/start registers the user", user is not None and await db.get_user(IDLE) is not None)
+    check("/today before logging says nothing is logged",
+          await reply(commands.today, LOGGER, "/today") == messages.render("today.empty", user.locale))
+
+    update, context = command(bot, LOGGER, "/log")
+    state = await progress.start_logging(update, context)
+    steps = (
+        (progress.receive_quran, text_update(bot, LOGGER, "5")),
+        (progress.receive_salawat, text_update(bot, LOGGER, "100")),
+        (progress.receive_tahajjud, button_update(bot, LOGGER, "tahajjud:yes")),
+        (progress.receive_book, text_update(bot, LOGGER, "10")),
+        (progress.receive_fasting, text_update(bot, LOGGER, "жоқ")),
+    )
+    states = [state]
+    for handler, step in steps:
+        states.append(await handler(step, context))
+    check("/log walks through every step",
+          states == [progress.QURAN, progress.SALAWAT, progress.TAHAJJUD, progress.BOOK, progress.FASTING,
+                     ConversationHandler.END])
+    saved = await db.get_today_progress(user.id, user.today())
+    check("/log saves the answers", saved is not None
+          and (saved.quran_pages, saved.salawat_count, saved.tahajjud, saved.book_pages, saved.fasted)
+          == (5, 100, True, 10, False))
+
+    quick = await reply(progress.start_logging, LOGGER, "/log q=5 q=7 s=1 t=иә b=1 f=жоқ")
+    unchanged = await db.get_today_progress(user.id, user.today())
+    check("quick /log with a key given twice is rejected with the usage",
+          quick.startswith(messages.render("log.invalid", user.locale))
+          and quick.endswith(messages.render("log.usage", user.locale)) and unchanged.quran_pages == 5)
+
+    check("/today shows the logged pages", "100" in await reply(commands.today, LOGGER, "/today"))
+    check("/stats answers", (await reply(commands.stats, LOGGER, "/stats"))
+          .startswith(messages.render("stats.header", user.locale)))
+    results = await reply(admin.results, LOGGER, "/results")
+    check("/results lists both users", results.startswith(messages.render("results.header", user.locale))
+          and results.count("\n") >= 2)
+    weekly = await reply(admin.weekly, LOGGER, "/weekly")
+    check("/weekly lists both users", weekly.startswith(messages.render("weekly.header", user.locale))
+          and weekly.count("\n") >= 2)
+
+    await reply(commands.settz, IDLE, "/settz Asia/Tokyo")
+    moved = (await db.get_user(IDLE)).timezone
+    await reply(commands.settz, IDLE, "/settz default")
+    check("/settz sets a timezone and default clears it",
+          moved == "Asia/Tokyo" and (await db.get_user(IDLE)).timezone is None)
+
+    # Both are due now; only the one who hasn't logged is reminded
+    now = datetime.now(timezone.utc)
+    for telegram_id in (LOGGER, IDLE):
+        due = await db.get_user(telegram_id)
+        await db.update_reminder_time(telegram_id, now.astimezone(due.zone).strftime("%H:%M"))
+    reminders._checked_until = now.replace(second=0, microsecond=0) - timedelta(minutes=1)
+    await reminders._check_and_send_reminders()
+    await asyncio.gather(*reminders._pending)
+    check("the reminder goes only to the user who hasn't logged", queue.submitted == 1)
+
+
+async def stale_buttons() -> None:
+    """Presses of yes/no buttons the /log conversation has moved past, through the Application."""
+    request = OfflineRequest()
+    application = bot.build_application(request)
+    await application.initialize()
+
+    async def feed(*updates: dict) -> None:
+        for update in updates:
+            await application.process_update(Update.de_json(update, application.bot))
+
+    try:
+        await feed(message_json(1, STALE, "/start"), button_json(2, STALE, "fasting:yes"))
+        user = await db.get_user(STALE)
+        expired = messages.render("log.expired", user.locale)
+        check("a button pressed outside /log is answered as expired", request.answers == [expired])
+        await feed(message_json(3, STALE, "/log"), message_json(4, STALE, "5"), message_json(5, STALE, "100"),
+                   button_json(6, STALE, "fasting:no"))
+        check("a button for another step is answered as expired", request.answers == [expired] * 2)
+        await feed(button_json(7, STALE, "tahajjud:yes"))
+        check("the conversation still takes its own step's button", request.answers == [expired] * 2 + [""]
+              and request.sent[-1][1] == messages.render("log.book", user.locale,
+                                                         book=await db.get_setting("current_book")))
+    finally:
+        await application.shutdown()
+
+
+async def main_async() -> None:
+    try:
+        await run()
+        await stale_buttons()
+    finally:
+        await db.shutdown()
+
+
+def main():
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.run(main_async())
+    print("all checks passed" if not failures else f"{len(failures)} check(s) failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Check that the /weekly rollups match the original aggregate query.
+
+Seeds random history, applies inserts, re-logs and deletes, moves the
+window forward a few days, and checks after each step that every rollup
+window matches the original LEFT JOIN ... GROUP BY query.
+benchmarks/bench_leaderboard.py times the two against each other. Always
+uses SQLite; the postgres backend has no rollups.
+
+Usage: python checks/check_leaderboard.py [--users N] [--days D]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "check")
+_tmpdir = tempfile.mkdtemp(prefix="teabot-check-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "check.db")
+
+import database as db  # noqa: E402
+
+
+def aggregate_query(since: date) -> dict[int, tuple]:
+    """The query get_all_users_weekly_stats ran before rollups existed."""
+    with db.get_connection() as conn:
+        cursor = conn.execute(
+            """SELECT
+                u.id,
+                COALESCE(SUM(p.quran_pages), 0),
+                COALESCE(SUM(p.salawat_count), 0),
+                COALESCE(SUM(p.tahajjud), 0),
+                COALESCE(SUM(p.book_pages), 0),
+                COALESCE(SUM(p.fasted), 0),
+                COUNT(p.id)
+               FROM users u
+               LEFT JOIN daily_progress p ON u.id = p.user_id AND p.date >= ?
+               GROUP BY u.id""",
+            (since.isoformat(),)
+        )
+        return {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+
+def rollup_read(window_days: int, today: date) -> dict[int, tuple]:
+    with db.get_connection() as conn:
+        db._refresh_rollups(conn, today)
+        cursor = conn.execute(
+            """SELECT u.id, COALESCE(r.quran_pages, 0), COALESCE(r.salawat_count, 0),
+                      COALESCE(r.tahajjud_days, 0), COALESCE(r.book_pages, 0),
+                      COALESCE(r.fasting_days, 0), COALESCE(r.days_logged, 0)
+               FROM users u
+               LEFT JOIN progress_rollups r ON r.user_id = u.id AND r.window_days = ?""",
+            (window_days,)
+        )
+        return {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+
+def check(step: str, today: date) -> None:
+    for window_days in db.ROLLUP_WINDOWS:
+        expected = aggregate_query(today - timedelta(days=window_days))
+        actual = rollup_read(window_days, today)
+        if expected != actual:
+            bad = [uid for uid in expected if expected[uid] != actual.get(uid)]
+            sys.exit(f"MISMATCH after {step} ({window_days}d window): users {bad[:10]}")
+    print(f"ok: {step}")
+
+
+def random_progress(rng: random.Random) -> tuple:
+    return rng.randrange(30), rng.randrange(500), rng.random() < 0.3, rng.randrange(40), rng.random() < 0.1
+
+
+def seed(users: int, days: int, today: date, rng: random.Random) -> list[int]:
+    """Create `users` users with about 70% of `days` days logged; returns their ids."""
+    user_ids = [db.create_user(1_000_000 + i, f"user{i}").id for i in range(users)]
+    with db.get_connection() as conn:
+        conn.executemany(
+            """INSERT INTO daily_progress
+               (user_id, date, quran_pages, salawat_count, tahajjud, book_pages, fasted)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            [
+                (uid, (today - timedelta(days=d)).isoformat(), *random_progress(rng))
+                for uid in user_ids
+                for d in range(days)
+                if rng.random() < 0.7
+            ]
+        )
+        conn.commit()
+    return user_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--days", type=int, default=120)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    today = date.today()
+    db.init_db()
+
+    user_ids = seed(args.users, args.days, today, rng)
+    check("seeding history", today)
+
+    for uid in rng.sample(user_ids, min(500, len(user_ids))):
+        db.save_progress(uid, today - timedelta(days=rng.randrange(40)), *random_progress(rng))
+    check("re-logging recent days", today)
+
+    late = [db.create_user(2_000_000 + i, f"late{i}").id for i in range(20)]
+    for uid in late:
+        db.save_progress(uid, today, *random_progress(rng))
+    check("new users logging today", today)
+
+    with db.get_connection() as conn:
+        conn.execute("DELETE FROM daily_progress WHERE date = ?", ((today - timedelta(days=3)).isoformat(),))
+        conn.commit()
+    check("deleting a day", today)
+
+    for ahead in (1, 2, 10):
+        check(f"window moved forward {ahead} day(s)", today + timedelta(days=ahead))
+    print("rollups match the aggregate query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Check that a half-finished /log conversation survives a restart.
+
+First at the storage level: persists a conversation that has reached the
+BOOK step together with its partial answers, then loads them with a fresh
+DatabasePersistence (as a restarted bot would) and checks they come back.
+
+Then end to end: builds the bot as bot.py does, with OfflineRequest
+answering the Bot API calls, and feeds it /start, /log and answers up to
+the BOOK step. It shuts down, a second application is built in its place,
+and the next two answers must finish the conversation and save the day
+with the answers given before the restart.
+
+Usage: python checks/check_persistence_restart.py
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123:check")
+_tmpdir = tempfile.mkdtemp(prefix="teabot-check-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "check.db")
+
+from telegram import Update  # noqa: E402
+
+import async_db  # noqa: E402
+import bot  # noqa: E402
+import database as db  # noqa: E402
+import messages  # noqa: E402
+from config import DATABASE_BACKEND  # noqa: E402
+from fakes import OfflineRequest, button_json, message_json  # noqa: E402
+from handlers.progress import BOOK  # noqa: E402
+from persistence import DatabasePersistence  # noqa: E402
+
+CONVERSATION = "log_progress"
+USER_ID = 1_000_000
+KEY = (USER_ID, USER_ID)  # (chat_id, user_id) in a private chat
+LOGGER = 5_000_001  # Telegram id for the end-to-end run
+
+failures = []
+
+
+def check(name: str, ok: bool) -> None:
+    print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    if not ok:
+        failures.append(name)
+
+
+async def storage_round_trip() -> None:
+    persistence = DatabasePersistence()
+    await persistence.get_user_data()
+    # What the application hands over on its periodic persistence pass
+    await asyncio.gather(
+        persistence.update_conversation(CONVERSATION, KEY, BOOK),
+        persistence.update_user_data(USER_ID, {
+            "db_user_id": 1,
+            "progress": {"quran_pages": 5, "salawat_count": 100, "tahajjud": True},
+        }),
+    )
+    await persistence.flush()
+
+    persistence = DatabasePersistence()
+    conversations = await persistence.get_conversations(CONVERSATION)
+    user_data = await persistence.get_user_data()
+    check("stored conversation state reloads", conversations.get(KEY) == BOOK)
+    check("stored partial answers reload",
+          user_data.get(USER_ID, {}).get("progress", {}).get("salawat_count") == 100)
+
+
+async def feed(request: OfflineRequest, updates: list[dict]) -> list[str]:
+    """Run one application over `updates`, shut it down, and return its replies."""
+    application = bot.build_application(request)
+    await application.initialize()
+    try:
+        for update in updates:
+            await application.process_update(Update.de_json(update, application.bot))
+    finally:
+        # Writes out the conversation states and user_data, as at any shutdown
+        await application.shutdown()
+    return [text for chat_id, text in request.sent if chat_id == LOGGER]
+
+
+async def across_restart() -> None:
+    before = await feed(OfflineRequest(), [
+        message_json(1, LOGGER, "/start"),
+        message_json(2, LOGGER, "/log"),
+        message_json(3, LOGGER, "5"),
+        message_json(4, LOGGER, "100"),
+        button_json(5, LOGGER, "tahajjud:yes"),
+    ])
+    user = await async_db.get_user(LOGGER)
+    check("conversation reaches the book step before the restart",
+          user is not None and before[-1] == messages.render("log.book", user.locale,
+                                                             book=await async_db.get_setting("current_book")))
+
+    after = await feed(OfflineRequest(), [
+        message_json(6, LOGGER, "10"),
+        message_json(7, LOGGER, "жоқ"),
+    ])
+    check("conversation continues after the restart", len(after) == 2 and after[-1].startswith("✅"))
+    saved = await async_db.get_today_progress(user.id, user.today())
+    check("answers from both sides of the restart saved", saved is not None
+          and (saved.quran_pages, saved.salawat_count, saved.tahajjud, saved.book_pages, saved.fasted)
+          == (5, 100, True, 10, False))
+
+
+async def run() -> None:
+    # One event loop, as the postgres pool is bound to the loop it opened on
+    try:
+        await storage_round_trip()
+        await across_restart()
+    finally:
+        await async_db.shutdown()
+
+
+def main():
+    logging.getLogger().setLevel(logging.WARNING)
+    if DATABASE_BACKEND == "sqlite":
+        db.init_db()
+    asyncio.run(run())
+    print("all checks passed" if not failures else f"{len(failures)} check(s) failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
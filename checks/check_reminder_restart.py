@@ -0,0 +1,99 @@
+"""Check that a restart in the middle of a reminder burst loses no reminders.
+
+Users are due a reminder this minute. A first run claims some of them and
+dies without sending (a crash). A second run starts sending to everyone
+through a slow send queue and is shut down as the bot would be, with most
+of the burst still queued. A third run catches up. Every user must end up
+with exactly one reminder.
+
+Uses a fresh temporary SQLite file by default; set DATABASE_BACKEND and
+DATABASE_URL as for check_backend.py to use PostgreSQL.
+
+Usage: python checks/check_reminder_restart.py [--users N]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "check")
+_tmpdir = tempfile.mkdtemp(prefix="teabot-check-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "bench.db")
+
+import async_db as db  # noqa: E402
+from delivery import SendQueue  # noqa: E402
+from fakes import FakeBot  # noqa: E402
+from scheduler import ReminderScheduler  # noqa: E402
+
+FIRST_TELEGRAM_ID = 3_000_000
+# Messages per second, slow enough that the shutdown finds most of the burst queued
+RATE = 20
+
+
+async def run_bot(bot: FakeBot, until_sent: int) -> None:
+    """Start a scheduler and queue, and stop them once `until_sent` messages are out.
+
+    Gives up once nothing more can arrive in time.
+    """
+    queue = SendQueue(bot, workers=4, rate=RATE)
+    reminders = ReminderScheduler(queue, engine="timer")
+    queue.start()
+    reminders.start()
+    deadline = time.monotonic() + 5 + until_sent / RATE
+    try:
+        while len(bot.sent) < until_sent and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+    finally:
+        await reminders.stop()
+        await queue.stop()
+
+
+async def run(users: int) -> bool:
+    await db.init_db()
+    now = datetime.now(timezone.utc)
+    due = []
+    for i in range(users):
+        user = await db.create_user(FIRST_TELEGRAM_ID + i, f"r{i}", can_dm=True)
+        await db.update_reminder_time(user.telegram_id, now.astimezone(user.zone).strftime("%H:%M"))
+        due.append(user)
+
+    # A run that crashed right after claiming
+    await db.claim_reminders([(user.id, now.astimezone(user.zone).date()) for user in due[:users // 10]])
+
+    bot = FakeBot(latency=0.01)
+    await run_bot(bot, users // 4)
+    first = len(bot.sent)
+    print(f"shut down after {first} of {users} reminders")
+    await run_bot(bot, users)
+    await asyncio.sleep(0.5)  # Nothing more should arrive
+
+    counts = Counter(chat_id for chat_id, _ in bot.sent)
+    missing = users - len(counts)
+    twice = sum(1 for count in counts.values() if count > 1)
+    print(f"after the restart: {len(bot.sent)} reminders, {missing} users missed, {twice} reminded twice")
+    return first < users and missing == 0 and twice == 0
+
+
+async def main_async(users: int) -> bool:
+    try:
+        return await run(users)
+    finally:
+        await db.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100)
+    args = parser.parse_args()
+    ok = asyncio.run(main_async(args.users))
+    print("every user reminded once" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
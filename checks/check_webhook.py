@@ -0,0 +1,148 @@
+"""Replay recorded updates through the webhook server, with no network at all.
+
+Builds the bot as bot.py does, but with OfflineRequest answering the Bot
+API calls, and runs it in webhook mode on a free local port. POSTs each
+update in benchmarks/data/updates.jsonl and checks they are acknowledged,
+processed and answered: every user is stored and gets a reply to each
+command. Also checks what a client gets for a wrong secret (403), a body
+that isn't an update (400), one over the size limit (413), a chunked
+update (processed like any other) and a request that stalls (408).
+
+Usage: python checks/check_webhook.py [updates.jsonl]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123:check")
+os.environ["WEBHOOK_SECRET"] = "check-secret"
+os.environ["WEBHOOK_URL"] = ""
+_tmpdir = tempfile.mkdtemp(prefix="teabot-check-")
+os.environ["DATABASE_PATH"] = os.path.join(_tmpdir, "bench.db")
+
+import async_db  # noqa: E402
+import bot  # noqa: E402
+import database as db  # noqa: E402
+import http_server  # noqa: E402
+import metrics  # noqa: E402
+import webhook  # noqa: E402
+from config import DATABASE_BACKEND, WEBHOOK_PATH  # noqa: E402
+from fakes import OfflineRequest, message_json  # noqa: E402
+
+SECRET = os.environ["WEBHOOK_SECRET"]
+DEFAULT_UPDATES = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "data", "updates.jsonl")
+STALL_TIMEOUT = 0.5
+
+failures = []
+
+
+def check(name: str, ok: bool) -> None:
+    print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    if not ok:
+        failures.append(name)
+
+
+async def exchange(port: int, raw: bytes, stall: bool = False) -> int:
+    """Send `raw` on a new connection and return the response's status code."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(raw)
+    await writer.drain()
+    try:
+        response = await asyncio.wait_for(reader.read(), STALL_TIMEOUT * 4 if stall else 10)
+    finally:
+        writer.close()
+    return int(response.split(b" ", 2)[1]) if response else 0
+
+
+def post(body: bytes, secret: str = SECRET, chunked: bool = False) -> bytes:
+    head = [f"POST {WEBHOOK_PATH} HTTP/1.1", "Host: localhost", "Content-Type: application/json",
+            f"X-Telegram-Bot-Api-Secret-Token: {secret}", "Connection: close"]
+    if chunked:
+        half = len(body) // 2
+        head.append("Transfer-Encoding: chunked")
+        body = b"".join(b"%x\r\n%s\r\n" % (len(part), part) for part in (body[:half], body[half:])) + b"0\r\n\r\n"
+    else:
+        head.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(head) + "\r\n\r\n").encode() + body
+
+
+async def wait_processed(target: float, timeout: float = 10) -> bool:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while metrics.UPDATES.value() < target and loop.time() < deadline:
+        await asyncio.sleep(0.05)
+    return metrics.UPDATES.value() >= target
+
+
+async def replay(bodies: list[bytes], request: OfflineRequest, server: http_server.HttpServer) -> None:
+    port = server.port
+    statuses = [await exchange(port, post(body)) for body in bodies]
+    check(f"{len(bodies)} recorded updates acknowledged", statuses == [200] * len(bodies))
+    check("recorded updates processed", await wait_processed(len(bodies)))
+
+    updates = [json.loads(body) for body in bodies]
+    chats = {u["message"]["chat"]["id"] for u in updates}
+    replies = {chat: sum(1 for chat_id, _ in request.sent if chat_id == chat) for chat in chats}
+    commands = {chat: sum(1 for u in updates if u["message"]["chat"]["id"] == chat) for chat in chats}
+    check("every command answered", replies == commands)
+    stored = [await async_db.get_user(u["message"]["from"]["id"]) for u in updates]
+    check("senders stored", all(stored))
+
+    before = metrics.UPDATES.value()
+    chunked = json.dumps(message_json(900_001, 900_001, "/start")).encode()
+    check("chunked update acknowledged", await exchange(port, post(chunked, chunked=True)) == 200)
+    check("chunked update processed", await wait_processed(before + 1)
+          and await async_db.get_user(900_001) is not None
+          and any(chat_id == 900_001 for chat_id, _ in request.sent))
+
+    check("wrong secret rejected with 403", await exchange(port, post(bodies[0], secret="wrong")) == 403)
+    check("invalid update rejected with 400", await exchange(port, post(b"{not json")) == 400)
+    # Rejected on its Content-Length, before the body is read
+    too_big = post(b"x" * (http_server.MAX_BODY_SIZE + 1)).split(b"\r\n\r\n")[0] + b"\r\n\r\n"
+    check("oversized body rejected with 413", await exchange(port, too_big) == 413)
+    stalled = post(bodies[0])[:40]
+    check("stalled request dropped with 408", await exchange(port, stalled, stall=True) == 408)
+    check("rejected requests not processed", metrics.UPDATES.value() == before + 1)
+
+
+async def run(path: str) -> None:
+    with open(path, "rb") as f:
+        bodies = [line.strip() for line in f if line.strip()]
+
+    request = OfflineRequest()
+    application = bot.build_application(request)
+    server = webhook.create_server(application, port=0)
+    stop = asyncio.Event()
+    running = asyncio.create_task(webhook.run_webhook(application, server, stop))
+    try:
+        while server.port == 0 and not running.done():
+            await asyncio.sleep(0.01)
+        if running.done():
+            running.result()  # Raises why it stopped
+        await replay(bodies, request, server)
+    finally:
+        stop.set()
+        await running
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("updates", nargs="?", default=DEFAULT_UPDATES)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    http_server.HEADER_TIMEOUT = STALL_TIMEOUT
+    if DATABASE_BACKEND == "sqlite":
+        db.init_db()
+    asyncio.run(run(args.updates))
+    print("all checks passed" if not failures else f"{len(failures)} check(s) failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Stand-ins for the Telegram objects handlers use, for driving them directly.
+
+Only the attributes and methods the handlers touch are provided. Every
+reply goes through FakeBot.send_message, which records it instead of
+calling Telegram. FakeSendQueue does the same for the scheduler.
+OfflineRequest goes one level lower, for running the whole Application
+without a network: it answers the Bot API calls themselves, and
+message_json and button_json build the updates to feed it.
+"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from telegram.request import BaseRequest, RequestData
+
+from delivery import SENT
+
+
+class FakeBot:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.sent: list[tuple[int, str]] = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> "FakeMessage":
+        # Always yield, as a real request would
+        await asyncio.sleep(self.latency)
+        self.sent.append((chat_id, text))
+        return FakeMessage(self, FakeChat(chat_id), text)
+
+
+@dataclass
+class FakeUser:
+    id: int
+    username: Optional[str] = None
+    first_name: str = "Test"
+
+
+@dataclass
+class FakeChat:
+    id: int
+    type: str = "private"
+
+
+@dataclass
+class FakeMessage:
+    bot: FakeBot
+    chat: FakeChat
+    text: Optional[str] = None
+
+    async def reply_text(self, text: str, **kwargs) -> "FakeMessage":
+        return await self.bot.send_message(self.chat.id, text, **kwargs)
+
+    async def reply_document(self, document: Any, **kwargs) -> "FakeMessage":
+        return await self.bot.send_message(self.chat.id, "<document>", **kwargs)
+
+
+@dataclass
+class FakeCallbackQuery:
+    message: FakeMessage
+    data: str
+    answered: Optional[str] = None  # The text answered with, "" for none
+
+    async def answer(self, text: Optional[str] = None, **kwargs) -> bool:
+        self.answered = text or ""
+        return True
+
+    async def edit_message_reply_markup(self, reply_markup=None, **kwargs) -> FakeMessage:
+        return self.message
+
+
+@dataclass
+class FakeUpdate:
+    effective_user: FakeUser
+    effective_chat: FakeChat
+    message: Optional[FakeMessage] = None
+    callback_query: Optional[FakeCallbackQuery] = None
+
+    @property
+    def effective_message(self) -> FakeMessage:
+        return self.message or self.callback_query.message
+
+
+@dataclass
+class FakeContext:
+    bot: FakeBot
+    args: list[str] = field(default_factory=list)
+    user_data: dict = field(default_factory=dict)
+    chat_data: dict = field(default_factory=dict)
+    bot_data: dict = field(default_factory=dict)
+
+
+def text_update(bot: FakeBot, telegram_id: int, text: str) -> FakeUpdate:
+    """A private-chat message from `telegram_id`."""
+    user = FakeUser(telegram_id, f"user{telegram_id}")
+    chat = FakeChat(telegram_id)
+    return FakeUpdate(user, chat, message=FakeMessage(bot, chat, text))
+
+
+def command(bot: FakeBot, telegram_id: int, text: str, **context) -> tuple[FakeUpdate, FakeContext]:
+    """An update and context for a command such as "/log 5 100", as CommandHandler builds them."""
+    return text_update(bot, telegram_id, text), FakeContext(bot, args=text.split()[1:], **context)
+
+
+def button_update(bot: FakeBot, telegram_id: int, data: str) -> FakeUpdate:
+    """A press of an inline keyboard button carrying `data`."""
+    user = FakeUser(telegram_id, f"user{telegram_id}")
+    chat = FakeChat(telegram_id)
+    query = FakeCallbackQuery(FakeMessage(bot, chat), data)
+    return FakeUpdate(user, chat, callback_query=query)
+
+
+class FakeSendQueue:
+    """Accepts reminders and reports them sent at once; delivery has its own benchmark."""
+
+    depth = 0
+    stats = type("Stats", (), {"latency_avg": 0.0, "latency_max": 0.0})
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, chat_id: int, text: str, **kwargs) -> asyncio.Future:
+        self.submitted += 1
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(SENT)
+        return future
+
+    def cancel(self, futures: list[asyncio.Future]) -> list[asyncio.Future]:
+        return []  # Already sent
+
+
+def message_json(update_id: int, telegram_id: int, text: str) -> dict:
+    """A private-chat message from `telegram_id`, as Telegram sends it."""
+    message = {
+        "message_id": update_id, "date": 1760760000, "chat": {"id": telegram_id, "type": "private"},
+        "from": {"id": telegram_id, "is_bot": False, "first_name": "Test"}, "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"offset": 0, "length": len(text.split()[0]), "type": "bot_command"}]
+    return {"update_id": update_id, "message": message}
+
+
+def button_json(update_id: int, telegram_id: int, data: str) -> dict:
+    """A press of an inline keyboard button carrying `data`, under a message from the bot."""
+    message = {
+        "message_id": update_id, "date": 1760760000, "chat": {"id": telegram_id, "type": "private"},
+        "from": OfflineRequest.BOT, "text": "?",
+    }
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "chat_instance": str(telegram_id), "data": data, "message": message,
+        "from": {"id": telegram_id, "is_bot": False, "first_name": "Test"},
+    }}
+
+
+class OfflineRequest(BaseRequest):
+    """Bot API client that answers locally and records sent messages.
+
+    getMe describes a bot named "teabot"; sendMessage and editMessageText
+    return the message; any other method returns True. The texts button
+    presses were answered with are kept in `answers`.
+    """
+
+    BOT = {"id": 1, "is_bot": True, "first_name": "Teabot", "username": "teabot"}
+
+    def __init__(self):
+        self.sent: list[tuple[int, str]] = []
+        self.answers: list[str] = []
+        self.calls: list[str] = []
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         **timeouts) -> tuple[int, bytes]:
+        endpoint = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls.append(endpoint)
+        if endpoint == "answerCallbackQuery":
+            self.answers.append(params.get("text", ""))
+        if endpoint == "getMe":
+            result: Any = self.BOT
+        elif endpoint in ("sendMessage", "editMessageText"):
+            if endpoint == "sendMessage":
+                self.sent.append((int(params["chat_id"]), params["text"]))
+            result = {
+                "message_id": len(self.sent),
+                "date": int(time.time()),
+                "chat": {"id": int(params["chat_id"]), "type": "private"},
+                "from": self.BOT,
+                "text": params["text"],
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
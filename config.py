@@ -7,6 +7,78 @@ BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 if not BOT_TOKEN:
     raise ValueError("TELEGRAM_BOT_TOKEN environment variable is required")
 
+# "sqlite" (the file at DATABASE_PATH) or "postgres" (DATABASE_URL)
+DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "sqlite")
 DATABASE_PATH = os.getenv("DATABASE_PATH", "./data/tea_bot.db")
+DATABASE_URL = os.getenv("DATABASE_URL")
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "10"))
+if DATABASE_BACKEND not in ("sqlite", "postgres"):
+    raise ValueError("DATABASE_BACKEND must be 'sqlite' or 'postgres'")
+if DATABASE_BACKEND == "postgres" and not DATABASE_URL:
+    raise ValueError("DATABASE_URL environment variable is required with the postgres backend")
 DEFAULT_REMINDER_TIME = "20:00"
 TIMEZONE = os.getenv("TIMEZONE", "Asia/Almaty")
+
+# Language for users who haven't chosen one with /lang (see messages.py)
+LOCALE = os.getenv("LOCALE", "kk")
+if LOCALE not in ("kk", "ru"):
+    raise ValueError("LOCALE must be 'kk' or 'ru'")
+
+# How the scheduler finds due reminders: "cron" checks every minute, "timer"
+# sleeps until the next minute anyone has a reminder at
+REMINDER_ENGINE = os.getenv("REMINDER_ENGINE", "cron")
+if REMINDER_ENGINE not in ("cron", "timer"):
+    raise ValueError("REMINDER_ENGINE must be 'cron' or 'timer'")
+
+# Reminders missed by up to this many minutes (the bot was down or busy) are
+# sent late rather than skipped
+REMINDER_GRACE_MINUTES = int(os.getenv("REMINDER_GRACE_MINUTES", "30"))
+if not 0 <= REMINDER_GRACE_MINUTES < 24 * 60:
+    raise ValueError("REMINDER_GRACE_MINUTES must be from 0 to a day")
+
+# Minutes after the reminder to nudge users who still haven't logged; 0 (the
+# default) sends no nudges
+REMINDER_NUDGE_AFTER = int(os.getenv("REMINDER_NUDGE_AFTER", "0"))
+if not 0 <= REMINDER_NUDGE_AFTER < 24 * 60:
+    raise ValueError("REMINDER_NUDGE_AFTER must be from 0 to a day")
+
+# "polling" or "webhook". Webhook mode serves updates on WEBHOOK_LISTEN:WEBHOOK_PORT
+# and registers WEBHOOK_URL + WEBHOOK_PATH with Telegram if WEBHOOK_URL is set.
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+if BOT_MODE not in ("polling", "webhook"):
+    raise ValueError("BOT_MODE must be 'polling' or 'webhook'")
+if BOT_MODE == "webhook" and not WEBHOOK_SECRET:
+    raise ValueError("WEBHOOK_SECRET environment variable is required in webhook mode")
+
+# Seconds before a cached setting is re-read; 0 caches until it is changed.
+# Only needed when several processes share the database.
+SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", "0"))
+
+# Days of daily_progress kept row by row; older days are rolled into monthly
+# totals each night. Must cover the longest /stats window (365 days); 0 (the
+# default) keeps everything.
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+if 0 < ARCHIVE_AFTER_DAYS <= 365:
+    raise ValueError("ARCHIVE_AFTER_DAYS must be more than 365, or 0 to disable archiving")
+
+# Local Prometheus-style /metrics endpoint; 0 turns metrics off entirely
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+
+# Number of users kept in the per-process lookup cache
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+# Updates processed at once; each chat's updates still run in order
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+
+# Seconds between writes of /log conversation state to the database
+PERSISTENCE_INTERVAL = float(os.getenv("PERSISTENCE_INTERVAL", "10"))
+
+# Outgoing message limits (Telegram allows ~30 messages/second per bot)
+SEND_RATE_LIMIT = float(os.getenv("SEND_RATE_LIMIT", "30"))
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", "8"))
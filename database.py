@@ -1,76 +1,170 @@
 import sqlite3
-from datetime import date, datetime, timedelta
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from itertools import islice
+from typing import Iterable, Iterator, Optional
 from contextlib import contextmanager
 
-from config import DATABASE_PATH, DEFAULT_REMINDER_TIME
-from models import User, DailyProgress
+import migrations
+import timezones
+from config import DATABASE_PATH, DEFAULT_REMINDER_TIME, SETTINGS_CACHE_TTL, USER_CACHE_SIZE
+from models import USER_COLUMNS, PROGRESS_COLUMNS, User, DailyProgress, Broadcast
+
+# Statements kept compiled per connection (sqlite3's LRU statement cache)
+STATEMENT_CACHE_SIZE = 256
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",  # 16 MiB page cache
+    "PRAGMA mmap_size = 268435456",  # 256 MiB
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+# Leaderboard windows (in days) kept as rollups in progress_rollups
+ROLLUP_WINDOWS = (7, 30)
+
+# (column in daily_progress, key in the stats dicts)
+STATS_FIELDS = (
+    ("quran_pages", "quran_pages"),
+    ("salawat_count", "salawat_count"),
+    ("tahajjud", "tahajjud_days"),
+    ("book_pages", "book_pages"),
+    ("fasted", "fasting_days"),
+)
+
+# Column order of bulk progress export/import rows (see progress_io.py).
+# Archived months have a "YYYY-MM" date, the tahajjud and fasted columns
+# count days, and they add days_logged.
+PROGRESS_EXPORT_FIELDS = (
+    "telegram_id", "date", "quran_pages", "salawat_count", "tahajjud", "book_pages", "fasted"
+)
+ARCHIVE_EXPORT_FIELDS = PROGRESS_EXPORT_FIELDS + ("days_logged",)
+EXPORT_BATCH_SIZE = 5000
+IMPORT_BATCH_SIZE = 50000
+
+# Rows archived per transaction, and free pages released per vacuum step;
+# both keep each write lock short
+ARCHIVE_BATCH_SIZE = 500
+VACUUM_STEP_PAGES = 1000
+
+_local = threading.local()
+_open_connections: list[sqlite3.Connection] = []
+_open_connections_lock = threading.Lock()
+
+# Settings cache: key -> (value, time loaded). The version is bumped on every
+# write so a read that raced with it doesn't cache the old value.
+_settings_cache: dict[str, tuple[Optional[str], float]] = {}
+_settings_version = 0
+_settings_lock = threading.Lock()
+
+# LRU cache of users by telegram_id, same versioning scheme as settings
+_user_cache: OrderedDict[int, User] = OrderedDict()
+_user_cache_version = 0
+_user_cache_lock = threading.Lock()
+_user_cache_hits = 0
+_user_cache_misses = 0
+
+# A user's reminder_time as minutes past local midnight
+_LOCAL_REMINDER_MINUTE = (
+    "(CAST(substr(reminder_time, 1, 2) AS INTEGER) * 60 + CAST(substr(reminder_time, 4, 2) AS INTEGER))"
+)
+
+# window_days -> the `since` date this process last saw the rollup at
+_rollups_since: dict[int, str] = {}
+
+
+def _connect() -> sqlite3.Connection:
+    # Each connection is only used by the thread that opened it; disabling
+    # the same-thread check just lets close_all_connections() run elsewhere.
+    conn = sqlite3.connect(
+        DATABASE_PATH,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False
+    )
+    conn.row_factory = sqlite3.Row
+    # auto_vacuum only takes effect before the first table is created
+    # (switching to WAL counts), or at the next full VACUUM (see
+    # vacuum_step). Setting it on an existing database needs the write lock,
+    # so it is only set on a new, empty one.
+    if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    with _open_connections_lock:
+        _open_connections.append(conn)
+    return conn
 
 
 @contextmanager
 def get_connection():
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+    """Yield this thread's long-lived connection, opening it on first use.
+
+    The connection stays open between calls so the page cache and compiled
+    statements are reused. Uncommitted work is rolled back on error.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _connect()
     try:
         yield conn
-    finally:
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def close_connection() -> None:
+    """Close the calling thread's connection, if one is open."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _local.conn = None
+        with _open_connections_lock:
+            _open_connections.remove(conn)
         conn.close()
 
 
-def init_db():
-    with get_connection() as conn:
-        conn.executescript("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                telegram_id INTEGER UNIQUE NOT NULL,
-                username TEXT,
-                reminder_time TEXT DEFAULT '20:00',
-                is_admin INTEGER DEFAULT 0,
-                can_dm INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-
-            CREATE TABLE IF NOT EXISTS daily_progress (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                date DATE NOT NULL,
-                quran_pages INTEGER DEFAULT 0,
-                salawat_count INTEGER DEFAULT 0,
-                tahajjud INTEGER DEFAULT 0,
-                book_pages INTEGER DEFAULT 0,
-                fasted INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                UNIQUE(user_id, date)
-            );
-
-            CREATE TABLE IF NOT EXISTS settings (
-                key TEXT PRIMARY KEY,
-                value TEXT
-            );
-        """)
-        # Migration: add can_dm column if not exists
-        try:
-            conn.execute("ALTER TABLE users ADD COLUMN can_dm INTEGER DEFAULT 0")
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-        conn.commit()
+def close_all_connections() -> None:
+    """Close every thread's connection. Only call once those threads are idle."""
+    with _open_connections_lock:
+        connections = _open_connections[:]
+        _open_connections.clear()
+    for conn in connections:
+        conn.close()
+
+
+def init_db(include_online: bool = True) -> list[str]:
+    """Bring the schema up to date (see migrations/). Returns what was applied.
+
+    include_online=False leaves index-only migrations for a later
+    call, so startup on a large database isn't held up by index builds.
+    """
+    with get_connection() as conn:
+        return migrations.migrate(conn, include_online)
 
 
 def create_user(telegram_id: int, username: Optional[str] = None, is_admin: bool = False, can_dm: bool = False) -> User:
+    offset = timezones.utc_offset(None)
     with get_connection() as conn:
-        cursor = conn.execute(
-            """INSERT INTO users (telegram_id, username, reminder_time, is_admin, can_dm)
-               VALUES (?, ?, ?, ?, ?)
+        cursor = _user_cursor(conn).execute(
+            f"""INSERT INTO users
+               (telegram_id, username, reminder_time, is_admin, can_dm, utc_offset, reminder_utc_minute)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
                ON CONFLICT(telegram_id) DO UPDATE SET
                    username = excluded.username,
-                   can_dm = CASE WHEN excluded.can_dm = 1 THEN 1 ELSE users.can_dm END
-               RETURNING *""",
-            (telegram_id, username, DEFAULT_REMINDER_TIME, int(is_admin), int(can_dm))
+                   can_dm = CASE WHEN excluded.can_dm = 1 THEN 1 ELSE users.can_dm END,
+                   utc_offset = COALESCE(users.utc_offset, excluded.utc_offset),
+                   reminder_utc_minute = COALESCE(users.reminder_utc_minute, excluded.reminder_utc_minute)
+               RETURNING {USER_COLUMNS}""",
+            (telegram_id, username, DEFAULT_REMINDER_TIME, int(is_admin), int(can_dm),
+             offset, timezones.utc_minute(DEFAULT_REMINDER_TIME, offset))
         )
-        row = cursor.fetchone()
+        user = cursor.fetchone()
         conn.commit()
-        return _row_to_user(row)
+    _cache_user(user)
+    return user
 
 
 def set_can_dm(telegram_id: int, can_dm: bool) -> None:
@@ -80,39 +174,213 @@ def set_can_dm(telegram_id: int, can_dm: bool) -> None:
             (int(can_dm), telegram_id)
         )
         conn.commit()
+    _invalidate_user(telegram_id)
 
 
 def get_users_for_reminders() -> list[User]:
     """Get users who can receive DM reminders."""
     with get_connection() as conn:
-        cursor = conn.execute("SELECT * FROM users WHERE can_dm = 1")
-        return [_row_to_user(row) for row in cursor.fetchall()]
+        cursor = _user_cursor(conn).execute(f"SELECT {USER_COLUMNS} FROM users WHERE can_dm = 1")
+        return cursor.fetchall()
+
+
+def get_users_due_for_reminder(at: datetime, nudge_after: int = 0) -> tuple[list[User], list[tuple[User, date]]]:
+    """Get the DM-able users due a reminder, and a nudge, at UTC instant `at`.
+
+    Reminders are for users whose reminder falls on `at`'s UTC minute and
+    who have not logged progress for their local day. With nudge_after
+    (minutes), nudges are for users whose reminder went out in the minute
+    that long before (reminder_log.sent_at), whatever their reminder time
+    is now, and who haven't been nudged yet or logged the day reminded
+    about; each comes with that day. One query finds both lists.
+    """
+    sent_from = at.replace(second=0, microsecond=0) - timedelta(minutes=nudge_after)
+    params = {
+        "minute": at.hour * 60 + at.minute,
+        "at": at.strftime("%Y-%m-%d %H:%M:%S"),
+        "sent_from": sent_from.strftime("%Y-%m-%d %H:%M:%S") if nudge_after else None,
+        "sent_until": (sent_from + timedelta(minutes=1)).strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with get_connection() as conn:
+        rows = conn.execute(
+            f"""SELECT {USER_COLUMNS}, NULL AS reminder_date FROM users
+                WHERE can_dm = 1 AND reminder_utc_minute = :minute
+                  AND NOT EXISTS (
+                      SELECT 1 FROM daily_progress p
+                      WHERE p.user_id = users.id AND p.date = date(:at, utc_offset || ' minutes')
+                  )
+                UNION ALL
+                SELECT {USER_COLUMNS}, r.date FROM reminder_log r JOIN users ON users.id = r.user_id
+                WHERE r.status = 'sent' AND r.nudged_at IS NULL
+                  AND r.sent_at >= :sent_from AND r.sent_at < :sent_until
+                  AND users.can_dm = 1
+                  AND NOT EXISTS (
+                      SELECT 1 FROM daily_progress p WHERE p.user_id = users.id AND p.date = r.date
+                  )""",
+            params
+        ).fetchall()
+    due, nudges = [], []
+    for row in rows:
+        user = _user_factory(None, row)
+        if row["reminder_date"] is None:
+            due.append(user)
+        else:
+            nudges.append((user, date.fromisoformat(row["reminder_date"])))
+    return due, nudges
+
+
+def get_reminder_minutes() -> list[int]:
+    """The distinct UTC minutes of the day (0-1439) DM-able users have reminders at."""
+    with get_connection() as conn:
+        return [row[0] for row in conn.execute("SELECT DISTINCT reminder_utc_minute FROM users WHERE can_dm = 1")]
 
 
 def get_user(telegram_id: int) -> Optional[User]:
+    global _user_cache_hits, _user_cache_misses
+    with _user_cache_lock:
+        user = _user_cache.get(telegram_id)
+        if user is not None:
+            _user_cache.move_to_end(telegram_id)
+            _user_cache_hits += 1
+            return user
+        _user_cache_misses += 1
+        version = _user_cache_version
+
     with get_connection() as conn:
-        cursor = conn.execute(
-            "SELECT * FROM users WHERE telegram_id = ?",
+        cursor = _user_cursor(conn).execute(
+            f"SELECT {USER_COLUMNS} FROM users WHERE telegram_id = ?",
             (telegram_id,)
         )
-        row = cursor.fetchone()
-        return _row_to_user(row) if row else None
+        user = cursor.fetchone()
+    if not user:
+        return None
+
+    with _user_cache_lock:
+        if version == _user_cache_version:
+            _store_user(user)
+    return user
+
+
+def user_cache_stats() -> dict:
+    """Hit/miss counters and current size of the user cache."""
+    with _user_cache_lock:
+        return {
+            "hits": _user_cache_hits,
+            "misses": _user_cache_misses,
+            "size": len(_user_cache),
+            "max_size": USER_CACHE_SIZE
+        }
+
+
+def clear_user_cache() -> None:
+    global _user_cache_version
+    with _user_cache_lock:
+        _user_cache_version += 1
+        _user_cache.clear()
+
+
+def _store_user(user: User) -> None:
+    # Caller holds _user_cache_lock
+    _user_cache[user.telegram_id] = user
+    _user_cache.move_to_end(user.telegram_id)
+    while len(_user_cache) > USER_CACHE_SIZE:
+        _user_cache.popitem(last=False)
+
+
+def _cache_user(user: User) -> None:
+    global _user_cache_version
+    with _user_cache_lock:
+        _user_cache_version += 1
+        _store_user(user)
+
+
+def _invalidate_user(telegram_id: int) -> None:
+    global _user_cache_version
+    with _user_cache_lock:
+        _user_cache_version += 1
+        _user_cache.pop(telegram_id, None)
 
 
 def get_all_users() -> list[User]:
     with get_connection() as conn:
-        cursor = conn.execute("SELECT * FROM users")
-        return [_row_to_user(row) for row in cursor.fetchall()]
+        cursor = _user_cursor(conn).execute(f"SELECT {USER_COLUMNS} FROM users")
+        return cursor.fetchall()
 
 
 def update_reminder_time(telegram_id: int, time: str) -> bool:
+    local_minute = timezones.utc_minute(time, 0)  # Minutes past local midnight
     with get_connection() as conn:
         cursor = conn.execute(
-            "UPDATE users SET reminder_time = ? WHERE telegram_id = ?",
-            (time, telegram_id)
+            """UPDATE users SET
+                   reminder_time = ?,
+                   reminder_utc_minute = ((? - utc_offset) % 1440 + 1440) % 1440
+               WHERE telegram_id = ?""",
+            (time, local_minute, telegram_id)
         )
         conn.commit()
-        return cursor.rowcount > 0
+    _invalidate_user(telegram_id)
+    return cursor.rowcount > 0
+
+
+def set_timezone(telegram_id: int, timezone: Optional[str]) -> bool:
+    """Set a user's IANA timezone (None for the default) and reschedule their reminder."""
+    offset = timezones.utc_offset(timezone)
+    with get_connection() as conn:
+        cursor = conn.execute(
+            f"""UPDATE users SET
+                    timezone = ?,
+                    utc_offset = ?,
+                    reminder_utc_minute = (({_LOCAL_REMINDER_MINUTE} - ?) % 1440 + 1440) % 1440
+                WHERE telegram_id = ?""",
+            (timezone, offset, offset, telegram_id)
+        )
+        conn.commit()
+    _invalidate_user(telegram_id)
+    return cursor.rowcount > 0
+
+
+def set_locale(telegram_id: int, locale: Optional[str]) -> bool:
+    """Set a user's language (None for the default)."""
+    with get_connection() as conn:
+        cursor = conn.execute("UPDATE users SET locale = ? WHERE telegram_id = ?", (locale, telegram_id))
+        conn.commit()
+    _invalidate_user(telegram_id)
+    return cursor.rowcount > 0
+
+
+def get_timezones() -> list[Optional[str]]:
+    """The distinct timezones users have, None standing for the default."""
+    with get_connection() as conn:
+        return [row[0] for row in conn.execute("SELECT DISTINCT timezone FROM users")]
+
+
+def refresh_utc_offsets(timezone: Optional[str], offset: int) -> int:
+    """Reschedule the reminders of users in `timezone` whose offset isn't `offset`.
+
+    Called when a zone's UTC offset changes, e.g. at a DST transition.
+    Returns the number of users updated.
+    """
+    with get_connection() as conn:
+        cursor = conn.execute(
+            f"""UPDATE users SET
+                    utc_offset = ?,
+                    reminder_utc_minute = (({_LOCAL_REMINDER_MINUTE} - ?) % 1440 + 1440) % 1440
+                WHERE timezone IS ? AND utc_offset IS NOT ?""",
+            (offset, offset, timezone, offset)
+        )
+        conn.commit()
+    return cursor.rowcount
+
+
+def set_admin(telegram_id: int) -> bool:
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "UPDATE users SET is_admin = 1 WHERE telegram_id = ?",
+            (telegram_id,)
+        )
+        conn.commit()
+    _invalidate_user(telegram_id)
+    return cursor.rowcount > 0
 
 
 def save_progress(
@@ -125,8 +393,8 @@ def save_progress(
     fasted: bool
 ) -> DailyProgress:
     with get_connection() as conn:
-        cursor = conn.execute(
-            """INSERT INTO daily_progress
+        cursor = _progress_cursor(conn).execute(
+            f"""INSERT INTO daily_progress
                (user_id, date, quran_pages, salawat_count, tahajjud, book_pages, fasted)
                VALUES (?, ?, ?, ?, ?, ?, ?)
                ON CONFLICT(user_id, date) DO UPDATE SET
@@ -135,103 +403,142 @@ def save_progress(
                    tahajjud = excluded.tahajjud,
                    book_pages = excluded.book_pages,
                    fasted = excluded.fasted
-               RETURNING *""",
+               RETURNING {PROGRESS_COLUMNS}""",
             (user_id, progress_date.isoformat(), quran_pages, salawat_count, int(tahajjud), book_pages, int(fasted))
         )
-        row = cursor.fetchone()
+        progress = cursor.fetchone()
         conn.commit()
-        return _row_to_progress(row)
+        return progress
 
 
-def get_today_progress(user_id: int) -> Optional[DailyProgress]:
-    today = date.today().isoformat()
+def get_today_progress(user_id: int, today: Optional[date] = None) -> Optional[DailyProgress]:
+    """Get the user's progress for `today` (their local date; default the server's)."""
+    today = today or date.today()
     with get_connection() as conn:
-        cursor = conn.execute(
-            "SELECT * FROM daily_progress WHERE user_id = ? AND date = ?",
-            (user_id, today)
+        cursor = _progress_cursor(conn).execute(
+            f"SELECT {PROGRESS_COLUMNS} FROM daily_progress WHERE user_id = ? AND date = ?",
+            (user_id, today.isoformat())
         )
-        row = cursor.fetchone()
-        return _row_to_progress(row) if row else None
+        return cursor.fetchone()
 
 
 def get_weekly_stats(user_id: int) -> dict:
-    today = date.today()
-    week_ago = today - timedelta(days=7)
-
-    with get_connection() as conn:
-        cursor = conn.execute(
-            """SELECT
-                SUM(quran_pages) as total_quran,
-                SUM(salawat_count) as total_salawat,
-                SUM(tahajjud) as total_tahajjud,
-                SUM(book_pages) as total_book,
-                SUM(fasted) as total_fasted,
-                COUNT(*) as days_logged
-               FROM daily_progress
-               WHERE user_id = ? AND date >= ?""",
-            (user_id, week_ago.isoformat())
-        )
-        row = cursor.fetchone()
-        return {
-            "quran_pages": row["total_quran"] or 0,
-            "salawat_count": row["total_salawat"] or 0,
-            "tahajjud_days": row["total_tahajjud"] or 0,
-            "book_pages": row["total_book"] or 0,
-            "fasting_days": row["total_fasted"] or 0,
-            "days_logged": row["days_logged"] or 0
-        }
+    return get_windowed_stats(user_id, (7,))[7]
 
 
 def get_monthly_stats(user_id: int) -> dict:
-    today = date.today()
-    month_ago = today - timedelta(days=30)
+    return get_windowed_stats(user_id, (30,))[30]
+
+
+def get_windowed_stats(user_id: int, windows: tuple[Optional[int], ...], today: Optional[date] = None) -> dict:
+    """Get a user's totals over several trailing windows in one query.
+
+    Each window is a number of days (counted like the weekly stats: rows
+    dated on or after today minus that many days) or None for all time.
+    `today` is the user's local date, by default the server's.
+    Returns {window: stats dict}.
+    """
+    today = today or date.today()
+    columns = []
+    params: list = []
+    for i, window in enumerate(windows):
+        if window is None:
+            columns += [f"SUM({column}) as w{i}_{key}" for column, key in STATS_FIELDS]
+            columns.append(f"COUNT(*) as w{i}_days_logged")
+            continue
+        since = (today - timedelta(days=window)).isoformat()
+        columns += [
+            f"SUM(CASE WHEN date >= ? THEN {column} END) as w{i}_{key}"
+            for column, key in STATS_FIELDS
+        ]
+        columns.append(f"COUNT(CASE WHEN date >= ? THEN 1 END) as w{i}_days_logged")
+        params += [since] * (len(STATS_FIELDS) + 1)
+
+    # All-time totals include archived months; reading them in the same
+    # statement keeps a concurrent archive batch from being counted twice
+    stat_keys = [key for _, key in STATS_FIELDS] + ["days_logged"]
+    if None in windows:
+        columns += [
+            f"(SELECT SUM({key}) FROM progress_archive WHERE user_id = ?) as archived_{key}"
+            for key in stat_keys
+        ]
+        params += [user_id] * len(stat_keys)
+
+    # Only scan as far back as the longest window needs
+    query = f"SELECT {', '.join(columns)} FROM daily_progress WHERE user_id = ?"
+    params.append(user_id)
+    if None not in windows:
+        query += " AND date >= ?"
+        params.append((today - timedelta(days=max(windows))).isoformat())
 
     with get_connection() as conn:
-        cursor = conn.execute(
-            """SELECT
-                SUM(quran_pages) as total_quran,
-                SUM(salawat_count) as total_salawat,
-                SUM(tahajjud) as total_tahajjud,
-                SUM(book_pages) as total_book,
-                SUM(fasted) as total_fasted,
-                COUNT(*) as days_logged
-               FROM daily_progress
-               WHERE user_id = ? AND date >= ?""",
-            (user_id, month_ago.isoformat())
-        )
-        row = cursor.fetchone()
-        return {
-            "quran_pages": row["total_quran"] or 0,
-            "salawat_count": row["total_salawat"] or 0,
-            "tahajjud_days": row["total_tahajjud"] or 0,
-            "book_pages": row["total_book"] or 0,
-            "fasting_days": row["total_fasted"] or 0,
-            "days_logged": row["days_logged"] or 0
-        }
+        row = conn.execute(query, params).fetchone()
+
+    stats = {}
+    for i, window in enumerate(windows):
+        stats[window] = {key: row[f"w{i}_{key}"] or 0 for key in stat_keys}
+        if window is None:
+            for key in stat_keys:
+                stats[window][key] += row[f"archived_{key}"] or 0
+    return stats
 
 
-def get_all_users_weekly_stats() -> list[dict]:
+def get_all_users_weekly_stats(at: Optional[datetime] = None) -> list[dict]:
     """Get weekly stats for all users (for admin view)."""
-    today = date.today()
-    week_ago = today - timedelta(days=7)
+    return get_all_users_stats(7, at)
+
+
+def get_all_users_stats(window_days: int, at: Optional[datetime] = None) -> list[dict]:
+    """Get totals since `window_days` ago for all users, best Quran reader first.
+
+    "Ago" counts from each user's local date at UTC instant `at` (default
+    now), as their own /stats does. Reads the maintained rollup for the
+    window (see ROLLUP_WINDOWS) instead of aggregating daily_progress. The
+    rollup counts from the UTC date, and a user's local date is at most a
+    day either side of it, so users a day ahead have the rollup's first
+    day taken off and users a day behind have the day before it added.
+    """
+    if window_days not in ROLLUP_WINDOWS:
+        raise ValueError(f"No rollup is maintained for a {window_days}-day window")
 
+    at = (at or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    today = at.date()
+    since = today - timedelta(days=window_days)
+    # Comparing offsets with the time of day is cheaper than a date() per user
+    minutes = at.hour * 60 + at.minute + at.second / 60
+    params = {
+        "window_days": window_days,
+        "to_midnight": 1440 - minutes,
+        "since_midnight": minutes,
+        "first_day": since.isoformat(),
+        "day_before": (since - timedelta(days=1)).isoformat(),
+    }
     with get_connection() as conn:
+        _refresh_rollups(conn, today)
         cursor = conn.execute(
-            """SELECT
+            """WITH local AS (
+                   SELECT id, username, telegram_id,
+                          CASE WHEN utc_offset >= :to_midnight THEN 1
+                               WHEN utc_offset < -:since_midnight THEN -1 ELSE 0
+                          END AS ahead
+                   FROM users
+               )
+               SELECT
                 u.id,
                 u.username,
                 u.telegram_id,
-                COALESCE(SUM(p.quran_pages), 0) as total_quran,
-                COALESCE(SUM(p.salawat_count), 0) as total_salawat,
-                COALESCE(SUM(p.tahajjud), 0) as total_tahajjud,
-                COALESCE(SUM(p.book_pages), 0) as total_book,
-                COALESCE(SUM(p.fasted), 0) as total_fasted,
-                COUNT(p.id) as days_logged
-               FROM users u
-               LEFT JOIN daily_progress p ON u.id = p.user_id AND p.date >= ?
-               GROUP BY u.id
-               ORDER BY total_quran DESC""",
-            (week_ago.isoformat(),)
+                COALESCE(r.quran_pages, 0) - u.ahead * COALESCE(e.quran_pages, 0) as total_quran,
+                COALESCE(r.salawat_count, 0) - u.ahead * COALESCE(e.salawat_count, 0) as total_salawat,
+                COALESCE(r.tahajjud_days, 0) - u.ahead * COALESCE(e.tahajjud, 0) as total_tahajjud,
+                COALESCE(r.book_pages, 0) - u.ahead * COALESCE(e.book_pages, 0) as total_book,
+                COALESCE(r.fasting_days, 0) - u.ahead * COALESCE(e.fasted, 0) as total_fasted,
+                COALESCE(r.days_logged, 0) - u.ahead * (e.id IS NOT NULL) as days_logged
+               FROM local u
+               LEFT JOIN progress_rollups r ON r.user_id = u.id AND r.window_days = :window_days
+               LEFT JOIN daily_progress e ON e.user_id = u.id
+                   AND e.date = CASE u.ahead WHEN 1 THEN :first_day WHEN -1 THEN :day_before END
+               ORDER BY total_quran DESC, u.id""",
+            params
         )
         return [
             {
@@ -248,9 +555,219 @@ def get_all_users_weekly_stats() -> list[dict]:
         ]
 
 
-def get_today_all_progress() -> list[dict]:
-    """Get today's progress for all users (for admin view)."""
-    today = date.today().isoformat()
+def _refresh_rollups(conn: sqlite3.Connection, today: date) -> None:
+    """Move each rollup window forward to `today`, rebuilding it if it moved.
+
+    The triggers only add and remove rows as they are written, so this is
+    the one place days that fall out of a window are dropped. It runs once
+    per window per day; every other call returns on the in-memory check.
+    """
+    stale = []
+    for window_days in ROLLUP_WINDOWS:
+        since = (today - timedelta(days=window_days)).isoformat()
+        if _rollups_since.get(window_days) != since:
+            stale.append((window_days, since))
+    if not stale:
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for window_days, since in stale:
+            row = conn.execute(
+                "SELECT since FROM rollup_windows WHERE window_days = ?", (window_days,)
+            ).fetchone()
+            if row and row["since"] == since:
+                continue  # Another connection already rebuilt it
+            conn.execute("DELETE FROM progress_rollups WHERE window_days = ?", (window_days,))
+            conn.execute(
+                """INSERT INTO progress_rollups
+                   (user_id, window_days, quran_pages, salawat_count, tahajjud_days,
+                    book_pages, fasting_days, days_logged)
+                   SELECT user_id, ?, SUM(quran_pages), SUM(salawat_count), SUM(tahajjud),
+                          SUM(book_pages), SUM(fasted), COUNT(*)
+                   FROM daily_progress WHERE date >= ?
+                   GROUP BY user_id""",
+                (window_days, since)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO rollup_windows (window_days, since) VALUES (?, ?)",
+                (window_days, since)
+            )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    for window_days, since in stale:
+        _rollups_since[window_days] = since
+
+
+def archive_progress(before: date, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move up to batch_size days dated before `before` into progress_archive.
+
+    Each day is added to its user's monthly totals and deleted, oldest
+    first, in one short transaction. Returns the number of days moved, so
+    callers repeat until it returns 0.
+    """
+    batch = """SELECT id FROM daily_progress WHERE date < ?
+               ORDER BY date, id LIMIT ?"""
+    params = (before.isoformat(), batch_size)
+    with get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                f"""INSERT INTO progress_archive
+                    (user_id, month, quran_pages, salawat_count, tahajjud_days,
+                     book_pages, fasting_days, days_logged)
+                    SELECT user_id, substr(date, 1, 7), SUM(quran_pages), SUM(salawat_count),
+                           SUM(tahajjud), SUM(book_pages), SUM(fasted), COUNT(*)
+                    FROM daily_progress WHERE id IN ({batch})
+                    GROUP BY user_id, substr(date, 1, 7)
+                    ON CONFLICT(user_id, month) DO UPDATE SET
+                        quran_pages = quran_pages + excluded.quran_pages,
+                        salawat_count = salawat_count + excluded.salawat_count,
+                        tahajjud_days = tahajjud_days + excluded.tahajjud_days,
+                        book_pages = book_pages + excluded.book_pages,
+                        fasting_days = fasting_days + excluded.fasting_days,
+                        days_logged = days_logged + excluded.days_logged""",
+                params
+            )
+            moved = conn.execute(f"DELETE FROM daily_progress WHERE id IN ({batch})", params).rowcount
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return moved
+
+
+def claim_reminders(entries: list[tuple[int, date]]) -> list[int]:
+    """Record (user_id, the user's local date) reminders as about to be sent.
+
+    Returns the user_ids not already reminded on that date, the ones to
+    send to. Claiming before sending means a reminder goes out at most
+    once, even if the bot restarts in between.
+    """
+    claimed = []
+    with get_connection() as conn:
+        for user_id, day in entries:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO reminder_log (date, user_id) VALUES (?, ?)",
+                (day.isoformat(), user_id)
+            )
+            if cursor.rowcount:
+                claimed.append(user_id)
+        conn.commit()
+    return claimed
+
+
+def claim_nudges(entries: list[tuple[int, date]]) -> list[int]:
+    """Mark (user_id, date of their reminder) nudges as about to be sent.
+
+    Returns the user_ids not already nudged, the ones to send to.
+    """
+    claimed = []
+    with get_connection() as conn:
+        for user_id, day in entries:
+            cursor = conn.execute(
+                """UPDATE reminder_log SET nudged_at = CURRENT_TIMESTAMP
+                   WHERE date = ? AND user_id = ? AND nudged_at IS NULL""",
+                (day.isoformat(), user_id)
+            )
+            if cursor.rowcount:
+                claimed.append(user_id)
+        conn.commit()
+    return claimed
+
+
+def release_reminders(entries: list[tuple[int, date]]) -> None:
+    """Give back (user_id, date) claims whose reminder was never sent.
+
+    Only rows still 'pending' are deleted, so the next claim succeeds.
+    """
+    with get_connection() as conn:
+        conn.executemany(
+            "DELETE FROM reminder_log WHERE date = ? AND user_id = ? AND status = 'pending'",
+            [(day.isoformat(), user_id) for user_id, day in entries]
+        )
+        conn.commit()
+
+
+def release_pending_reminders() -> int:
+    """Give back every claim still 'pending', left by a previous run.
+
+    That run's send queue went with it, so those reminders were never
+    sent. Call before this run claims anything. Returns the number released.
+    With several processes on one database, claims another process is
+    still working through are released too, so a restart during its burst
+    can repeat some reminders rather than lose any.
+    """
+    with get_connection() as conn:
+        cursor = conn.execute("DELETE FROM reminder_log WHERE status = 'pending'")
+        conn.commit()
+    return cursor.rowcount
+
+
+def release_nudges(entries: list[tuple[int, date]]) -> None:
+    """Give back (user_id, date of their reminder) nudge claims never sent."""
+    with get_connection() as conn:
+        conn.executemany(
+            "UPDATE reminder_log SET nudged_at = NULL WHERE date = ? AND user_id = ?",
+            [(day.isoformat(), user_id) for user_id, day in entries]
+        )
+        conn.commit()
+
+
+def record_reminder_outcomes(outcomes: list[tuple[int, date, str, datetime]]) -> None:
+    """Store (user_id, date, status, sent_at) delivery outcomes of claimed reminders.
+
+    sent_at is the UTC instant the delivery finished; nudges are timed from it.
+    """
+    with get_connection() as conn:
+        conn.executemany(
+            "UPDATE reminder_log SET status = ?, sent_at = ? WHERE date = ? AND user_id = ?",
+            [(status, sent_at.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"), day.isoformat(), user_id)
+             for user_id, day, status, sent_at in outcomes]
+        )
+        conn.commit()
+
+
+def prune_reminder_log(before: date, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Delete up to batch_size reminder_log rows dated before `before`.
+
+    Returns the number deleted, so callers repeat until it returns 0.
+    """
+    with get_connection() as conn:
+        cursor = conn.execute(
+            """DELETE FROM reminder_log WHERE rowid IN (
+                   SELECT rowid FROM reminder_log WHERE date < ? LIMIT ?
+               )""",
+            (before.isoformat(), batch_size)
+        )
+        conn.commit()
+    return cursor.rowcount
+
+
+def vacuum_step(max_pages: int = VACUUM_STEP_PAGES) -> int:
+    """Release up to max_pages free pages to the filesystem.
+
+    Returns the number of free pages left, so callers repeat until it
+    returns 0. Databases created before incremental vacuum was enabled
+    get one full VACUUM instead, which also switches them over.
+    """
+    with get_connection() as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:  # INCREMENTAL
+            conn.execute("VACUUM")
+        else:
+            # Frees one page per result row, so it has to be stepped through
+            conn.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+        return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def get_today_all_progress(at: Optional[datetime] = None) -> list[dict]:
+    """Get today's progress for all users (for admin view).
+
+    "Today" is each user's local date at UTC instant `at` (default now).
+    """
+    at = (at or datetime.now(timezone.utc)).astimezone(timezone.utc)
 
     with get_connection() as conn:
         cursor = conn.execute(
@@ -263,9 +780,10 @@ def get_today_all_progress() -> list[dict]:
                 p.book_pages,
                 p.fasted
                FROM users u
-               LEFT JOIN daily_progress p ON u.id = p.user_id AND p.date = ?
+               LEFT JOIN daily_progress p ON u.id = p.user_id
+                   AND p.date = date(?, u.utc_offset || ' minutes')
                ORDER BY u.username""",
-            (today,)
+            (at.strftime("%Y-%m-%d %H:%M:%S"),)
         )
         return [
             {
@@ -281,43 +799,273 @@ def get_today_all_progress() -> list[dict]:
         ]
 
 
+def iter_progress(batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[tuple]:
+    """Yield every daily_progress row as a PROGRESS_EXPORT_FIELDS tuple,
+    then every archived month as an ARCHIVE_EXPORT_FIELDS tuple.
+
+    Rows come out in (user, date) index order and are fetched batch_size
+    at a time, so memory use doesn't grow with the length of the history.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(
+            """SELECT u.telegram_id, p.date, p.quran_pages, p.salawat_count,
+                      p.tahajjud, p.book_pages, p.fasted
+               FROM daily_progress p JOIN users u ON u.id = p.user_id
+               ORDER BY p.user_id, p.date"""
+        )
+        while rows := cursor.fetchmany(batch_size):
+            yield from rows
+
+        cursor.execute(
+            """SELECT u.telegram_id, a.month, a.quran_pages, a.salawat_count,
+                      a.tahajjud_days, a.book_pages, a.fasting_days, a.days_logged
+               FROM progress_archive a JOIN users u ON u.id = a.user_id
+               ORDER BY a.user_id, a.month"""
+        )
+        while rows := cursor.fetchmany(batch_size):
+            yield from rows
+
+
+def import_progress(rows: Iterable[tuple], batch_size: int = IMPORT_BATCH_SIZE) -> int:
+    """Upsert PROGRESS_EXPORT_FIELDS tuples, one transaction per batch_size rows.
+
+    Existing days are overwritten, as with save_progress, and so are
+    archived months given as ARCHIVE_EXPORT_FIELDS tuples. Users are created
+    (without DM permission) for telegram_ids not seen before. Returns the
+    number of rows imported.
+    """
+    rows = iter(rows)
+    total = 0
+    offset = timezones.utc_offset(None)
+    utc_minute = timezones.utc_minute(DEFAULT_REMINDER_TIME, offset)
+    with get_connection() as conn:
+        while batch := list(islice(rows, batch_size)):
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (telegram_id, utc_offset, reminder_utc_minute) VALUES (?, ?, ?)",
+                [(telegram_id, offset, utc_minute) for telegram_id in {row[0] for row in batch}]
+            )
+            conn.executemany(
+                """INSERT INTO daily_progress
+                   (user_id, date, quran_pages, salawat_count, tahajjud, book_pages, fasted)
+                   VALUES ((SELECT id FROM users WHERE telegram_id = ?), ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(user_id, date) DO UPDATE SET
+                       quran_pages = excluded.quran_pages,
+                       salawat_count = excluded.salawat_count,
+                       tahajjud = excluded.tahajjud,
+                       book_pages = excluded.book_pages,
+                       fasted = excluded.fasted""",
+                [row for row in batch if len(row) == len(PROGRESS_EXPORT_FIELDS)]
+            )
+            conn.executemany(
+                """INSERT INTO progress_archive
+                   (user_id, month, quran_pages, salawat_count, tahajjud_days,
+                    book_pages, fasting_days, days_logged)
+                   VALUES ((SELECT id FROM users WHERE telegram_id = ?), ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(user_id, month) DO UPDATE SET
+                       quran_pages = excluded.quran_pages,
+                       salawat_count = excluded.salawat_count,
+                       tahajjud_days = excluded.tahajjud_days,
+                       book_pages = excluded.book_pages,
+                       fasting_days = excluded.fasting_days,
+                       days_logged = excluded.days_logged""",
+                [row for row in batch if len(row) == len(ARCHIVE_EXPORT_FIELDS)]
+            )
+            conn.commit()
+            total += len(batch)
+    return total
+
+
 def get_setting(key: str) -> Optional[str]:
+    """Read a setting, served from memory after the first lookup.
+
+    Entries never expire unless SETTINGS_CACHE_TTL is set, which is only
+    needed when another process can change settings behind our back.
+    """
+    with _settings_lock:
+        cached = _settings_cache.get(key)
+        version = _settings_version
+    if cached is not None:
+        value, loaded_at = cached
+        if not SETTINGS_CACHE_TTL or time.monotonic() - loaded_at < SETTINGS_CACHE_TTL:
+            return value
+
     with get_connection() as conn:
         cursor = conn.execute("SELECT value FROM settings WHERE key = ?", (key,))
         row = cursor.fetchone()
-        return row["value"] if row else None
+        value = row["value"] if row else None
+
+    with _settings_lock:
+        # Don't overwrite a newer value stored by set_setting while we queried
+        if version == _settings_version:
+            _settings_cache[key] = (value, time.monotonic())
+    return value
 
 
 def set_setting(key: str, value: str) -> None:
+    global _settings_version
     with get_connection() as conn:
         conn.execute(
             "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
             (key, value)
         )
         conn.commit()
+    with _settings_lock:
+        _settings_version += 1
+        _settings_cache[key] = (value, time.monotonic())
 
 
-def _row_to_user(row) -> User:
-    return User(
-        id=row["id"],
-        telegram_id=row["telegram_id"],
-        username=row["username"],
-        reminder_time=row["reminder_time"],
-        is_admin=bool(row["is_admin"]),
-        can_dm=bool(row["can_dm"]) if "can_dm" in row.keys() else False,
-        created_at=datetime.fromisoformat(row["created_at"]) if isinstance(row["created_at"], str) else row["created_at"]
-    )
+def clear_settings_cache() -> None:
+    global _settings_version
+    with _settings_lock:
+        _settings_version += 1
+        _settings_cache.clear()
+
+
+def create_broadcast(message: str, admin_chat_id: int) -> Broadcast:
+    """Create a broadcast job addressed to every current user."""
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "INSERT INTO broadcasts (message, admin_chat_id) VALUES (?, ?) RETURNING *",
+            (message, admin_chat_id)
+        )
+        row = cursor.fetchone()
+        conn.execute(
+            """INSERT INTO broadcast_recipients (broadcast_id, telegram_id)
+               SELECT ?, telegram_id FROM users""",
+            (row["id"],)
+        )
+        conn.commit()
+        return _row_to_broadcast(row)
+
+
+def set_broadcast_status_message(broadcast_id: int, message_id: int) -> None:
+    with get_connection() as conn:
+        conn.execute(
+            "UPDATE broadcasts SET status_message_id = ? WHERE id = ?",
+            (message_id, broadcast_id)
+        )
+        conn.commit()
+
+
+def get_unfinished_broadcasts() -> list[Broadcast]:
+    with get_connection() as conn:
+        cursor = conn.execute("SELECT * FROM broadcasts WHERE finished = 0 ORDER BY id")
+        return [_row_to_broadcast(row) for row in cursor.fetchall()]
+
+
+def get_pending_broadcast_recipients(broadcast_id: int) -> list[int]:
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "SELECT telegram_id FROM broadcast_recipients WHERE broadcast_id = ? AND status = 'pending'",
+            (broadcast_id,)
+        )
+        return [row["telegram_id"] for row in cursor.fetchall()]
+
+
+def record_broadcast_deliveries(broadcast_id: int, outcomes: list[tuple[int, str]]) -> None:
+    """Store (telegram_id, status) delivery outcomes in one transaction."""
+    with get_connection() as conn:
+        conn.executemany(
+            "UPDATE broadcast_recipients SET status = ? WHERE broadcast_id = ? AND telegram_id = ?",
+            [(status, broadcast_id, telegram_id) for telegram_id, status in outcomes]
+        )
+        conn.commit()
+
+
+def get_broadcast_counts(broadcast_id: int) -> dict:
+    """Count recipients of a broadcast by delivery status."""
+    with get_connection() as conn:
+        cursor = conn.execute(
+            """SELECT status, COUNT(*) as count FROM broadcast_recipients
+               WHERE broadcast_id = ? GROUP BY status""",
+            (broadcast_id,)
+        )
+        return {row["status"]: row["count"] for row in cursor.fetchall()}
 
 
-def _row_to_progress(row) -> DailyProgress:
+def finish_broadcast(broadcast_id: int) -> None:
+    with get_connection() as conn:
+        conn.execute("UPDATE broadcasts SET finished = 1 WHERE id = ?", (broadcast_id,))
+        conn.commit()
+
+
+def load_persisted_user_data() -> dict[int, str]:
+    with get_connection() as conn:
+        cursor = conn.execute("SELECT user_id, data FROM persisted_user_data")
+        return {row["user_id"]: row["data"] for row in cursor.fetchall()}
+
+
+def load_persisted_conversations(name: str) -> dict[str, str]:
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "SELECT key, state FROM persisted_conversations WHERE name = ?",
+            (name,)
+        )
+        return {row["key"]: row["state"] for row in cursor.fetchall()}
+
+
+def save_persisted_state(
+    user_data: dict[int, Optional[str]],
+    conversations: dict[tuple[str, str], Optional[str]]
+) -> None:
+    """Write staged user_data and conversation changes in one transaction.
+
+    A value of None deletes the entry.
+    """
+    with get_connection() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO persisted_user_data (user_id, data) VALUES (?, ?)",
+            [(user_id, data) for user_id, data in user_data.items() if data is not None]
+        )
+        conn.executemany(
+            "DELETE FROM persisted_user_data WHERE user_id = ?",
+            [(user_id,) for user_id, data in user_data.items() if data is None]
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO persisted_conversations (name, key, state) VALUES (?, ?, ?)",
+            [(name, key, state) for (name, key), state in conversations.items() if state is not None]
+        )
+        conn.executemany(
+            "DELETE FROM persisted_conversations WHERE name = ? AND key = ?",
+            [(name, key) for (name, key), state in conversations.items() if state is None]
+        )
+        conn.commit()
+
+
+def _user_cursor(conn: sqlite3.Connection) -> sqlite3.Cursor:
+    """A cursor that yields User objects for SELECT {USER_COLUMNS} rows."""
+    cursor = conn.cursor()
+    cursor.row_factory = _user_factory
+    return cursor
+
+
+def _progress_cursor(conn: sqlite3.Connection) -> sqlite3.Cursor:
+    """A cursor that yields DailyProgress objects for SELECT {PROGRESS_COLUMNS} rows."""
+    cursor = conn.cursor()
+    cursor.row_factory = _progress_factory
+    return cursor
+
+
+def _user_factory(cursor, row) -> User:
+    return User(row[0], row[1], row[2], row[3], bool(row[4]), bool(row[5]), row[6], row[7], row[8])
+
+
+def _progress_factory(cursor, row) -> DailyProgress:
     return DailyProgress(
+        row[0], row[1], date.fromisoformat(row[2]), row[3], row[4],
+        bool(row[5]), row[6], bool(row[7]), row[8]
+    )
+
+
+def _row_to_broadcast(row) -> Broadcast:
+    return Broadcast(
         id=row["id"],
-        user_id=row["user_id"],
-        date=date.fromisoformat(row["date"]) if isinstance(row["date"], str) else row["date"],
-        quran_pages=row["quran_pages"],
-        salawat_count=row["salawat_count"],
-        tahajjud=bool(row["tahajjud"]),
-        book_pages=row["book_pages"],
-        fasted=bool(row["fasted"]),
+        message=row["message"],
+        admin_chat_id=row["admin_chat_id"],
+        status_message_id=row["status_message_id"],
+        finished=bool(row["finished"]),
         created_at=datetime.fromisoformat(row["created_at"]) if isinstance(row["created_at"], str) else row["created_at"]
     )
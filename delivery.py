@@ -0,0 +1,248 @@
+"""Rate-limited, concurrent message delivery.
+
+Everything the bot sends in bulk (reminders, broadcasts) goes through one
+SendQueue so that together it stays under Telegram's limits: about 30
+messages per second overall and one per second to the same chat. Broadcasts
+are queued in a lower-priority lane, so a reminder never waits behind one.
+"""
+import asyncio
+import itertools
+import logging
+import math
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Awaitable, Callable, Optional
+
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+import metrics
+from config import SEND_RATE_LIMIT, SEND_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Delivery outcomes
+SENT = "sent"
+FAILED = "failed"
+BLOCKED = "blocked"  # The user blocked the bot or never opened a DM with it
+
+# Priority lanes, most urgent first. Reminders and other timely messages
+# are URGENT; a broadcast's thousands of messages are BULK and go out only
+# while no urgent message is waiting.
+URGENT = 0
+BULK = 1
+
+PER_CHAT_INTERVAL = 1.0
+# Seconds between sweeps of chats whose next send time has passed
+CHAT_PRUNE_INTERVAL = 60.0
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0
+
+
+class RateLimiter:
+    """Token bucket shared by all workers.
+
+    The default burst of 1 spaces sends evenly, so no one-second window
+    ever sees more than `rate` messages.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = burst
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class DeliveryStats:
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0
+    retries: int = 0
+    latency_total: float = 0.0
+    latency_max: float = 0.0
+
+    def record(self, outcome: str, latency: float) -> None:
+        if outcome == SENT:
+            self.sent += 1
+        elif outcome == BLOCKED:
+            self.blocked += 1
+        else:
+            self.failed += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    @property
+    def latency_avg(self) -> float:
+        done = self.sent + self.failed + self.blocked
+        return self.latency_total / done if done else 0.0
+
+
+@dataclass
+class _Job:
+    chat_id: int
+    text: str
+    kwargs: dict
+    future: asyncio.Future
+    queued_at: float
+    attempts: int = 0
+
+
+class SendQueue:
+    """Bounded-concurrency send queue with global and per-chat rate limits.
+
+    Transient network errors are retried with backoff and RetryAfter pauses
+    every worker for the time Telegram asks for. `on_blocked` is awaited
+    with the chat id when a chat can no longer be messaged.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        workers: int = SEND_WORKERS,
+        rate: float = SEND_RATE_LIMIT,
+        on_blocked: Optional[Callable[[int], Awaitable[None]]] = None,
+    ):
+        self.bot = bot
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.on_blocked = on_blocked
+        self.stats = DeliveryStats()
+        # (priority, submission order, job): FIFO within each lane
+        self._queue: asyncio.PriorityQueue[tuple[int, int, _Job]] = asyncio.PriorityQueue()
+        self._order = itertools.count()
+        self._tasks: list[asyncio.Task] = []
+        self._in_flight: set[asyncio.Future] = set()
+        # Earliest time each chat can be sent to again; math.inf while a
+        # worker holds its slot and waits for the rate limiter
+        self._chat_next_send: dict[int, float] = {}
+        self._pruned_at = time.monotonic()
+        self._paused_until = 0.0
+
+    @property
+    def depth(self) -> int:
+        """Number of messages waiting for a worker."""
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, chat_id: int, text: str, *, priority: int = URGENT, **kwargs) -> asyncio.Future:
+        """Queue a message; the returned future resolves to SENT, FAILED or BLOCKED."""
+        future = asyncio.get_running_loop().create_future()
+        job = _Job(chat_id, text, kwargs, future, time.monotonic())
+        self._queue.put_nowait((priority, next(self._order), job))
+        return future
+
+    async def send(self, chat_id: int, text: str, *, priority: int = URGENT, **kwargs) -> str:
+        return await self.submit(chat_id, text, priority=priority, **kwargs)
+
+    def cancel(self, futures: list[asyncio.Future]) -> list[asyncio.Future]:
+        """Cancel messages still waiting in the queue.
+
+        Returns the futures of messages that are already being sent; those
+        can't be recalled and will still resolve with their outcome.
+        """
+        in_flight = []
+        for future in futures:
+            if future in self._in_flight:
+                in_flight.append(future)
+            else:
+                future.cancel()
+        return in_flight
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job = await self._queue.get()
+            if job.future.cancelled():
+                self._queue.task_done()
+                continue
+            self._in_flight.add(job.future)
+            try:
+                outcome = await self._deliver(job)
+            except Exception:
+                logger.exception("Unexpected error delivering to %s", job.chat_id)
+                outcome = FAILED
+            finally:
+                self._in_flight.discard(job.future)
+                self._queue.task_done()
+            latency = time.monotonic() - job.queued_at
+            self.stats.record(outcome, latency)
+            if metrics.ENABLED:
+                metrics.SEND_SECONDS.observe(latency, outcome)
+            if not job.future.done():
+                job.future.set_result(outcome)
+
+    async def _wait_turn(self, chat_id: int) -> None:
+        # Loop because a RetryAfter may extend the pause while we sleep, and
+        # another worker may take the chat's slot first
+        while True:
+            wait = max(self._paused_until, self._chat_next_send.get(chat_id, 0.0)) - time.monotonic()
+            if wait <= 0:
+                break
+            await asyncio.sleep(min(wait, PER_CHAT_INTERVAL))
+        # Hold the chat's slot while waiting for the limiter, so a second
+        # message to it can't pass the check above in the meantime
+        self._chat_next_send[chat_id] = math.inf
+        try:
+            await self.limiter.acquire()
+        finally:
+            now = time.monotonic()
+            self._chat_next_send[chat_id] = now + PER_CHAT_INTERVAL
+        if now - self._pruned_at >= CHAT_PRUNE_INTERVAL:
+            self._prune_chats(now)
+
+    def _prune_chats(self, now: float) -> None:
+        """Forget chats that can already be sent to again."""
+        self._chat_next_send = {
+            chat_id: next_send for chat_id, next_send in self._chat_next_send.items() if next_send > now
+        }
+        self._pruned_at = now
+
+    async def _deliver(self, job: _Job) -> str:
+        while True:
+            job.attempts += 1
+            await self._wait_turn(job.chat_id)
+            try:
+                await self.bot.send_message(chat_id=job.chat_id, text=job.text, **job.kwargs)
+                return SENT
+            except RetryAfter as e:
+                delay = e.retry_after
+                if isinstance(delay, timedelta):
+                    delay = delay.total_seconds()
+                logger.warning("Flood limit hit, pausing sends for %ss", delay)
+                self._paused_until = max(self._paused_until, time.monotonic() + float(delay))
+            except Forbidden:
+                if self.on_blocked:
+                    await self.on_blocked(job.chat_id)
+                return BLOCKED
+            except BadRequest as e:
+                # Not transient (e.g. "Chat not found"); retrying won't help
+                logger.warning("Failed to send to %s: %s", job.chat_id, e)
+                return FAILED
+            except NetworkError as e:
+                if job.attempts > MAX_RETRIES:
+                    logger.warning("Giving up on %s after %d attempts: %s", job.chat_id, job.attempts, e)
+                    return FAILED
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** (job.attempts - 1))
+            self.stats.retries += 1
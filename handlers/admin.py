@@ -1,152 +1,139 @@
+import os
+import tempfile
+from datetime import date
+
 from telegram import Update
 from telegram.ext import ContextTypes
 
-import database as db
+import async_db as db
+import messages
+import progress_io
+from config import DATABASE_BACKEND
+from metrics import instrumented
 
 
+@instrumented
 async def results(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """View today's progress for all users."""
     user = update.effective_user
-    db_user = db.get_user(user.id)
+    db_user = await db.get_user(user.id)
 
     if not db_user:
-        await update.message.reply_text("Алдымен /start басыңыз.")
+        await update.message.reply_text(messages.render("need_start"))
         return
 
-    all_progress = db.get_today_all_progress()
+    all_progress = await db.get_today_all_progress()
 
     if not all_progress:
-        await update.message.reply_text("Әлі ешкім тіркелмеген.")
+        await update.message.reply_text(messages.render("no_users", db_user.locale))
         return
 
-    lines = ["📊 Бүгінгі прогресс (барлық қатысушылар)\n"]
+    locale = db_user.locale
+    lines = [messages.render("results.header", locale)]
 
     for p in all_progress:
         if p["logged"]:
-            tahajjud = "✓" if p["tahajjud"] else "✗"
-            fasted = "✓" if p["fasted"] else "✗"
-            lines.append(
-                f"@{p['username']}:\n"
-                f"  Құран: {p['quran_pages']}б | Салауат: {p['salawat_count']}\n"
-                f"  Тахажжуд: {tahajjud} | Кітап: {p['book_pages']}б | Ораза: {fasted}"
-            )
+            lines.append(messages.render(
+                "results.logged", locale,
+                username=p["username"],
+                quran_pages=p["quran_pages"],
+                salawat_count=p["salawat_count"],
+                tahajjud="✓" if p["tahajjud"] else "✗",
+                book_pages=p["book_pages"],
+                fasted="✓" if p["fasted"] else "✗",
+            ))
         else:
-            lines.append(f"@{p['username']}: ⏳ Әлі жазылмаған")
+            lines.append(messages.render("results.not_logged", locale, username=p["username"]))
 
     await update.message.reply_text("\n".join(lines))
 
 
+@instrumented
 async def weekly(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """View weekly stats for all users."""
     user = update.effective_user
-    db_user = db.get_user(user.id)
+    db_user = await db.get_user(user.id)
 
     if not db_user:
-        await update.message.reply_text("Алдымен /start басыңыз.")
+        await update.message.reply_text(messages.render("need_start"))
         return
 
-    all_stats = db.get_all_users_weekly_stats()
+    all_stats = await db.get_all_users_weekly_stats()
 
     if not all_stats:
-        await update.message.reply_text("Әлі ешкім тіркелмеген.")
+        await update.message.reply_text(messages.render("no_users", db_user.locale))
         return
 
-    lines = ["📊 Апталық есеп (соңғы 7 күн)\n"]
+    lines = [messages.render("weekly.header", db_user.locale)]
 
     for s in all_stats:
-        lines.append(
-            f"@{s['username']} ({s['days_logged']}/7 күн):\n"
-            f"  Құран: {s['quran_pages']}б | Салауат: {s['salawat_count']}\n"
-            f"  Тахажжуд: {s['tahajjud_days']}к | Кітап: {s['book_pages']}б | Ораза: {s['fasting_days']}к"
-        )
+        lines.append(messages.render("weekly.line", db_user.locale, **s))
 
     await update.message.reply_text("\n".join(lines))
 
 
+@instrumented
 async def setbook(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Set the current book for all users (admin only)."""
     user = update.effective_user
-    db_user = db.get_user(user.id)
+    db_user = await db.get_user(user.id)
 
     if not db_user or not db_user.is_admin:
-        await update.message.reply_text("Бұл команда тек админдерге қолжетімді.")
+        await update.message.reply_text(messages.render("admin_only", db_user and db_user.locale))
         return
 
     if not context.args:
-        current_book = db.get_setting("current_book")
+        current_book = await db.get_setting("current_book")
         if current_book:
-            await update.message.reply_text(
-                f"Қазіргі кітап: {current_book}\n\n"
-                "Қолдану: /setbook Кітап атауы"
-            )
+            await update.message.reply_text(messages.render("setbook.current", db_user.locale, title=current_book))
         else:
-            await update.message.reply_text(
-                "Кітап әлі таңдалмаған.\n\n"
-                "Қолдану: /setbook Кітап атауы"
-            )
+            await update.message.reply_text(messages.render("setbook.unset", db_user.locale))
         return
 
     book_name = " ".join(context.args)
-    db.set_setting("current_book", book_name)
+    await db.set_setting("current_book", book_name)
+    # Texts rendered with the old book (see messages.render_cached)
+    messages.clear_cache()
 
-    await update.message.reply_text(f"Кітап орнатылды: {book_name}")
+    await update.message.reply_text(messages.render("setbook.done", db_user.locale, title=book_name))
 
 
+@instrumented
 async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a message to all users (admin only)."""
     user = update.effective_user
-    db_user = db.get_user(user.id)
+    db_user = await db.get_user(user.id)
 
     if not db_user or not db_user.is_admin:
-        await update.message.reply_text("Бұл команда тек админдерге қолжетімді.")
+        await update.message.reply_text(messages.render("admin_only", db_user and db_user.locale))
         return
 
     if not context.args:
-        await update.message.reply_text("Қолдану: /broadcast Хабарлама мәтіні")
+        await update.message.reply_text(messages.render("broadcast.usage", db_user.locale))
         return
 
     message = " ".join(context.args)
-    users = db.get_all_users()
+    broadcaster = context.bot_data["broadcaster"]
 
-    sent_count = 0
-    failed_count = 0
-
-    for u in users:
-        try:
-            await context.bot.send_message(
-                chat_id=u.telegram_id,
-                text=f"📢 Хабарлама:\n\n{message}"
-            )
-            sent_count += 1
-        except Exception:
-            failed_count += 1
-
-    await update.message.reply_text(
-        f"Хабарлама жіберілді.\n"
-        f"Жеткізілді: {sent_count}\n"
-        f"Қате: {failed_count}"
-    )
+    # Delivery runs in the background and reports progress in a status message
+    await broadcaster.start_broadcast(message, update.effective_chat.id)
 
 
+@instrumented
 async def makeadmin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Make a user an admin (must reply to their message or use their ID)."""
     user = update.effective_user
-    db_user = db.get_user(user.id)
+    db_user = await db.get_user(user.id)
 
     # First user becomes admin automatically
-    users = db.get_all_users()
+    users = await db.get_all_users()
     if len(users) == 1 and users[0].telegram_id == user.id:
-        with db.get_connection() as conn:
-            conn.execute(
-                "UPDATE users SET is_admin = 1 WHERE telegram_id = ?",
-                (user.id,)
-            )
-            conn.commit()
-        await update.message.reply_text("Сіз енді админсіз (бірінші қатысушы құқығы).")
+        await db.set_admin(user.id)
+        await update.message.reply_text(messages.render("makeadmin.first", db_user.locale))
         return
 
     if not db_user or not db_user.is_admin:
-        await update.message.reply_text("Бұл команда тек админдерге қолжетімді.")
+        await update.message.reply_text(messages.render("admin_only", db_user and db_user.locale))
         return
 
     # Check if replying to a message
@@ -157,25 +144,49 @@ async def makeadmin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         try:
             target_id = int(context.args[0])
         except ValueError:
-            await update.message.reply_text("Дұрыс қатысушы ID жазыңыз.")
+            await update.message.reply_text(messages.render("makeadmin.invalid_id", db_user.locale))
             return
     else:
-        await update.message.reply_text(
-            "Қолдану: Қатысушы хабарына жауап ретінде /makeadmin\n"
-            "Немесе: /makeadmin USER_ID"
-        )
+        await update.message.reply_text(messages.render("makeadmin.usage", db_user.locale))
         return
 
-    target_db_user = db.get_user(target_id)
+    target_db_user = await db.get_user(target_id)
     if not target_db_user:
-        await update.message.reply_text("Қатысушы табылмады. Алдымен ол /start басуы керек.")
+        await update.message.reply_text(messages.render("makeadmin.not_found", db_user.locale))
         return
 
-    with db.get_connection() as conn:
-        conn.execute(
-            "UPDATE users SET is_admin = 1 WHERE telegram_id = ?",
-            (target_id,)
-        )
-        conn.commit()
+    await db.set_admin(target_id)
+
+    await update.message.reply_text(messages.render("makeadmin.done", db_user.locale, user_id=target_id))
+
 
-    await update.message.reply_text(f"Қатысушы {target_id} енді админ.")
+@instrumented
+async def export(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send all daily progress as a CSV or JSONL file (admin only)."""
+    user = update.effective_user
+    db_user = await db.get_user(user.id)
+
+    if not db_user or not db_user.is_admin:
+        await update.message.reply_text(messages.render("admin_only", db_user and db_user.locale))
+        return
+
+    if DATABASE_BACKEND != "sqlite":
+        await update.message.reply_text(messages.render("export.sqlite_only", db_user.locale))
+        return
+
+    fmt = context.args[0].lower() if context.args else "csv"
+    if fmt not in progress_io.FORMATS:
+        await update.message.reply_text(messages.render("export.usage", db_user.locale))
+        return
+
+    # Written to a temporary file on a reader thread, then uploaded
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = f"progress-{date.today().isoformat()}.{fmt}"
+        path = os.path.join(tmpdir, filename)
+        count = await db.run_read(progress_io.export_file, path, fmt)
+        with open(path, "rb") as file:
+            await update.message.reply_document(
+                document=file,
+                filename=filename,
+                caption=messages.render("export.caption", db_user.locale, count=count)
+            )
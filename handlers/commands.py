@@ -1,9 +1,19 @@
+from datetime import datetime
+
 from telegram import Update
 from telegram.ext import ContextTypes
 
-import database as db
+import async_db as db
+import messages
+import timezones
+from config import TIMEZONE
+from metrics import instrumented
+
+# Windows shown by /stats, in days (None is all time); fetched in one query
+STATS_WINDOWS = (7, 30, 365, None)
 
 
+@instrumented
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
     chat = update.effective_chat
@@ -11,112 +21,84 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     # Check if this is a private chat (DM)
     is_private = chat.type == "private"
 
-    db_user = db.create_user(
+    db_user = await db.create_user(
         telegram_id=user.id,
         username=user.username,
         can_dm=is_private
     )
+    await context.bot_data["reminders"].reschedule(user.id)
 
-    if is_private:
-        await update.message.reply_text(
-            f"Ассаламу алейкум, {user.first_name}!\n\n"
-            "Прогресс трекер ботына қош келдіңіз.\n\n"
-            "Мен сізге күнделікті еске салу жіберемін:\n"
-            "- Құран оқылған беттер\n"
-            "- Салауат саны\n"
-            "- Тахажжуд намазы\n"
-            "- Кітап оқылған беттер\n"
-            "- Ораза\n\n"
-            f"Еске салу уақыты: {db_user.reminder_time}\n"
-            "Өзгерту үшін: /settime HH:MM\n\n"
-            "Командалар:\n"
-            "/today - Бүгінгі прогресс\n"
-            "/stats - Апталық/айлық есеп\n"
-            "/log - Прогресті жазу"
-        )
-    else:
-        # In group chat - remind to start private chat
-        await update.message.reply_text(
-            f"Ассаламу алейкум, {user.first_name}!\n\n"
-            "Күнделікті еске салу алу үшін маған жеке хат жазыңыз.\n"
-            "Жеке чатта /start басыңыз."
-        )
+    text = messages.render(
+        "start.private" if is_private else "start.group", db_user.locale,
+        first_name=user.first_name, reminder_time=db_user.reminder_time
+    )
+    await update.message.reply_text(text)
 
 
+@instrumented
 async def today(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
-    db_user = db.get_user(user.id)
+    db_user = await db.get_user(user.id)
 
     if not db_user:
-        await update.message.reply_text("Алдымен /start басыңыз.")
+        await update.message.reply_text(messages.render("need_start"))
         return
 
-    progress = db.get_today_progress(db_user.id)
-    book_name = db.get_setting("current_book") or "Кітап таңдалмаған"
+    progress = await db.get_today_progress(db_user.id, db_user.today())
 
     if not progress:
-        await update.message.reply_text(
-            "Бүгін әлі прогресс жазылмаған.\n"
-            "Жазу үшін /log басыңыз."
-        )
+        await update.message.reply_text(messages.render("today.empty", db_user.locale))
         return
 
-    tahajjud_symbol = "✓" if progress.tahajjud else "✗"
-    fasted_symbol = "✓" if progress.fasted else "✗"
-
-    await update.message.reply_text(
-        f"📊 Бүгінгі прогресс:\n\n"
-        f"Құран: {progress.quran_pages} бет\n"
-        f"Салауат: {progress.salawat_count}\n"
-        f"Тахажжуд: {tahajjud_symbol}\n"
-        f"Кітап ({book_name}): {progress.book_pages} бет\n"
-        f"Ораза: {fasted_symbol}"
-    )
+    await update.message.reply_text(messages.render(
+        "today", db_user.locale,
+        quran_pages=progress.quran_pages,
+        salawat_count=progress.salawat_count,
+        tahajjud="✓" if progress.tahajjud else "✗",
+        book=await db.get_setting("current_book"),
+        book_pages=progress.book_pages,
+        fasted="✓" if progress.fasted else "✗",
+    ))
 
 
+@instrumented
 async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
-    db_user = db.get_user(user.id)
+    db_user = await db.get_user(user.id)
 
     if not db_user:
-        await update.message.reply_text("Алдымен /start басыңыз.")
+        await update.message.reply_text(messages.render("need_start"))
         return
 
-    weekly = db.get_weekly_stats(db_user.id)
-    monthly = db.get_monthly_stats(db_user.id)
+    stats_by_window = await db.get_windowed_stats(db_user.id, STATS_WINDOWS, db_user.today())
 
-    await update.message.reply_text(
-        f"📊 Сіздің статистика\n\n"
-        f"═══ Соңғы 7 күн ═══\n"
-        f"Құран: {weekly['quran_pages']} бет\n"
-        f"Салауат: {weekly['salawat_count']}\n"
-        f"Тахажжуд: {weekly['tahajjud_days']} күн\n"
-        f"Кітап: {weekly['book_pages']} бет\n"
-        f"Ораза: {weekly['fasting_days']} күн\n"
-        f"Жазылған күндер: {weekly['days_logged']}/7\n\n"
-        f"═══ Соңғы 30 күн ═══\n"
-        f"Құран: {monthly['quran_pages']} бет\n"
-        f"Салауат: {monthly['salawat_count']}\n"
-        f"Тахажжуд: {monthly['tahajjud_days']} күн\n"
-        f"Кітап: {monthly['book_pages']} бет\n"
-        f"Ораза: {monthly['fasting_days']} күн\n"
-        f"Жазылған күндер: {monthly['days_logged']}/30"
-    )
+    locale = db_user.locale
+    sections = []
+    for window in STATS_WINDOWS:
+        s = stats_by_window[window]
+        if window is None:
+            title = messages.render("stats.all_time", locale)
+            logged = f"{s['days_logged']}"
+        else:
+            title = messages.render("stats.window", locale, days=window)
+            logged = f"{s['days_logged']}/{window}"
+        sections.append(messages.render("stats.section", locale, title=title, logged=logged, **s))
 
+    await update.message.reply_text(messages.render("stats.header", locale) + "\n\n" + "\n\n".join(sections))
 
+
+@instrumented
 async def settime(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
-    db_user = db.get_user(user.id)
+    db_user = await db.get_user(user.id)
 
     if not db_user:
-        await update.message.reply_text("Алдымен /start басыңыз.")
+        await update.message.reply_text(messages.render("need_start"))
         return
 
     if not context.args:
         await update.message.reply_text(
-            f"Қазіргі еске салу уақыты: {db_user.reminder_time}\n\n"
-            "Қолдану: /settime HH:MM\n"
-            "Мысалы: /settime 21:00"
+            messages.render("settime.current", db_user.locale, reminder_time=db_user.reminder_time)
         )
         return
 
@@ -131,11 +113,70 @@ async def settime(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             raise ValueError()
         time_str = f"{hours:02d}:{minutes:02d}"
     except (ValueError, AttributeError):
+        await update.message.reply_text(messages.render("settime.invalid", db_user.locale))
+        return
+
+    await db.update_reminder_time(user.id, time_str)
+    await context.bot_data["reminders"].reschedule(user.id)
+    await update.message.reply_text(messages.render("settime.done", db_user.locale, reminder_time=time_str))
+
+
+@instrumented
+async def settz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user = update.effective_user
+    db_user = await db.get_user(user.id)
+
+    if not db_user:
+        await update.message.reply_text(messages.render("need_start"))
+        return
+
+    if not context.args:
         await update.message.reply_text(
-            "Қате формат. HH:MM форматын қолданыңыз.\n"
-            "Мысалы: /settime 21:00"
+            messages.render("settz.current", db_user.locale, timezone=db_user.timezone or TIMEZONE)
         )
         return
 
-    db.update_reminder_time(user.id, time_str)
-    await update.message.reply_text(f"Еске салу уақыты өзгертілді: {time_str}")
+    # "default" goes back to following the bot's TIMEZONE
+    if context.args[0].lower() == "default":
+        zone = None
+    else:
+        zone = timezones.parse_zone(context.args[0])
+        if zone is None:
+            await update.message.reply_text(messages.render("settz.invalid", db_user.locale))
+            return
+
+    await db.set_timezone(user.id, zone)
+    await context.bot_data["reminders"].reschedule(user.id)
+    local_time = datetime.now(timezones.get_zone(zone)).strftime("%H:%M")
+    await update.message.reply_text(messages.render(
+        "settz.done" if zone else "settz.reset", db_user.locale,
+        timezone=zone or TIMEZONE, local_time=local_time, reminder_time=db_user.reminder_time
+    ))
+
+
+@instrumented
+async def lang(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user = update.effective_user
+    db_user = await db.get_user(user.id)
+
+    if not db_user:
+        await update.message.reply_text(messages.render("need_start"))
+        return
+
+    codes = "|".join(messages.LOCALES)
+    current = messages.resolve(db_user.locale)
+    if not context.args:
+        await update.message.reply_text(messages.render(
+            "lang.current", current, language=messages.render("language", current), codes=codes
+        ))
+        return
+
+    locale = context.args[0].lower()
+    if locale not in messages.LOCALES:
+        await update.message.reply_text(messages.render("lang.invalid", current, codes=codes))
+        return
+
+    await db.set_locale(user.id, locale)
+    await update.message.reply_text(
+        messages.render("lang.done", locale, language=messages.render("language", locale))
+    )
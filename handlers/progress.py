@@ -1,182 +1,313 @@
-from datetime import date
-from telegram import Update
+import warnings
+from datetime import date, datetime
+from typing import Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
+    CallbackQueryHandler,
     ContextTypes,
     ConversationHandler,
     CommandHandler,
     MessageHandler,
     filters,
 )
+from telegram.warnings import PTBUserWarning
 
-import database as db
+import async_db as db
+import messages
+import timezones
+from metrics import instrumented
 
 # Conversation states
 QURAN, SALAWAT, TAHAJJUD, BOOK, FASTING = range(5)
 
+YES_ANSWERS = ("yes", "y", "да", "1", "ha", "иә", "ия", "әрине")
+NO_ANSWERS = ("no", "n", "нет", "0", "yoq", "жоқ", "жок")
+
+
+def yes_no_keyboard(step: str, locale: str) -> InlineKeyboardMarkup:
+    """Yes/no buttons whose callback data is "<step>:yes" or "<step>:no"."""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton(messages.render("button.yes", locale), callback_data=f"{step}:yes"),
+        InlineKeyboardButton(messages.render("button.no", locale), callback_data=f"{step}:no"),
+    ]])
+
 
+# By language
+TAHAJJUD_KEYBOARDS = {locale: yes_no_keyboard("tahajjud", locale) for locale in messages.LOCALES}
+FASTING_KEYBOARDS = {locale: yes_no_keyboard("fasting", locale) for locale in messages.LOCALES}
+
+# One-message form: /log 5 100 иә 10 жоқ, or /log quran=5 salawat=100 ...
+QUICK_LOG_FIELDS = ("quran_pages", "salawat_count", "tahajjud", "book_pages", "fasted")
+QUICK_LOG_KEYS = {
+    "quran": "quran_pages", "q": "quran_pages",
+    "salawat": "salawat_count", "s": "salawat_count",
+    "tahajjud": "tahajjud", "t": "tahajjud",
+    "book": "book_pages", "b": "book_pages",
+    "fasting": "fasted", "fasted": "fasted", "f": "fasted",
+}
+
+
+def parse_count(text: str) -> Optional[int]:
+    """Parse a non-negative count, or return None if it isn't one."""
+    try:
+        count = int(text.strip())
+    except ValueError:
+        return None
+    return count if count >= 0 else None
+
+
+def parse_yes_no(text: str) -> Optional[bool]:
+    """Parse a yes/no answer, or return None if it isn't one."""
+    text = text.strip().lower()
+    if text in YES_ANSWERS:
+        return True
+    if text in NO_ANSWERS:
+        return False
+    return None
+
+
+def parse_quick_log(args: list[str]) -> Optional[dict]:
+    """Parse /log arguments into a complete progress dict, or None if invalid.
+
+    A field given twice (q=5 q=7, or quran=5 q=7) is invalid too.
+    """
+    if all("=" in arg for arg in args):
+        values = {}
+        for arg in args:
+            key, _, value = arg.partition("=")
+            field = QUICK_LOG_KEYS.get(key.strip().lower())
+            if field is None or field in values:
+                return None
+            values[field] = value
+    elif len(args) == len(QUICK_LOG_FIELDS):
+        values = dict(zip(QUICK_LOG_FIELDS, args))
+    else:
+        return None
+
+    if set(values) != set(QUICK_LOG_FIELDS):
+        return None
+
+    progress = {}
+    for field, value in values.items():
+        parse = parse_yes_no if field in ("tahajjud", "fasted") else parse_count
+        progress[field] = parse(value)
+        if progress[field] is None:
+            return None
+    return progress
+
+
+async def _yes_no_answer(update: Update) -> Optional[bool]:
+    """Read a yes/no answer from a typed message or a keyboard button."""
+    query = update.callback_query
+    if query:
+        await query.answer()
+        await query.edit_message_reply_markup(reply_markup=None)
+        return parse_yes_no(query.data.partition(":")[2])
+    return parse_yes_no(update.message.text)
+
+
+async def save_and_summarize(
+    update: Update, user_id: int, progress_date: date, progress: dict, locale: Optional[str]
+) -> None:
+    """Save the day's progress and reply with a summary in `locale`."""
+    await db.save_progress(
+        user_id=user_id,
+        progress_date=progress_date,
+        quran_pages=progress["quran_pages"],
+        salawat_count=progress["salawat_count"],
+        tahajjud=progress["tahajjud"],
+        book_pages=progress["book_pages"],
+        fasted=progress["fasted"]
+    )
+
+    await update.effective_message.reply_text(messages.render(
+        "log.saved", locale,
+        quran_pages=progress["quran_pages"],
+        salawat_count=progress["salawat_count"],
+        tahajjud="✓" if progress["tahajjud"] else "✗",
+        book=await db.get_setting("current_book"),
+        book_pages=progress["book_pages"],
+        fasted="✓" if progress["fasted"] else "✗",
+    ))
+
+
+@instrumented
 async def start_logging(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Start the progress logging conversation."""
+    """Start the progress logging conversation, or log everything at once."""
     user = update.effective_user
-    db_user = db.get_user(user.id)
+    db_user = await db.get_user(user.id)
 
     if not db_user:
-        await update.message.reply_text("Алдымен /start басыңыз.")
+        await update.message.reply_text(messages.render("need_start"))
+        return ConversationHandler.END
+
+    if context.args:
+        progress = parse_quick_log(context.args)
+        if progress is None:
+            locale = db_user.locale
+            await update.message.reply_text(
+                messages.render("log.invalid", locale) + "\n\n" + messages.render("log.usage", locale)
+            )
+        else:
+            await save_and_summarize(update, db_user.id, db_user.today(), progress, db_user.locale)
         return ConversationHandler.END
 
     context.user_data["db_user_id"] = db_user.id
+    context.user_data["timezone"] = db_user.timezone
+    context.user_data["locale"] = db_user.locale
     context.user_data["progress"] = {}
 
-    await update.message.reply_text(
-        "Ассаламу алейкум! Күнделікті прогресс уақыты.\n\n"
-        "1️⃣ Бүгін Құран неше бет оқыдыңыз?\n"
-        "(Сан жазыңыз, немесе 0)"
-    )
+    await update.message.reply_text(messages.render("log.quran", db_user.locale))
     return QURAN
 
 
+@instrumented
 async def receive_quran(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Receive Quran pages count."""
-    try:
-        pages = int(update.message.text.strip())
-        if pages < 0:
-            raise ValueError()
-    except ValueError:
-        await update.message.reply_text("Дұрыс сан жазыңыз (0 немесе одан көп).")
+    # Absent in conversations saved before languages
+    locale = context.user_data.get("locale")
+    pages = parse_count(update.message.text)
+    if pages is None:
+        await update.message.reply_text(messages.render("log.invalid_count", locale))
         return QURAN
 
     context.user_data["progress"]["quran_pages"] = pages
 
-    await update.message.reply_text(
-        "2️⃣ Неше салауат айттыңыз?\n"
-        "(Сан жазыңыз, немесе 0)"
-    )
+    await update.message.reply_text(messages.render("log.salawat", locale))
     return SALAWAT
 
 
+@instrumented
 async def receive_salawat(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Receive salawat count."""
-    try:
-        count = int(update.message.text.strip())
-        if count < 0:
-            raise ValueError()
-    except ValueError:
-        await update.message.reply_text("Дұрыс сан жазыңыз (0 немесе одан көп).")
+    locale = context.user_data.get("locale")
+    count = parse_count(update.message.text)
+    if count is None:
+        await update.message.reply_text(messages.render("log.invalid_count", locale))
         return SALAWAT
 
     context.user_data["progress"]["salawat_count"] = count
 
     await update.message.reply_text(
-        "3️⃣ Тахажжуд намазын оқыдыңыз ба?\n"
-        "(иә/жоқ)"
+        messages.render("log.tahajjud", locale),
+        reply_markup=TAHAJJUD_KEYBOARDS[messages.resolve(locale)]
     )
     return TAHAJJUD
 
 
+@instrumented
 async def receive_tahajjud(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Receive tahajjud answer."""
-    text = update.message.text.strip().lower()
-
-    if text in ("yes", "y", "да", "1", "ha", "иә", "ия", "әрине"):
-        context.user_data["progress"]["tahajjud"] = True
-    elif text in ("no", "n", "нет", "0", "yoq", "жоқ", "жок"):
-        context.user_data["progress"]["tahajjud"] = False
-    else:
-        await update.message.reply_text("Иә немесе жоқ деп жауап беріңіз.")
+    """Receive tahajjud answer, typed or from the keyboard."""
+    locale = context.user_data.get("locale")
+    tahajjud = await _yes_no_answer(update)
+    if tahajjud is None:
+        await update.effective_message.reply_text(
+            messages.render("log.invalid_yes_no", locale),
+            reply_markup=TAHAJJUD_KEYBOARDS[messages.resolve(locale)]
+        )
         return TAHAJJUD
 
-    book_name = db.get_setting("current_book") or "таңдалған кітап"
+    context.user_data["progress"]["tahajjud"] = tahajjud
 
-    await update.message.reply_text(
-        f"4️⃣ \"{book_name}\" кітабынан неше бет оқыдыңыз?\n"
-        "(Сан жазыңыз, немесе 0)"
-    )
+    book_name = await db.get_setting("current_book")
+    await update.effective_message.reply_text(messages.render_cached("log.book", locale, book=book_name))
     return BOOK
 
 
+@instrumented
 async def receive_book(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Receive book pages count."""
-    try:
-        pages = int(update.message.text.strip())
-        if pages < 0:
-            raise ValueError()
-    except ValueError:
-        await update.message.reply_text("Дұрыс сан жазыңыз (0 немесе одан көп).")
+    locale = context.user_data.get("locale")
+    pages = parse_count(update.message.text)
+    if pages is None:
+        await update.message.reply_text(messages.render("log.invalid_count", locale))
         return BOOK
 
     context.user_data["progress"]["book_pages"] = pages
 
     await update.message.reply_text(
-        "5️⃣ Бүгін ораза тұттыңыз ба?\n"
-        "(иә/жоқ)"
+        messages.render("log.fasting", locale),
+        reply_markup=FASTING_KEYBOARDS[messages.resolve(locale)]
     )
     return FASTING
 
 
+@instrumented
 async def receive_fasting(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Receive fasting answer and save progress."""
-    text = update.message.text.strip().lower()
-
-    if text in ("yes", "y", "да", "1", "ha", "иә", "ия", "әрине"):
-        fasted = True
-    elif text in ("no", "n", "нет", "0", "yoq", "жоқ", "жок"):
-        fasted = False
-    else:
-        await update.message.reply_text("Иә немесе жоқ деп жауап беріңіз.")
+    """Receive fasting answer, typed or from the keyboard, and save progress."""
+    locale = context.user_data.get("locale")
+    fasted = await _yes_no_answer(update)
+    if fasted is None:
+        await update.effective_message.reply_text(
+            messages.render("log.invalid_yes_no", locale),
+            reply_markup=FASTING_KEYBOARDS[messages.resolve(locale)]
+        )
         return FASTING
 
     progress = context.user_data["progress"]
-    user_id = context.user_data["db_user_id"]
-
-    # Save to database
-    db.save_progress(
-        user_id=user_id,
-        progress_date=date.today(),
-        quran_pages=progress["quran_pages"],
-        salawat_count=progress["salawat_count"],
-        tahajjud=progress["tahajjud"],
-        book_pages=progress["book_pages"],
-        fasted=fasted
-    )
-
-    # Build summary
-    tahajjud_symbol = "✓" if progress["tahajjud"] else "✗"
-    fasted_symbol = "✓" if fasted else "✗"
-    book_name = db.get_setting("current_book") or "Кітап"
-
-    await update.message.reply_text(
-        "✅ Жазылды! Жазақаллаһу хайыр.\n\n"
-        f"Бүгінгі қорытынды:\n"
-        f"Құран: {progress['quran_pages']}б | "
-        f"Салауат: {progress['salawat_count']} | "
-        f"Тахажжуд: {tahajjud_symbol} | "
-        f"{book_name}: {progress['book_pages']}б | "
-        f"Ораза: {fasted_symbol}"
-    )
+    progress["fasted"] = fasted
+    # "Today" where the user is; absent in conversations saved before timezones
+    progress_date = datetime.now(timezones.get_zone(context.user_data.get("timezone"))).date()
+    await save_and_summarize(update, context.user_data["db_user_id"], progress_date, progress, locale)
 
     # Clear user data
     context.user_data.clear()
     return ConversationHandler.END
 
 
+@instrumented
+async def expired_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Answer a yes/no button the conversation isn't waiting for.
+
+    Buttons stay on old messages after the step they belong to, a /cancel
+    or a restart, and an unanswered press leaves the client spinning.
+    """
+    locale = context.user_data.get("locale")
+    if locale is None:
+        db_user = await db.get_user(update.effective_user.id)
+        locale = db_user and db_user.locale
+    query = update.callback_query
+    await query.answer(messages.render("log.expired", locale))
+    await query.edit_message_reply_markup(reply_markup=None)
+
+
+@instrumented
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancel the conversation."""
-    await update.message.reply_text(
-        "Прогресс жазу тоқтатылды. Қайта бастау үшін /log басыңыз."
-    )
+    await update.message.reply_text(messages.render("log.cancelled", context.user_data.get("locale")))
     context.user_data.clear()
     return ConversationHandler.END
 
 
 def get_progress_handler() -> ConversationHandler:
     """Return the conversation handler for progress logging."""
-    return ConversationHandler(
-        entry_points=[CommandHandler("log", start_logging)],
-        states={
-            QURAN: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_quran)],
-            SALAWAT: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_salawat)],
-            TAHAJJUD: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_tahajjud)],
-            BOOK: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_book)],
-            FASTING: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_fasting)],
-        },
-        fallbacks=[CommandHandler("cancel", cancel)],
-    )
+    text = filters.TEXT & ~filters.COMMAND
+    # Conversations are keyed by chat and user, not by message, which is what
+    # the yes/no buttons need; PTB warns about that combination regardless.
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=PTBUserWarning, message=".*per_message=False")
+        return ConversationHandler(
+            entry_points=[CommandHandler("log", start_logging)],
+            states={
+                QURAN: [MessageHandler(text, receive_quran)],
+                SALAWAT: [MessageHandler(text, receive_salawat)],
+                TAHAJJUD: [
+                    MessageHandler(text, receive_tahajjud),
+                    CallbackQueryHandler(receive_tahajjud, pattern="^tahajjud:(yes|no)$"),
+                ],
+                BOOK: [MessageHandler(text, receive_book)],
+                FASTING: [
+                    MessageHandler(text, receive_fasting),
+                    CallbackQueryHandler(receive_fasting, pattern="^fasting:(yes|no)$"),
+                ],
+            },
+            fallbacks=[CommandHandler("cancel", cancel)],
+            name="log_progress",
+            persistent=True,
+        )
+
+
+def get_expired_prompt_handler() -> CallbackQueryHandler:
+    """Catch yes/no presses get_progress_handler() didn't take; add it after that."""
+    return CallbackQueryHandler(expired_prompt, pattern="^(tahajjud|fasting):")
@@ -0,0 +1,174 @@
+"""Small asyncio HTTP/1.1 server for the webhook and other local endpoints.
+
+Parsing is h11's, which python-telegram-bot already installs (through
+httpx); this module adds exact-path routing and the limits a public
+endpoint needs. Every read is bounded in time, so a client that stalls
+mid-request or idles on a kept-alive connection is dropped rather than
+holding the connection open, and bodies over MAX_BODY_SIZE get a 413. TLS is
+expected to be terminated by a reverse proxy in front of it.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Awaitable, Callable, Optional
+
+import h11
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1024 * 1024
+MAX_HEAD_SIZE = 16 * 1024  # Request line and headers
+READ_SIZE = 64 * 1024
+# Seconds
+IDLE_TIMEOUT = 60.0  # For the next request on a kept-alive connection
+HEADER_TIMEOUT = 10.0  # For the rest of the request line and the headers
+BODY_TIMEOUT = 30.0
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    headers: dict[str, str]  # Lower-cased names
+    body: bytes
+
+
+@dataclass
+class Response:
+    status: int = 200
+    body: bytes = b""
+    content_type: str = "text/plain; charset=utf-8"
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+class _Reject(Exception):
+    """Answer the request being read with `response` and close."""
+
+    def __init__(self, response: Response):
+        super().__init__(response.status)
+        self.response = response
+
+
+class HttpServer:
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._routes: dict[tuple[str, str], Handler] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def route(self, method: str, path: str, handler: Handler) -> None:
+        self._routes[(method.upper(), path)] = handler
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        sockets = self._server.sockets or []
+        if sockets:
+            # Reflect the real port when started with port 0
+            self.port = sockets[0].getsockname()[1]
+        logger.info("HTTP server listening on %s:%d", self.host, self.port)
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        conn = h11.Connection(h11.SERVER, max_incomplete_event_size=MAX_HEAD_SIZE)
+        try:
+            while True:
+                try:
+                    request = await self._read_request(conn, reader)
+                except _Reject as e:
+                    if conn.our_state in (h11.IDLE, h11.SEND_RESPONSE):
+                        await self._write(conn, writer, e.response, close=True)
+                    break
+                if request is None:
+                    break
+
+                response = await self._dispatch(request)
+                await self._write(conn, writer, response, close=False)
+                if conn.our_state is not h11.DONE or conn.their_state is not h11.DONE:
+                    break  # Either side asked to close
+                conn.start_next_cycle()
+        except (ConnectionError, h11.LocalProtocolError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request: Request) -> Response:
+        handler = self._routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for _, path in self._routes):
+                return Response(HTTPStatus.METHOD_NOT_ALLOWED, b"Method Not Allowed")
+            return Response(HTTPStatus.NOT_FOUND, b"Not Found")
+        try:
+            return await handler(request)
+        except Exception:
+            logger.exception("Error handling %s %s", request.method, request.path)
+            return Response(HTTPStatus.INTERNAL_SERVER_ERROR, b"Internal Server Error")
+
+    async def _read_request(self, conn: h11.Connection, reader: asyncio.StreamReader) -> Optional[Request]:
+        """The next request, or None once the client has gone or idled too long."""
+        if not conn.trailing_data[0]:
+            # Nothing pipelined; a kept-alive client may take IDLE_TIMEOUT to start
+            try:
+                conn.receive_data(await asyncio.wait_for(reader.read(READ_SIZE), IDLE_TIMEOUT))
+            except asyncio.TimeoutError:
+                return None
+        event = await self._next_event(conn, reader, HEADER_TIMEOUT)
+        if isinstance(event, h11.ConnectionClosed):
+            return None
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in event.headers}
+        if int(headers.get("content-length", 0)) > MAX_BODY_SIZE:
+            raise _Reject(Response(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, b"Payload Too Large"))
+
+        body = bytearray()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + BODY_TIMEOUT
+        while True:
+            part = await self._next_event(conn, reader, deadline - loop.time())
+            if isinstance(part, h11.EndOfMessage):
+                break
+            if not isinstance(part, h11.Data):
+                return None  # Closed mid-body
+            body += part.data
+            if len(body) > MAX_BODY_SIZE:
+                raise _Reject(Response(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, b"Payload Too Large"))
+        path = event.target.decode("latin-1").split("?", 1)[0]
+        return Request(event.method.decode("ascii").upper(), path, headers, bytes(body))
+
+    async def _next_event(self, conn: h11.Connection, reader: asyncio.StreamReader, timeout: float) -> h11.Event:
+        """h11's next event, reading for at most `timeout` seconds."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            try:
+                event = conn.next_event()
+            except h11.RemoteProtocolError as e:
+                raise _Reject(Response(e.error_status_hint, str(e).encode()))
+            if event is not h11.NEED_DATA:
+                return event
+            try:
+                data = await asyncio.wait_for(reader.read(READ_SIZE), max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                raise _Reject(Response(HTTPStatus.REQUEST_TIMEOUT, b"Request Timeout"))
+            conn.receive_data(data)
+
+    async def _write(self, conn: h11.Connection, writer: asyncio.StreamWriter, response: Response, close: bool) -> None:
+        headers = [
+            ("Content-Type", response.content_type),
+            ("Content-Length", str(len(response.body))),
+        ]
+        if close:
+            headers.append(("Connection", "close"))
+        headers += list(response.headers.items())
+        status = HTTPStatus(response.status)
+        writer.write(conn.send(h11.Response(status_code=status.value, headers=headers, reason=status.phrase)))
+        writer.write(conn.send(h11.Data(data=response.body)))
+        writer.write(conn.send(h11.EndOfMessage()))
+        await writer.drain()
@@ -0,0 +1,472 @@
+"""User-facing texts, in each supported language.
+
+Every message is a template with {name} placeholders, parsed once at
+import into a Template. All languages must have the same messages with the
+same placeholders, so a mistake in a translation fails at startup rather
+than in a handler. A message with a {book} placeholder also needs a
+"<key>.no_book" text, used while no book is set.
+
+Texts that depend only on the current book (the reminder) are cached by
+(key, locale, book); /setbook clears the cache.
+"""
+import string
+from typing import Optional
+
+from config import LOCALE
+
+
+class Template:
+    """A message parsed into its literal text and the names filled in between."""
+
+    __slots__ = ("literals", "fields")
+
+    def __init__(self, text: str):
+        self.literals = [""]
+        self.fields = []
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            self.literals[-1] += literal
+            if field is None:
+                continue
+            if not field.isidentifier() or spec or conversion:
+                raise ValueError(f"Unsupported placeholder {{{field}}} in {text!r}")
+            self.fields.append(field)
+            self.literals.append("")
+
+    def render(self, values: dict) -> str:
+        if not self.fields:
+            return self.literals[0]
+        parts = [self.literals[0]]
+        for field, literal in zip(self.fields, self.literals[1:]):
+            parts.append(str(values[field]))
+            parts.append(literal)
+        return "".join(parts)
+
+
+TEXTS = {
+    "kk": {
+        "language": "Қазақша",
+        "need_start": "Алдымен /start басыңыз.",
+        "admin_only": "Бұл команда тек админдерге қолжетімді.",
+        "no_users": "Әлі ешкім тіркелмеген.",
+        "start.private": (
+            "Ассаламу алейкум, {first_name}!\n\n"
+            "Прогресс трекер ботына қош келдіңіз.\n\n"
+            "Мен сізге күнделікті еске салу жіберемін:\n"
+            "- Құран оқылған беттер\n"
+            "- Салауат саны\n"
+            "- Тахажжуд намазы\n"
+            "- Кітап оқылған беттер\n"
+            "- Ораза\n\n"
+            "Еске салу уақыты: {reminder_time}\n"
+            "Өзгерту үшін: /settime HH:MM\n"
+            "Уақыт белдеуі: /settz Аймақ/Қала\n"
+            "Тіл: /lang\n\n"
+            "Командалар:\n"
+            "/today - Бүгінгі прогресс\n"
+            "/stats - Апталық/айлық есеп\n"
+            "/log - Прогресті жазу\n"
+            "/log 5 100 иә 10 жоқ - Бір хабармен жазу"
+        ),
+        "start.group": (
+            "Ассаламу алейкум, {first_name}!\n\n"
+            "Күнделікті еске салу алу үшін маған жеке хат жазыңыз.\n"
+            "Жеке чатта /start басыңыз."
+        ),
+        "today.empty": (
+            "Бүгін әлі прогресс жазылмаған.\n"
+            "Жазу үшін /log басыңыз."
+        ),
+        "today": (
+            "📊 Бүгінгі прогресс:\n\n"
+            "Құран: {quran_pages} бет\n"
+            "Салауат: {salawat_count}\n"
+            "Тахажжуд: {tahajjud}\n"
+            "Кітап ({book}): {book_pages} бет\n"
+            "Ораза: {fasted}"
+        ),
+        "today.no_book": "Кітап таңдалмаған",
+        "stats.header": "📊 Сіздің статистика",
+        "stats.all_time": "Барлық уақыт",
+        "stats.window": "Соңғы {days} күн",
+        "stats.section": (
+            "═══ {title} ═══\n"
+            "Құран: {quran_pages} бет\n"
+            "Салауат: {salawat_count}\n"
+            "Тахажжуд: {tahajjud_days} күн\n"
+            "Кітап: {book_pages} бет\n"
+            "Ораза: {fasting_days} күн\n"
+            "Жазылған күндер: {logged}"
+        ),
+        "settime.current": (
+            "Қазіргі еске салу уақыты: {reminder_time}\n\n"
+            "Қолдану: /settime HH:MM\n"
+            "Мысалы: /settime 21:00"
+        ),
+        "settime.invalid": (
+            "Қате формат. HH:MM форматын қолданыңыз.\n"
+            "Мысалы: /settime 21:00"
+        ),
+        "settime.done": "Еске салу уақыты өзгертілді: {reminder_time}",
+        "settz.current": (
+            "Қазіргі уақыт белдеуі: {timezone}\n\n"
+            "Қолдану: /settz Аймақ/Қала\n"
+            "Мысалы: /settz Europe/Moscow\n"
+            "Әдепкі белдеуге қайту: /settz default"
+        ),
+        "settz.invalid": (
+            "Белгісіз уақыт белдеуі.\n"
+            "Мысалы: /settz Asia/Almaty, /settz Europe/Istanbul"
+        ),
+        "settz.done": (
+            "Уақыт белдеуі өзгертілді: {timezone} (қазір {local_time})\n"
+            "Еске салу уақыты: {reminder_time}"
+        ),
+        "settz.reset": (
+            "Әдепкі уақыт белдеуі қайтарылды: {timezone} (қазір {local_time})\n"
+            "Еске салу уақыты: {reminder_time}"
+        ),
+        "lang.current": (
+            "Қазіргі тіл: {language}\n\n"
+            "Қолдану: /lang {codes}\n"
+            "Мысалы: /lang ru"
+        ),
+        "lang.invalid": "Белгісіз тіл.\nҚолдану: /lang {codes}",
+        "lang.done": "Тіл өзгертілді: {language}",
+        "button.yes": "Иә",
+        "button.no": "Жоқ",
+        "log.usage": (
+            "Бір хабармен жазу:\n"
+            "/log Құран Салауат Тахажжуд Кітап Ораза\n"
+            "Мысалы: /log 5 100 иә 10 жоқ\n"
+            "Немесе: /log quran=5 salawat=100 tahajjud=иә book=10 fasting=жоқ"
+        ),
+        "log.invalid": "Қате формат.",
+        "log.quran": (
+            "Ассаламу алейкум! Күнделікті прогресс уақыты.\n\n"
+            "1️⃣ Бүгін Құран неше бет оқыдыңыз?\n"
+            "(Сан жазыңыз, немесе 0)"
+        ),
+        "log.salawat": (
+            "2️⃣ Неше салауат айттыңыз?\n"
+            "(Сан жазыңыз, немесе 0)"
+        ),
+        "log.tahajjud": (
+            "3️⃣ Тахажжуд намазын оқыдыңыз ба?\n"
+            "(иә/жоқ)"
+        ),
+        "log.book": (
+            "4️⃣ \"{book}\" кітабынан неше бет оқыдыңыз?\n"
+            "(Сан жазыңыз, немесе 0)"
+        ),
+        "log.book.no_book": "таңдалған кітап",
+        "log.fasting": (
+            "5️⃣ Бүгін ораза тұттыңыз ба?\n"
+            "(иә/жоқ)"
+        ),
+        "log.invalid_count": "Дұрыс сан жазыңыз (0 немесе одан көп).",
+        "log.invalid_yes_no": "Иә немесе жоқ деп жауап беріңіз.",
+        "log.expired": "Бұл сұрақтың уақыты өтті. Қайта жазу үшін: /log",
+        "log.saved": (
+            "✅ Жазылды! Жазақаллаһу хайыр.\n\n"
+            "Бүгінгі қорытынды:\n"
+            "Құран: {quran_pages}б | "
+            "Салауат: {salawat_count} | "
+            "Тахажжуд: {tahajjud} | "
+            "{book}: {book_pages}б | "
+            "Ораза: {fasted}"
+        ),
+        "log.saved.no_book": "Кітап",
+        "log.cancelled": "Прогресс жазу тоқтатылды. Қайта бастау үшін /log басыңыз.",
+        "reminder": (
+            "Ассаламу алейкум! Күнделікті прогресс уақыты келді.\n\n"
+            "Прогресті жазу үшін /log басыңыз:\n"
+            "- Құран беттері\n"
+            "- Салауат саны\n"
+            "- Тахажжуд намазы\n"
+            "- \"{book}\" беттері\n"
+            "- Ораза"
+        ),
+        "reminder.no_book": "таңдалған кітап",
+        "nudge": (
+            "Бүгінгі прогресіңіз әлі жазылмаған.\n\n"
+            "Жазу үшін /log басыңыз, немесе бір хабармен: /log 5 100 иә 10 жоқ"
+        ),
+        "results.header": "📊 Бүгінгі прогресс (барлық қатысушылар)\n",
+        "results.logged": (
+            "@{username}:\n"
+            "  Құран: {quran_pages}б | Салауат: {salawat_count}\n"
+            "  Тахажжуд: {tahajjud} | Кітап: {book_pages}б | Ораза: {fasted}"
+        ),
+        "results.not_logged": "@{username}: ⏳ Әлі жазылмаған",
+        "weekly.header": "📊 Апталық есеп (соңғы 7 күн)\n",
+        "weekly.line": (
+            "@{username} ({days_logged}/7 күн):\n"
+            "  Құран: {quran_pages}б | Салауат: {salawat_count}\n"
+            "  Тахажжуд: {tahajjud_days}к | Кітап: {book_pages}б | Ораза: {fasting_days}к"
+        ),
+        "setbook.current": (
+            "Қазіргі кітап: {title}\n\n"
+            "Қолдану: /setbook Кітап атауы"
+        ),
+        "setbook.unset": (
+            "Кітап әлі таңдалмаған.\n\n"
+            "Қолдану: /setbook Кітап атауы"
+        ),
+        "setbook.done": "Кітап орнатылды: {title}",
+        "broadcast.usage": "Қолдану: /broadcast Хабарлама мәтіні",
+        "makeadmin.first": "Сіз енді админсіз (бірінші қатысушы құқығы).",
+        "makeadmin.invalid_id": "Дұрыс қатысушы ID жазыңыз.",
+        "makeadmin.usage": (
+            "Қолдану: Қатысушы хабарына жауап ретінде /makeadmin\n"
+            "Немесе: /makeadmin USER_ID"
+        ),
+        "makeadmin.not_found": "Қатысушы табылмады. Алдымен ол /start басуы керек.",
+        "makeadmin.done": "Қатысушы {user_id} енді админ.",
+        "export.sqlite_only": "Экспорт тек SQLite дерекқорымен жұмыс істейді.",
+        "export.usage": "Қолдану: /export [csv|jsonl]",
+        "export.caption": "Жазбалар саны: {count}",
+    },
+    "ru": {
+        "language": "Русский",
+        "need_start": "Сначала нажмите /start.",
+        "admin_only": "Эта команда доступна только админам.",
+        "no_users": "Пока никто не зарегистрирован.",
+        "start.private": (
+            "Ассаламу алейкум, {first_name}!\n\n"
+            "Добро пожаловать в бот для отслеживания прогресса.\n\n"
+            "Я буду присылать вам ежедневное напоминание:\n"
+            "- Прочитанные страницы Корана\n"
+            "- Количество салаватов\n"
+            "- Намаз тахаджуд\n"
+            "- Прочитанные страницы книги\n"
+            "- Пост\n\n"
+            "Время напоминания: {reminder_time}\n"
+            "Изменить: /settime HH:MM\n"
+            "Часовой пояс: /settz Регион/Город\n"
+            "Язык: /lang\n\n"
+            "Команды:\n"
+            "/today - Прогресс за сегодня\n"
+            "/stats - Отчёт за неделю/месяц\n"
+            "/log - Записать прогресс\n"
+            "/log 5 100 да 10 нет - Записать одним сообщением"
+        ),
+        "start.group": (
+            "Ассаламу алейкум, {first_name}!\n\n"
+            "Чтобы получать ежедневные напоминания, напишите мне в личные сообщения.\n"
+            "Нажмите /start в личном чате."
+        ),
+        "today.empty": (
+            "Сегодня прогресс ещё не записан.\n"
+            "Чтобы записать, нажмите /log."
+        ),
+        "today": (
+            "📊 Прогресс за сегодня:\n\n"
+            "Коран: {quran_pages} стр.\n"
+            "Салават: {salawat_count}\n"
+            "Тахаджуд: {tahajjud}\n"
+            "Книга ({book}): {book_pages} стр.\n"
+            "Пост: {fasted}"
+        ),
+        "today.no_book": "книга не выбрана",
+        "stats.header": "📊 Ваша статистика",
+        "stats.all_time": "За всё время",
+        "stats.window": "Последние {days} дн.",
+        "stats.section": (
+            "═══ {title} ═══\n"
+            "Коран: {quran_pages} стр.\n"
+            "Салават: {salawat_count}\n"
+            "Тахаджуд: {tahajjud_days} дн.\n"
+            "Книга: {book_pages} стр.\n"
+            "Пост: {fasting_days} дн.\n"
+            "Записанные дни: {logged}"
+        ),
+        "settime.current": (
+            "Текущее время напоминания: {reminder_time}\n\n"
+            "Использование: /settime HH:MM\n"
+            "Например: /settime 21:00"
+        ),
+        "settime.invalid": (
+            "Неверный формат. Используйте формат HH:MM.\n"
+            "Например: /settime 21:00"
+        ),
+        "settime.done": "Время напоминания изменено: {reminder_time}",
+        "settz.current": (
+            "Текущий часовой пояс: {timezone}\n\n"
+            "Использование: /settz Регион/Город\n"
+            "Например: /settz Europe/Moscow\n"
+            "Вернуть часовой пояс по умолчанию: /settz default"
+        ),
+        "settz.invalid": (
+            "Неизвестный часовой пояс.\n"
+            "Например: /settz Asia/Almaty, /settz Europe/Istanbul"
+        ),
+        "settz.done": (
+            "Часовой пояс изменён: {timezone} (сейчас {local_time})\n"
+            "Время напоминания: {reminder_time}"
+        ),
+        "settz.reset": (
+            "Возвращён часовой пояс по умолчанию: {timezone} (сейчас {local_time})\n"
+            "Время напоминания: {reminder_time}"
+        ),
+        "lang.current": (
+            "Текущий язык: {language}\n\n"
+            "Использование: /lang {codes}\n"
+            "Например: /lang kk"
+        ),
+        "lang.invalid": "Неизвестный язык.\nИспользование: /lang {codes}",
+        "lang.done": "Язык изменён: {language}",
+        "button.yes": "Да",
+        "button.no": "Нет",
+        "log.usage": (
+            "Запись одним сообщением:\n"
+            "/log Коран Салават Тахаджуд Книга Пост\n"
+            "Например: /log 5 100 да 10 нет\n"
+            "Или: /log quran=5 salawat=100 tahajjud=да book=10 fasting=нет"
+        ),
+        "log.invalid": "Неверный формат.",
+        "log.quran": (
+            "Ассаламу алейкум! Время ежедневного прогресса.\n\n"
+            "1️⃣ Сколько страниц Корана вы сегодня прочитали?\n"
+            "(Напишите число или 0)"
+        ),
+        "log.salawat": (
+            "2️⃣ Сколько салаватов вы произнесли?\n"
+            "(Напишите число или 0)"
+        ),
+        "log.tahajjud": (
+            "3️⃣ Вы совершили намаз тахаджуд?\n"
+            "(да/нет)"
+        ),
+        "log.book": (
+            "4️⃣ Сколько страниц книги \"{book}\" вы прочитали?\n"
+            "(Напишите число или 0)"
+        ),
+        "log.book.no_book": "выбранная книга",
+        "log.fasting": (
+            "5️⃣ Вы сегодня постились?\n"
+            "(да/нет)"
+        ),
+        "log.invalid_count": "Напишите правильное число (0 или больше).",
+        "log.invalid_yes_no": "Ответьте да или нет.",
+        "log.expired": "Этот вопрос устарел. Чтобы записать заново: /log",
+        "log.saved": (
+            "✅ Записано! Джазакаллаху хайран.\n\n"
+            "Итог за сегодня:\n"
+            "Коран: {quran_pages}с | "
+            "Салават: {salawat_count} | "
+            "Тахаджуд: {tahajjud} | "
+            "{book}: {book_pages}с | "
+            "Пост: {fasted}"
+        ),
+        "log.saved.no_book": "Книга",
+        "log.cancelled": "Запись прогресса отменена. Чтобы начать заново, нажмите /log.",
+        "reminder": (
+            "Ассаламу алейкум! Пришло время ежедневного прогресса.\n\n"
+            "Чтобы записать прогресс, нажмите /log:\n"
+            "- Страницы Корана\n"
+            "- Количество салаватов\n"
+            "- Намаз тахаджуд\n"
+            "- Страницы \"{book}\"\n"
+            "- Пост"
+        ),
+        "reminder.no_book": "выбранной книги",
+        "nudge": (
+            "Ваш прогресс за сегодня ещё не записан.\n\n"
+            "Чтобы записать, нажмите /log, или одним сообщением: /log 5 100 да 10 нет"
+        ),
+        "results.header": "📊 Прогресс за сегодня (все участники)\n",
+        "results.logged": (
+            "@{username}:\n"
+            "  Коран: {quran_pages}с | Салават: {salawat_count}\n"
+            "  Тахаджуд: {tahajjud} | Книга: {book_pages}с | Пост: {fasted}"
+        ),
+        "results.not_logged": "@{username}: ⏳ Ещё не записано",
+        "weekly.header": "📊 Отчёт за неделю (последние 7 дней)\n",
+        "weekly.line": (
+            "@{username} ({days_logged}/7 дн.):\n"
+            "  Коран: {quran_pages}с | Салават: {salawat_count}\n"
+            "  Тахаджуд: {tahajjud_days}д | Книга: {book_pages}с | Пост: {fasting_days}д"
+        ),
+        "setbook.current": (
+            "Текущая книга: {title}\n\n"
+            "Использование: /setbook Название книги"
+        ),
+        "setbook.unset": (
+            "Книга ещё не выбрана.\n\n"
+            "Использование: /setbook Название книги"
+        ),
+        "setbook.done": "Книга установлена: {title}",
+        "broadcast.usage": "Использование: /broadcast Текст сообщения",
+        "makeadmin.first": "Теперь вы админ (право первого участника).",
+        "makeadmin.invalid_id": "Напишите правильный ID участника.",
+        "makeadmin.usage": (
+            "Использование: /makeadmin в ответ на сообщение участника\n"
+            "Или: /makeadmin USER_ID"
+        ),
+        "makeadmin.not_found": "Участник не найден. Сначала ему нужно нажать /start.",
+        "makeadmin.done": "Участник {user_id} теперь админ.",
+        "export.sqlite_only": "Экспорт работает только с базой данных SQLite.",
+        "export.usage": "Использование: /export [csv|jsonl]",
+        "export.caption": "Количество записей: {count}",
+    },
+}
+
+
+def _compile(texts: dict[str, dict[str, str]]) -> dict[str, dict[str, Template]]:
+    """Parse every text, checking the languages against the default one."""
+    catalog = {
+        locale: {key: Template(text) for key, text in messages.items()}
+        for locale, messages in texts.items()
+    }
+    reference = catalog[LOCALE]
+    for locale, templates in catalog.items():
+        if templates.keys() != reference.keys():
+            raise ValueError(f"Messages for {locale!r} differ from {LOCALE!r}: {templates.keys() ^ reference.keys()}")
+        for key, template in templates.items():
+            if set(template.fields) != set(reference[key].fields):
+                raise ValueError(f"Placeholders of {key!r} differ between {locale!r} and {LOCALE!r}")
+            if "book" in template.fields and f"{key}.no_book" not in templates:
+                raise ValueError(f"{key!r} has a {{book}} placeholder but no {key}.no_book text")
+    return catalog
+
+
+CATALOG = _compile(TEXTS)
+LOCALES = tuple(CATALOG)
+
+# Rendered texts by (key, locale, values), see render_cached
+_rendered: dict[tuple[str, str, tuple], str] = {}
+
+
+def resolve(locale: Optional[str]) -> str:
+    """The language to use for a user's locale (None is the bot's LOCALE)."""
+    return locale if locale in CATALOG else LOCALE
+
+
+def render(key: str, locale: Optional[str] = None, **values) -> str:
+    """The message `key` in `locale`, with `values` filled in.
+
+    A book of None (no book set) is replaced by the "<key>.no_book" text.
+    """
+    templates = CATALOG[resolve(locale)]
+    if "book" in values and not values["book"]:
+        values["book"] = templates[f"{key}.no_book"].render(values)
+    return templates[key].render(values)
+
+
+def render_cached(key: str, locale: Optional[str] = None, **values) -> str:
+    """render(), cached, for texts sent to many recipients.
+
+    Recipients who share a language get the same string object. The values
+    are part of the cache key, so keep them few, e.g. just the book.
+    """
+    locale = resolve(locale)
+    cache_key = (key, locale, tuple(sorted(values.items())))
+    text = _rendered.get(cache_key)
+    if text is None:
+        text = _rendered[cache_key] = render(key, locale, **values)
+    return text
+
+
+def clear_cache() -> None:
+    """Forget rendered texts, after the current book changes."""
+    _rendered.clear()
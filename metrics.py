@@ -0,0 +1,181 @@
+"""Prometheus-style metrics, served as text at /metrics on METRICS_PORT.
+
+Handlers are timed with the `instrumented` decorator, storage calls by
+async_db wrapping its functions with `timed_db`, and the reminder
+scheduler counts outcomes and observes how late each reminder went out.
+The send queue observes how long each message took to deliver; its depth
+and the SQLite user cache's counters are read when /metrics is rendered
+(see `track`).
+
+Metrics are off unless METRICS_PORT is set. Then both wrappers return the
+function unchanged, so handlers and storage calls cost nothing extra; the
+remaining counter increments are a dict update each.
+"""
+import bisect
+import functools
+import time
+from http import HTTPStatus
+from typing import Callable, Iterator, Optional
+
+from config import METRICS_LISTEN, METRICS_PORT
+from http_server import HttpServer, Request, Response
+
+ENABLED = METRICS_PORT > 0
+
+# Seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (1.0, 2.0, 5.0, 10.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+# Queueing included, so a broadcast's last messages wait minutes
+SEND_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Every metric, in the order /metrics lists them
+REGISTRY: list["Counter"] = []
+
+
+class Counter:
+    """Monotonic counter with at most one label."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, label: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values: dict[str, float] = {}
+        self._source: Optional[Callable[[], dict[str, float]]] = None
+        REGISTRY.append(self)
+
+    def track(self, source: Callable[[], dict[str, float]]) -> None:
+        """Take the values, by label value, from `source` when rendered."""
+        self._source = source
+
+    def inc(self, label_value: str = "", amount: float = 1) -> None:
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def value(self, label_value: str = "") -> float:
+        return self._values.get(label_value, 0)
+
+    def _labels(self, label_value: str, *extra: str) -> str:
+        labels = [f'{self.label}="{label_value}"'] if self.label else []
+        labels += extra
+        return "{" + ",".join(labels) + "}" if labels else ""
+
+    def samples(self) -> Iterator[str]:
+        if self._source:
+            self._values = dict(self._source())
+        for label_value, value in sorted(self._values.items()):
+            yield f"{self.name}{self._labels(label_value)} {value}"
+
+
+class Gauge(Counter):
+    """A value that goes up and down, usually read with `track`."""
+
+    kind = "gauge"
+
+
+class Histogram(Counter):
+    """Bucketed distribution of observed values, with at most one label."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, label: Optional[str] = None,
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, label)
+        self.buckets = buckets
+        # label value -> observations per bucket, the last one being +Inf
+        self._counts: dict[str, list[int]] = {}
+
+    def observe(self, value: float, label_value: str = "") -> None:
+        counts = self._counts.get(label_value)
+        if counts is None:
+            counts = self._counts[label_value] = [0] * (len(self.buckets) + 1)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.inc(label_value, value)
+
+    def count(self, label_value: str = "") -> int:
+        return sum(self._counts.get(label_value, ()))
+
+    def samples(self) -> Iterator[str]:
+        bounds = [f"{bound:g}" for bound in self.buckets] + ["+Inf"]
+        for label_value, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{self._labels(label_value, le)} {cumulative}"
+            yield f"{self.name}_sum{self._labels(label_value)} {self.value(label_value)}"
+            yield f"{self.name}_count{self._labels(label_value)} {cumulative}"
+
+
+UPDATES = Counter("teabot_updates_total", "Updates the application finished processing")
+HANDLER_SECONDS = Histogram("teabot_handler_seconds", "Time spent in a handler", "handler")
+HANDLER_ERRORS = Counter("teabot_handler_errors_total", "Handler calls that raised", "handler")
+DB_SECONDS = Histogram("teabot_db_seconds", "Time for a storage call, including waiting for a worker", "function")
+DB_ERRORS = Counter("teabot_db_errors_total", "Storage calls that raised", "function")
+REMINDERS = Counter("teabot_reminders_total", "Reminders by outcome (sent, failed, blocked, skipped)", "outcome")
+NUDGES = Counter("teabot_nudges_total", "Follow-up nudges by outcome (sent, failed, blocked)", "outcome")
+REMINDER_LAG = Histogram(
+    "teabot_reminder_lag_seconds", "Delay from a reminder's scheduled minute to its delivery",
+    buckets=LAG_BUCKETS
+)
+SEND_SECONDS = Histogram(
+    "teabot_send_seconds", "Time from queueing a message to its outcome (sent, failed, blocked)", "outcome",
+    buckets=SEND_BUCKETS
+)
+SEND_QUEUE_DEPTH = Gauge("teabot_send_queue_depth", "Messages waiting for a send worker")
+USER_CACHE = Counter("teabot_user_cache_total", "User cache lookups by result (hit, miss)", "result")
+USER_CACHE_SIZE = Gauge("teabot_user_cache_size", "Users held in the user cache")
+
+
+def track_user_cache(stats: Callable[[], dict]) -> None:
+    """Read the user cache metrics from `stats`, e.g. database.user_cache_stats."""
+    USER_CACHE.track(lambda: {"hit": stats()["hits"], "miss": stats()["misses"]})
+    USER_CACHE_SIZE.track(lambda: {"": stats()["size"]})
+
+
+def _timed(fn, seconds: Histogram, errors: Counter):
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        except Exception:
+            errors.inc(name)
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - start, name)
+    return wrapper
+
+
+def instrumented(fn):
+    """Time a handler and count its errors, when metrics are enabled."""
+    return _timed(fn, HANDLER_SECONDS, HANDLER_ERRORS) if ENABLED else fn
+
+
+def timed_db(fn):
+    """Time an async storage call and count its errors, when metrics are enabled."""
+    return _timed(fn, DB_SECONDS, DB_ERRORS) if ENABLED else fn
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+async def _handle_metrics(request: Request) -> Response:
+    return Response(HTTPStatus.OK, render().encode(), CONTENT_TYPE)
+
+
+def create_server(host: str = METRICS_LISTEN, port: int = METRICS_PORT) -> HttpServer:
+    server = HttpServer(host, port)
+    server.route("GET", "/metrics", _handle_metrics)
+    return server
@@ -0,0 +1,44 @@
+"""Users, daily progress and settings.
+
+Databases from before migrations existed already have these tables, some
+without users.can_dm, so everything here only adds what is missing.
+"""
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER UNIQUE NOT NULL,
+            username TEXT,
+            reminder_time TEXT DEFAULT '20:00',
+            is_admin INTEGER DEFAULT 0,
+            can_dm INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS daily_progress (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            date DATE NOT NULL,
+            quran_pages INTEGER DEFAULT 0,
+            salawat_count INTEGER DEFAULT 0,
+            tahajjud INTEGER DEFAULT 0,
+            book_pages INTEGER DEFAULT 0,
+            fasted INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            UNIQUE(user_id, date)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+    if "can_dm" not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN can_dm INTEGER DEFAULT 0")
@@ -0,0 +1,23 @@
+"""Broadcast jobs and per-recipient delivery status (see broadcaster.py)."""
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            message TEXT NOT NULL,
+            admin_chat_id INTEGER NOT NULL,
+            status_message_id INTEGER,
+            finished INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS broadcast_recipients (
+            broadcast_id INTEGER NOT NULL,
+            telegram_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'pending',
+            PRIMARY KEY (broadcast_id, telegram_id),
+            FOREIGN KEY (broadcast_id) REFERENCES broadcasts(id)
+        )
+    """)
@@ -0,0 +1,110 @@
+"""Rolling per-user totals for the leaderboards (see database._refresh_rollups).
+
+Rows cover daily_progress dates >= rollup_windows.since and are kept
+current by the triggers below; since moves forward daily. The WHEN clauses
+skip rows older than every window, which keeps bulk imports of old history
+cheap. (No INSERT OR IGNORE in the triggers: an outer upsert's conflict
+policy would override it.)
+
+Earlier versions of the triggers may exist in databases from before
+migrations, so they are dropped and recreated.
+"""
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_windows (
+            window_days INTEGER PRIMARY KEY,
+            since DATE NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS progress_rollups (
+            user_id INTEGER NOT NULL,
+            window_days INTEGER NOT NULL,
+            quran_pages INTEGER DEFAULT 0,
+            salawat_count INTEGER DEFAULT 0,
+            tahajjud_days INTEGER DEFAULT 0,
+            book_pages INTEGER DEFAULT 0,
+            fasting_days INTEGER DEFAULT 0,
+            days_logged INTEGER DEFAULT 0,
+            PRIMARY KEY (user_id, window_days)
+        )
+    """)
+    for name in ("progress_rollups_insert", "progress_rollups_update", "progress_rollups_delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute("""
+        CREATE TRIGGER progress_rollups_insert
+        AFTER INSERT ON daily_progress
+        WHEN NEW.date >= (SELECT MIN(since) FROM rollup_windows)
+        BEGIN
+            INSERT INTO progress_rollups (user_id, window_days)
+                SELECT NEW.user_id, w.window_days FROM rollup_windows w
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM progress_rollups r
+                    WHERE r.user_id = NEW.user_id AND r.window_days = w.window_days
+                );
+            UPDATE progress_rollups SET
+                quran_pages = quran_pages + NEW.quran_pages,
+                salawat_count = salawat_count + NEW.salawat_count,
+                tahajjud_days = tahajjud_days + NEW.tahajjud,
+                book_pages = book_pages + NEW.book_pages,
+                fasting_days = fasting_days + NEW.fasted,
+                days_logged = days_logged + 1
+            WHERE user_id = NEW.user_id AND window_days IN (
+                SELECT window_days FROM rollup_windows WHERE NEW.date >= since
+            );
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER progress_rollups_update
+        AFTER UPDATE ON daily_progress
+        WHEN OLD.date >= (SELECT MIN(since) FROM rollup_windows)
+            OR NEW.date >= (SELECT MIN(since) FROM rollup_windows)
+        BEGIN
+            UPDATE progress_rollups SET
+                quran_pages = quran_pages - OLD.quran_pages,
+                salawat_count = salawat_count - OLD.salawat_count,
+                tahajjud_days = tahajjud_days - OLD.tahajjud,
+                book_pages = book_pages - OLD.book_pages,
+                fasting_days = fasting_days - OLD.fasted,
+                days_logged = days_logged - 1
+            WHERE user_id = OLD.user_id AND window_days IN (
+                SELECT window_days FROM rollup_windows WHERE OLD.date >= since
+            );
+            INSERT INTO progress_rollups (user_id, window_days)
+                SELECT NEW.user_id, w.window_days FROM rollup_windows w
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM progress_rollups r
+                    WHERE r.user_id = NEW.user_id AND r.window_days = w.window_days
+                );
+            UPDATE progress_rollups SET
+                quran_pages = quran_pages + NEW.quran_pages,
+                salawat_count = salawat_count + NEW.salawat_count,
+                tahajjud_days = tahajjud_days + NEW.tahajjud,
+                book_pages = book_pages + NEW.book_pages,
+                fasting_days = fasting_days + NEW.fasted,
+                days_logged = days_logged + 1
+            WHERE user_id = NEW.user_id AND window_days IN (
+                SELECT window_days FROM rollup_windows WHERE NEW.date >= since
+            );
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER progress_rollups_delete
+        AFTER DELETE ON daily_progress
+        WHEN OLD.date >= (SELECT MIN(since) FROM rollup_windows)
+        BEGIN
+            UPDATE progress_rollups SET
+                quran_pages = quran_pages - OLD.quran_pages,
+                salawat_count = salawat_count - OLD.salawat_count,
+                tahajjud_days = tahajjud_days - OLD.tahajjud,
+                book_pages = book_pages - OLD.book_pages,
+                fasting_days = fasting_days - OLD.fasted,
+                days_logged = days_logged - 1
+            WHERE user_id = OLD.user_id AND window_days IN (
+                SELECT window_days FROM rollup_windows WHERE OLD.date >= since
+            );
+        END
+    """)
+
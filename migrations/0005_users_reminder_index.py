@@ -0,0 +1,17 @@
+"""Index for the per-minute reminder query (can_dm = 1 AND reminder_time = ?).
+
+It also serves lookups by reminder_time alone within each can_dm value.
+0008 replaces it with an index on reminder_utc_minute; when this build was
+deferred until after 0008, there is nothing left to do.
+"""
+
+ONLINE = True
+
+
+def upgrade(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+    if "reminder_utc_minute" in columns:
+        return
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_reminder ON users(can_dm, reminder_time)"
+    )
@@ -0,0 +1,11 @@
+"""Index daily_progress by date for queries over every user in a date range.
+
+The rollup rebuild and the all-users views filter on date alone, which the
+(user_id, date) unique index can't serve.
+"""
+
+ONLINE = True
+
+
+def upgrade(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_daily_progress_date ON daily_progress(date)")
@@ -0,0 +1,23 @@
+"""Monthly per-user totals for daily_progress rows that have been archived.
+
+The scheduler's archival job moves days older than ARCHIVE_AFTER_DAYS in
+here (see database.archive_progress); all-time stats add these totals to
+what's left in daily_progress. Columns match the stats dict keys.
+"""
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS progress_archive (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            quran_pages INTEGER DEFAULT 0,
+            salawat_count INTEGER DEFAULT 0,
+            tahajjud_days INTEGER DEFAULT 0,
+            book_pages INTEGER DEFAULT 0,
+            fasting_days INTEGER DEFAULT 0,
+            days_logged INTEGER DEFAULT 0,
+            PRIMARY KEY (user_id, month),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
@@ -0,0 +1,37 @@
+"""Per-user timezones, and reminders indexed by UTC minute of the day.
+
+users.timezone is an IANA name, NULL meaning the bot's TIMEZONE.
+reminder_utc_minute is reminder_time converted to UTC at utc_offset, the
+zone's offset (in minutes) when it was last computed; the scheduler
+recomputes both when a zone's offset changes. Existing users keep the
+default zone, at its offset now.
+
+The per-minute reminder query moves from reminder_time to
+reminder_utc_minute, so the old index is replaced.
+"""
+import timezones
+
+
+def upgrade(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+    for column, definition in (
+        ("timezone", "TEXT"),
+        ("utc_offset", "INTEGER"),
+        ("reminder_utc_minute", "INTEGER"),
+    ):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE users ADD COLUMN {column} {definition}")
+
+    conn.execute(
+        """UPDATE users SET
+               utc_offset = :offset,
+               reminder_utc_minute = ((CAST(substr(reminder_time, 1, 2) AS INTEGER) * 60
+                                       + CAST(substr(reminder_time, 4, 2) AS INTEGER)
+                                       - :offset) % 1440 + 1440) % 1440""",
+        {"offset": timezones.utc_offset(None)}
+    )
+    conn.execute("DROP INDEX IF EXISTS idx_users_reminder")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_reminder_utc ON users(can_dm, reminder_utc_minute)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_timezone ON users(timezone, utc_offset)")
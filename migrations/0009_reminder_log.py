@@ -0,0 +1,20 @@
+"""Daily reminders by user and the user's local date.
+
+The scheduler claims a row before sending a reminder and records the
+delivery outcome in it afterwards, so each user gets at most one reminder
+a day even across restarts (see database.claim_reminders). Keyed by date
+first so the nightly pruning of old days is a range delete.
+"""
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reminder_log (
+            date TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'pending',
+            sent_at TIMESTAMP,
+            PRIMARY KEY (date, user_id),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
@@ -0,0 +1,12 @@
+"""When a user was nudged after their reminder, for optional nudges.
+
+With REMINDER_NUDGE_AFTER set, users whose reminder was sent that many
+minutes ago and who still haven't logged get one follow-up; nudged_at
+stays NULL until then (see database.claim_nudges).
+"""
+
+
+def upgrade(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(reminder_log)")}
+    if "nudged_at" not in columns:
+        conn.execute("ALTER TABLE reminder_log ADD COLUMN nudged_at TIMESTAMP")
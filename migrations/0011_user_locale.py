@@ -0,0 +1,11 @@
+"""Per-user language for bot messages.
+
+users.locale is a language in messages.CATALOG, NULL meaning the bot's
+LOCALE, which is what existing users keep.
+"""
+
+
+def upgrade(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+    if "locale" not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN locale TEXT")
@@ -0,0 +1,15 @@
+"""Index the reminders still to be nudged by when they were sent.
+
+Nudges are found by reminder_log.sent_at, so a reminder time changed after
+the reminder went out doesn't move its nudge. Once nudged, or if the
+reminder wasn't delivered, a row leaves the index.
+"""
+
+ONLINE = True
+
+
+def upgrade(conn):
+    conn.execute(
+        """CREATE INDEX IF NOT EXISTS idx_reminder_log_nudges ON reminder_log(sent_at)
+           WHERE status = 'sent' AND nudged_at IS NULL"""
+    )
@@ -0,0 +1,113 @@
+"""Versioned schema migrations for the SQLite database, run by init_db.
+
+Each module here is named NNNN_description.py and defines upgrade(conn),
+which runs in a transaction together with setting PRAGMA user_version to
+NNNN. The version therefore records exactly what has been applied, and
+startup on an up-to-date database is a single PRAGMA read.
+
+Databases created before migrations existed are at version 0 with some or
+all of the tables already present, so the early migrations only add what
+is missing.
+
+Modules that set ONLINE = True only build indexes, which nothing depends
+on for correctness. The bot starts without them, wherever they fall in the
+sequence, and builds them afterwards on the database writer thread, so a
+long build on a large database holds up writes for a while instead of
+keeping the bot offline. Reads carry on meanwhile under WAL. The version
+still moves past a deferred migration; the deferred_migrations table
+remembers it until it has been applied.
+"""
+import importlib
+import logging
+import pkgutil
+import sqlite3
+from dataclasses import dataclass
+from types import ModuleType
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class Migration:
+    version: int
+    name: str
+    module: ModuleType
+
+    @property
+    def online(self) -> bool:
+        return getattr(self.module, "ONLINE", False)
+
+
+def _discover() -> list[Migration]:
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        version, _, _ = info.name.partition("_")
+        if version.isdigit():
+            module = importlib.import_module(f"{__name__}.{info.name}")
+            migrations.append(Migration(int(version), info.name, module))
+    migrations.sort(key=lambda m: m.version)
+    for expected, migration in enumerate(migrations, start=1):
+        if migration.version != expected:
+            raise RuntimeError(f"Migration {migration.name} is out of sequence, expected {expected:04d}")
+    return migrations
+
+
+MIGRATIONS = _discover()
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def deferred_versions(conn: sqlite3.Connection) -> set[int]:
+    """Versions of ONLINE migrations passed over at startup and not yet applied."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'deferred_migrations'"
+    ).fetchone()
+    if not exists:
+        return set()
+    return {row[0] for row in conn.execute("SELECT version FROM deferred_migrations")}
+
+
+def migrate(conn: sqlite3.Connection, include_online: bool = True) -> list[str]:
+    """Apply pending migrations in order and return the names applied.
+
+    With include_online=False, ONLINE migrations are deferred: recorded in
+    deferred_migrations and applied by a later call with include_online=True.
+    """
+    version = current_version(conn)
+    deferred = deferred_versions(conn) if include_online else set()
+    if version >= LATEST_VERSION and not deferred:
+        return []
+
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version <= version and migration.version not in deferred:
+            continue
+        defer = migration.online and not include_online
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have applied it while we waited for the lock
+            if migration.version <= current_version(conn) and migration.version not in deferred_versions(conn):
+                conn.rollback()
+                continue
+            if defer:
+                conn.execute("CREATE TABLE IF NOT EXISTS deferred_migrations (version INTEGER PRIMARY KEY)")
+                conn.execute("INSERT OR IGNORE INTO deferred_migrations (version) VALUES (?)", (migration.version,))
+            else:
+                migration.module.upgrade(conn)
+                if migration.version in deferred:
+                    conn.execute("DELETE FROM deferred_migrations WHERE version = ?", (migration.version,))
+            if migration.version > current_version(conn):
+                conn.execute(f"PRAGMA user_version = {migration.version}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        if defer:
+            logger.info("Deferred migration %s", migration.name)
+        else:
+            logger.info("Applied migration %s", migration.name)
+            applied.append(migration.name)
+    return applied
@@ -1,9 +1,18 @@
 from dataclasses import dataclass
 from datetime import date, datetime
-from typing import Optional
+from typing import Optional, Union
+from zoneinfo import ZoneInfo
 
+import timezones
 
-@dataclass
+# Rows are mapped by position, so these must match the field order below.
+USER_COLUMNS = "id, telegram_id, username, reminder_time, is_admin, can_dm, timezone, locale, created_at"
+PROGRESS_COLUMNS = (
+    "id, user_id, date, quran_pages, salawat_count, tahajjud, book_pages, fasted, created_at"
+)
+
+
+@dataclass(slots=True)
 class User:
     id: int
     telegram_id: int
@@ -11,10 +20,27 @@ class User:
     reminder_time: str
     is_admin: bool
     can_dm: bool
-    created_at: datetime
+    timezone: Optional[str]  # None is the bot's TIMEZONE
+    locale: Optional[str]  # None is the bot's LOCALE
+    created_at_raw: Union[str, datetime, None]
+
+    @property
+    def created_at(self) -> Optional[datetime]:
+        """Parsed on first access; most callers never need it."""
+        if isinstance(self.created_at_raw, str):
+            self.created_at_raw = datetime.fromisoformat(self.created_at_raw)
+        return self.created_at_raw
+
+    @property
+    def zone(self) -> ZoneInfo:
+        return timezones.get_zone(self.timezone)
 
+    def today(self) -> date:
+        """The current date where the user is."""
+        return datetime.now(self.zone).date()
 
-@dataclass
+
+@dataclass(slots=True)
 class DailyProgress:
     id: int
     user_id: int
@@ -24,4 +50,21 @@ class DailyProgress:
     tahajjud: bool
     book_pages: int
     fasted: bool
+    created_at_raw: Union[str, datetime, None]
+
+    @property
+    def created_at(self) -> Optional[datetime]:
+        """Parsed on first access; most callers never need it."""
+        if isinstance(self.created_at_raw, str):
+            self.created_at_raw = datetime.fromisoformat(self.created_at_raw)
+        return self.created_at_raw
+
+
+@dataclass(slots=True)
+class Broadcast:
+    id: int
+    message: str
+    admin_chat_id: int
+    status_message_id: Optional[int]
+    finished: bool
     created_at: datetime
@@ -0,0 +1,112 @@
+"""Keep /log conversations and user_data in the bot's database.
+
+Storage goes through async_db, so it lands in whichever backend
+DATABASE_BACKEND selects. Only user_data and conversation states are
+persisted; bot_data holds live objects (the send queue, the broadcaster)
+and chat_data is unused.
+
+The application already batches persistence: it collects what changed and
+calls the update_* methods every `update_interval` seconds and at
+shutdown. Those calls arrive together, so they are staged here and written
+in one transaction rather than one write each.
+"""
+import asyncio
+import json
+from copy import deepcopy
+from typing import Any, Optional
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+import async_db as db
+
+
+class DatabasePersistence(BasePersistence):
+    def __init__(self, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self._user_data: Optional[dict[int, dict]] = None
+        self._pending_user_data: dict[int, Optional[str]] = {}
+        self._pending_conversations: dict[tuple[str, str], Optional[str]] = {}
+        self._write: Optional[asyncio.Future] = None
+
+    async def get_user_data(self) -> dict[int, dict]:
+        if self._user_data is None:
+            rows = await db.load_persisted_user_data()
+            self._user_data = {user_id: json.loads(data) for user_id, data in rows.items()}
+        return deepcopy(self._user_data)
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict[tuple, object]:
+        rows = await db.load_persisted_conversations(name)
+        return {tuple(json.loads(key)): json.loads(state) for key, state in rows.items()}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        state = json.dumps(new_state) if new_state is not None else None
+        self._pending_conversations[(name, json.dumps(list(key)))] = state
+        await self._schedule_write()
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        if self._user_data is not None and self._user_data.get(user_id) == data:
+            return
+        if self._user_data is not None:
+            self._user_data[user_id] = deepcopy(data)
+        self._pending_user_data[user_id] = json.dumps(data) if data else None
+        await self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        if self._user_data is not None:
+            self._user_data.pop(user_id, None)
+        self._pending_user_data[user_id] = None
+        await self._schedule_write()
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        await self._schedule_write()
+
+    async def _schedule_write(self) -> None:
+        """Wait for a write that includes everything staged so far.
+
+        The first caller starts the write after yielding once, so every
+        update_* call gathered in the same persistence pass joins it.
+        """
+        if self._write is None:
+            self._write = asyncio.ensure_future(self._write_pending())
+        await asyncio.shield(self._write)
+
+    async def _write_pending(self) -> None:
+        await asyncio.sleep(0)
+        users, self._pending_user_data = self._pending_user_data, {}
+        conversations, self._pending_conversations = self._pending_conversations, {}
+        self._write = None
+        if users or conversations:
+            await db.save_persisted_state(users, conversations)
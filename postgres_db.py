@@ -0,0 +1,758 @@
+"""PostgreSQL implementation of the async_db functions.
+
+Selected with DATABASE_BACKEND=postgres. Postgres takes concurrent writers
+and connections from several bot processes, so calls go straight to an
+asyncpg connection pool on the event loop rather than through worker
+threads. The pool opens, and creates the schema, on first use.
+
+Unlike the SQLite backend there is no in-process user cache or leaderboard
+rollup: another process may change users at any time, and the leaderboard
+is aggregated on read through the (user_id, date) index. Settings keep the
+SETTINGS_CACHE_TTL cache.
+"""
+import asyncio
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+import asyncpg
+
+import timezones
+from config import DATABASE_POOL_SIZE, DATABASE_URL, DEFAULT_REMINDER_TIME, SETTINGS_CACHE_TTL
+from database import ARCHIVE_BATCH_SIZE, STATS_FIELDS
+from models import USER_COLUMNS, PROGRESS_COLUMNS, User, DailyProgress, Broadcast
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        id BIGSERIAL PRIMARY KEY,
+        telegram_id BIGINT UNIQUE NOT NULL,
+        username TEXT,
+        reminder_time TEXT DEFAULT '20:00',
+        is_admin BOOLEAN DEFAULT FALSE,
+        can_dm BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS daily_progress (
+        id BIGSERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL REFERENCES users(id),
+        date DATE NOT NULL,
+        quran_pages INTEGER DEFAULT 0,
+        salawat_count INTEGER DEFAULT 0,
+        tahajjud BOOLEAN DEFAULT FALSE,
+        book_pages INTEGER DEFAULT 0,
+        fasted BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (user_id, date)
+    );
+
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id BIGSERIAL PRIMARY KEY,
+        message TEXT NOT NULL,
+        admin_chat_id BIGINT NOT NULL,
+        status_message_id BIGINT,
+        finished BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS broadcast_recipients (
+        broadcast_id BIGINT NOT NULL REFERENCES broadcasts(id),
+        telegram_id BIGINT NOT NULL,
+        status TEXT DEFAULT 'pending',
+        PRIMARY KEY (broadcast_id, telegram_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS persisted_user_data (
+        user_id BIGINT PRIMARY KEY,
+        data TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS persisted_conversations (
+        name TEXT NOT NULL,
+        key TEXT NOT NULL,
+        state TEXT NOT NULL,
+        PRIMARY KEY (name, key)
+    );
+
+    CREATE TABLE IF NOT EXISTS progress_archive (
+        user_id BIGINT NOT NULL REFERENCES users(id),
+        month TEXT NOT NULL,
+        quran_pages BIGINT DEFAULT 0,
+        salawat_count BIGINT DEFAULT 0,
+        tahajjud_days INTEGER DEFAULT 0,
+        book_pages BIGINT DEFAULT 0,
+        fasting_days INTEGER DEFAULT 0,
+        days_logged INTEGER DEFAULT 0,
+        PRIMARY KEY (user_id, month)
+    );
+
+    CREATE TABLE IF NOT EXISTS reminder_log (
+        date DATE NOT NULL,
+        user_id BIGINT NOT NULL REFERENCES users(id),
+        status TEXT DEFAULT 'pending',
+        sent_at TIMESTAMP,
+        PRIMARY KEY (date, user_id)
+    );
+    ALTER TABLE reminder_log ADD COLUMN IF NOT EXISTS nudged_at TIMESTAMP;
+    -- Reminders still to be nudged, by send time (see migrations/0012_reminder_log_nudges.py)
+    CREATE INDEX IF NOT EXISTS idx_reminder_log_nudges ON reminder_log(sent_at)
+        WHERE status = 'sent' AND nudged_at IS NULL;
+
+    -- Per-user timezones (see migrations/0008_user_timezones.py); the
+    -- scheduler fills in utc_offset and reminder_utc_minute for older rows
+    ALTER TABLE users ADD COLUMN IF NOT EXISTS timezone TEXT;
+    ALTER TABLE users ADD COLUMN IF NOT EXISTS utc_offset INTEGER;
+    ALTER TABLE users ADD COLUMN IF NOT EXISTS reminder_utc_minute INTEGER;
+
+    DROP INDEX IF EXISTS idx_users_reminder;
+    CREATE INDEX IF NOT EXISTS idx_users_reminder_utc ON users(can_dm, reminder_utc_minute);
+    CREATE INDEX IF NOT EXISTS idx_users_timezone ON users(timezone, utc_offset);
+    CREATE INDEX IF NOT EXISTS idx_daily_progress_date ON daily_progress(date);
+
+    -- Per-user language (see migrations/0011_user_locale.py)
+    ALTER TABLE users ADD COLUMN IF NOT EXISTS locale TEXT;
+"""
+
+# Held while creating the schema, so processes starting together don't race
+SCHEMA_LOCK_ID = 0x7EAB07
+
+# A user's reminder_time as minutes past local midnight
+LOCAL_REMINDER_MINUTE = "(split_part(reminder_time, ':', 1)::int * 60 + split_part(reminder_time, ':', 2)::int)"
+
+# Boolean columns are summed as day counts
+BOOLEAN_COLUMNS = ("tahajjud", "fasted")
+
+_pool: Optional[asyncpg.Pool] = None
+_pool_lock = asyncio.Lock()
+
+# Settings cache: key -> (value, time loaded), versioned as in database.py
+_settings_cache: dict[str, tuple[Optional[str], float]] = {}
+_settings_version = 0
+
+
+async def _get_pool() -> asyncpg.Pool:
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                pool = await asyncpg.create_pool(
+                    DATABASE_URL, min_size=1, max_size=DATABASE_POOL_SIZE
+                )
+                async with pool.acquire() as conn, conn.transaction():
+                    await conn.execute("SELECT pg_advisory_xact_lock($1)", SCHEMA_LOCK_ID)
+                    await conn.execute(SCHEMA)
+                _pool = pool
+    return _pool
+
+
+async def init_db() -> None:
+    await _get_pool()
+
+
+async def shutdown() -> None:
+    """Close the connection pool."""
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+
+
+def _rowcount(status: str) -> int:
+    # asyncpg returns the command tag, e.g. "UPDATE 1"
+    return int(status.rsplit(" ", 1)[-1])
+
+
+def _sum(column: str) -> str:
+    return f"{column}::int" if column in BOOLEAN_COLUMNS else column
+
+
+async def create_user(telegram_id: int, username: Optional[str] = None, is_admin: bool = False, can_dm: bool = False) -> User:
+    offset = timezones.utc_offset(None)
+    pool = await _get_pool()
+    row = await pool.fetchrow(
+        f"""INSERT INTO users
+           (telegram_id, username, reminder_time, is_admin, can_dm, utc_offset, reminder_utc_minute)
+           VALUES ($1, $2, $3, $4, $5, $6, $7)
+           ON CONFLICT (telegram_id) DO UPDATE SET
+               username = excluded.username,
+               can_dm = users.can_dm OR excluded.can_dm,
+               utc_offset = COALESCE(users.utc_offset, excluded.utc_offset),
+               reminder_utc_minute = COALESCE(users.reminder_utc_minute, excluded.reminder_utc_minute)
+           RETURNING {USER_COLUMNS}""",
+        telegram_id, username, DEFAULT_REMINDER_TIME, is_admin, can_dm,
+        offset, timezones.utc_minute(DEFAULT_REMINDER_TIME, offset)
+    )
+    return User(*row)
+
+
+async def set_can_dm(telegram_id: int, can_dm: bool) -> None:
+    pool = await _get_pool()
+    await pool.execute("UPDATE users SET can_dm = $1 WHERE telegram_id = $2", can_dm, telegram_id)
+
+
+async def get_users_for_reminders() -> list[User]:
+    """Get users who can receive DM reminders."""
+    pool = await _get_pool()
+    rows = await pool.fetch(f"SELECT {USER_COLUMNS} FROM users WHERE can_dm")
+    return [User(*row) for row in rows]
+
+
+async def get_users_due_for_reminder(at: datetime, nudge_after: int = 0) -> tuple[list[User], list[tuple[User, date]]]:
+    """Get the DM-able users due a reminder, and a nudge, at UTC instant `at`.
+
+    Same lists as database.get_users_due_for_reminder, from one query.
+    """
+    sent_from = at.replace(second=0, microsecond=0, tzinfo=None) - timedelta(minutes=nudge_after)
+    pool = await _get_pool()
+    rows = await pool.fetch(
+        f"""SELECT {USER_COLUMNS}, NULL::date AS reminder_date FROM users
+            WHERE can_dm AND reminder_utc_minute = $1
+              AND NOT EXISTS (
+                  SELECT 1 FROM daily_progress p
+                  WHERE p.user_id = users.id AND p.date = ($2::timestamp + utc_offset * INTERVAL '1 minute')::date
+              )
+            UNION ALL
+            SELECT {USER_COLUMNS}, r.date FROM reminder_log r JOIN users ON users.id = r.user_id
+            WHERE r.status = 'sent' AND r.nudged_at IS NULL
+              AND r.sent_at >= $3::timestamp AND r.sent_at < $3::timestamp + INTERVAL '1 minute'
+              AND users.can_dm
+              AND NOT EXISTS (
+                  SELECT 1 FROM daily_progress p WHERE p.user_id = users.id AND p.date = r.date
+              )""",
+        at.hour * 60 + at.minute, at.replace(tzinfo=None), sent_from if nudge_after else None
+    )
+    due, nudges = [], []
+    for row in rows:
+        user = User(*list(row)[:-1])
+        if row["reminder_date"] is None:
+            due.append(user)
+        else:
+            nudges.append((user, row["reminder_date"]))
+    return due, nudges
+
+
+async def get_reminder_minutes() -> list[int]:
+    """The distinct UTC minutes of the day (0-1439) DM-able users have reminders at."""
+    pool = await _get_pool()
+    rows = await pool.fetch("SELECT DISTINCT reminder_utc_minute FROM users WHERE can_dm")
+    return [row[0] for row in rows]
+
+
+async def get_user(telegram_id: int) -> Optional[User]:
+    pool = await _get_pool()
+    row = await pool.fetchrow(f"SELECT {USER_COLUMNS} FROM users WHERE telegram_id = $1", telegram_id)
+    return User(*row) if row else None
+
+
+async def get_all_users() -> list[User]:
+    pool = await _get_pool()
+    rows = await pool.fetch(f"SELECT {USER_COLUMNS} FROM users")
+    return [User(*row) for row in rows]
+
+
+async def update_reminder_time(telegram_id: int, time: str) -> bool:
+    local_minute = timezones.utc_minute(time, 0)  # Minutes past local midnight
+    pool = await _get_pool()
+    status = await pool.execute(
+        """UPDATE users SET
+               reminder_time = $1,
+               reminder_utc_minute = (($2 - utc_offset) % 1440 + 1440) % 1440
+           WHERE telegram_id = $3""",
+        time, local_minute, telegram_id
+    )
+    return _rowcount(status) > 0
+
+
+async def set_timezone(telegram_id: int, timezone: Optional[str]) -> bool:
+    """Set a user's IANA timezone (None for the default) and reschedule their reminder."""
+    offset = timezones.utc_offset(timezone)
+    pool = await _get_pool()
+    status = await pool.execute(
+        f"""UPDATE users SET
+                timezone = $1,
+                utc_offset = $2,
+                reminder_utc_minute = (({LOCAL_REMINDER_MINUTE} - $2) % 1440 + 1440) % 1440
+            WHERE telegram_id = $3""",
+        timezone, offset, telegram_id
+    )
+    return _rowcount(status) > 0
+
+
+async def set_locale(telegram_id: int, locale: Optional[str]) -> bool:
+    """Set a user's language (None for the default)."""
+    pool = await _get_pool()
+    status = await pool.execute("UPDATE users SET locale = $1 WHERE telegram_id = $2", locale, telegram_id)
+    return _rowcount(status) > 0
+
+
+async def get_timezones() -> list[Optional[str]]:
+    """The distinct timezones users have, None standing for the default."""
+    pool = await _get_pool()
+    return [row[0] for row in await pool.fetch("SELECT DISTINCT timezone FROM users")]
+
+
+async def refresh_utc_offsets(timezone: Optional[str], offset: int) -> int:
+    """Reschedule the reminders of users in `timezone` whose offset isn't `offset`."""
+    pool = await _get_pool()
+    status = await pool.execute(
+        f"""UPDATE users SET
+                utc_offset = $2,
+                reminder_utc_minute = (({LOCAL_REMINDER_MINUTE} - $2) % 1440 + 1440) % 1440
+            WHERE timezone IS NOT DISTINCT FROM $1 AND utc_offset IS DISTINCT FROM $2""",
+        timezone, offset
+    )
+    return _rowcount(status)
+
+
+async def set_admin(telegram_id: int) -> bool:
+    pool = await _get_pool()
+    status = await pool.execute("UPDATE users SET is_admin = TRUE WHERE telegram_id = $1", telegram_id)
+    return _rowcount(status) > 0
+
+
+async def save_progress(
+    user_id: int,
+    progress_date: date,
+    quran_pages: int,
+    salawat_count: int,
+    tahajjud: bool,
+    book_pages: int,
+    fasted: bool
+) -> DailyProgress:
+    pool = await _get_pool()
+    row = await pool.fetchrow(
+        f"""INSERT INTO daily_progress
+           (user_id, date, quran_pages, salawat_count, tahajjud, book_pages, fasted)
+           VALUES ($1, $2, $3, $4, $5, $6, $7)
+           ON CONFLICT (user_id, date) DO UPDATE SET
+               quran_pages = excluded.quran_pages,
+               salawat_count = excluded.salawat_count,
+               tahajjud = excluded.tahajjud,
+               book_pages = excluded.book_pages,
+               fasted = excluded.fasted
+           RETURNING {PROGRESS_COLUMNS}""",
+        user_id, progress_date, quran_pages, salawat_count, tahajjud, book_pages, fasted
+    )
+    return DailyProgress(*row)
+
+
+async def get_today_progress(user_id: int, today: Optional[date] = None) -> Optional[DailyProgress]:
+    """Get the user's progress for `today` (their local date; default the server's)."""
+    pool = await _get_pool()
+    row = await pool.fetchrow(
+        f"SELECT {PROGRESS_COLUMNS} FROM daily_progress WHERE user_id = $1 AND date = $2",
+        user_id, today or date.today()
+    )
+    return DailyProgress(*row) if row else None
+
+
+async def get_weekly_stats(user_id: int) -> dict:
+    return (await get_windowed_stats(user_id, (7,)))[7]
+
+
+async def get_monthly_stats(user_id: int) -> dict:
+    return (await get_windowed_stats(user_id, (30,)))[30]
+
+
+async def get_windowed_stats(user_id: int, windows: tuple[Optional[int], ...], today: Optional[date] = None) -> dict:
+    """Get a user's totals over several trailing windows in one query.
+
+    Same windows, `today` and result as database.get_windowed_stats.
+    """
+    today = today or date.today()
+    columns = []
+    args: list = []
+    for i, window in enumerate(windows):
+        where = ""
+        if window is not None:
+            args.append(today - timedelta(days=window))
+            where = f" FILTER (WHERE date >= ${len(args)})"
+        columns += [f"SUM({_sum(column)}){where} AS w{i}_{key}" for column, key in STATS_FIELDS]
+        columns.append(f"COUNT(*){where} AS w{i}_days_logged")
+
+    args.append(user_id)
+    user_param = f"${len(args)}"
+
+    # All-time totals include archived months, read in the same statement
+    stat_keys = [key for _, key in STATS_FIELDS] + ["days_logged"]
+    if None in windows:
+        columns += [
+            f"(SELECT SUM({key}) FROM progress_archive WHERE user_id = {user_param}) AS archived_{key}"
+            for key in stat_keys
+        ]
+
+    query = f"SELECT {', '.join(columns)} FROM daily_progress WHERE user_id = {user_param}"
+    if None not in windows:
+        args.append(today - timedelta(days=max(windows)))
+        query += f" AND date >= ${len(args)}"
+
+    pool = await _get_pool()
+    row = await pool.fetchrow(query, *args)
+
+    stats = {}
+    for i, window in enumerate(windows):
+        stats[window] = {key: row[f"w{i}_{key}"] or 0 for key in stat_keys}
+        if window is None:
+            for key in stat_keys:
+                stats[window][key] += row[f"archived_{key}"] or 0
+    return stats
+
+
+async def get_all_users_weekly_stats(at: Optional[datetime] = None) -> list[dict]:
+    """Get weekly stats for all users (for admin view)."""
+    return await get_all_users_stats(7, at)
+
+
+async def get_all_users_stats(window_days: int, at: Optional[datetime] = None) -> list[dict]:
+    """Get totals since `window_days` ago for all users, best Quran reader first.
+
+    "Ago" counts from each user's local date at UTC instant `at` (default now).
+    """
+    at = (at or datetime.now(timezone.utc)).astimezone(timezone.utc).replace(tzinfo=None)
+    pool = await _get_pool()
+    rows = await pool.fetch(
+        """SELECT
+            u.id,
+            u.username,
+            u.telegram_id,
+            COALESCE(SUM(p.quran_pages), 0) AS total_quran,
+            COALESCE(SUM(p.salawat_count), 0) AS total_salawat,
+            COUNT(*) FILTER (WHERE p.tahajjud) AS total_tahajjud,
+            COALESCE(SUM(p.book_pages), 0) AS total_book,
+            COUNT(*) FILTER (WHERE p.fasted) AS total_fasted,
+            COUNT(p.id) AS days_logged
+           FROM users u
+           LEFT JOIN daily_progress p ON p.user_id = u.id
+               AND p.date >= ($1::timestamp + u.utc_offset * INTERVAL '1 minute')::date - $2::int
+           GROUP BY u.id
+           ORDER BY total_quran DESC, u.id""",
+        at, window_days
+    )
+    return [
+        {
+            "user_id": row["id"],
+            "username": row["username"] or f"User_{row['telegram_id']}",
+            "quran_pages": row["total_quran"],
+            "salawat_count": row["total_salawat"],
+            "tahajjud_days": row["total_tahajjud"],
+            "book_pages": row["total_book"],
+            "fasting_days": row["total_fasted"],
+            "days_logged": row["days_logged"]
+        }
+        for row in rows
+    ]
+
+
+async def archive_progress(before: date, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move up to batch_size days dated before `before` into progress_archive.
+
+    Same contract as database.archive_progress.
+    """
+    pool = await _get_pool()
+    return await pool.fetchval(
+        """WITH moved AS (
+               DELETE FROM daily_progress WHERE id IN (
+                   SELECT id FROM daily_progress WHERE date < $1
+                   ORDER BY date, id LIMIT $2
+               )
+               RETURNING user_id, date, quran_pages, salawat_count, tahajjud, book_pages, fasted
+           ), archived AS (
+               INSERT INTO progress_archive
+               (user_id, month, quran_pages, salawat_count, tahajjud_days,
+                book_pages, fasting_days, days_logged)
+               SELECT user_id, to_char(date, 'YYYY-MM'), SUM(quran_pages), SUM(salawat_count),
+                      COUNT(*) FILTER (WHERE tahajjud), SUM(book_pages),
+                      COUNT(*) FILTER (WHERE fasted), COUNT(*)
+               FROM moved
+               GROUP BY user_id, to_char(date, 'YYYY-MM')
+               ON CONFLICT (user_id, month) DO UPDATE SET
+                   quran_pages = progress_archive.quran_pages + excluded.quran_pages,
+                   salawat_count = progress_archive.salawat_count + excluded.salawat_count,
+                   tahajjud_days = progress_archive.tahajjud_days + excluded.tahajjud_days,
+                   book_pages = progress_archive.book_pages + excluded.book_pages,
+                   fasting_days = progress_archive.fasting_days + excluded.fasting_days,
+                   days_logged = progress_archive.days_logged + excluded.days_logged
+           )
+           SELECT COUNT(*) FROM moved""",
+        before, batch_size
+    )
+
+
+async def claim_reminders(entries: list[tuple[int, date]]) -> list[int]:
+    """Record (user_id, the user's local date) reminders as about to be sent.
+
+    Same contract as database.claim_reminders.
+    """
+    pool = await _get_pool()
+    rows = await pool.fetch(
+        """INSERT INTO reminder_log (date, user_id)
+           SELECT * FROM unnest($1::date[], $2::bigint[])
+           ON CONFLICT DO NOTHING
+           RETURNING user_id""",
+        [day for _, day in entries], [user_id for user_id, _ in entries]
+    )
+    return [row["user_id"] for row in rows]
+
+
+async def claim_nudges(entries: list[tuple[int, date]]) -> list[int]:
+    """Mark (user_id, date of their reminder) nudges as about to be sent.
+
+    Same contract as database.claim_nudges.
+    """
+    pool = await _get_pool()
+    rows = await pool.fetch(
+        """UPDATE reminder_log r SET nudged_at = CURRENT_TIMESTAMP
+           FROM unnest($1::date[], $2::bigint[]) AS c(date, user_id)
+           WHERE r.date = c.date AND r.user_id = c.user_id AND r.nudged_at IS NULL
+           RETURNING r.user_id""",
+        [day for _, day in entries], [user_id for user_id, _ in entries]
+    )
+    return [row["user_id"] for row in rows]
+
+
+async def release_reminders(entries: list[tuple[int, date]]) -> None:
+    """Give back (user_id, date) claims whose reminder was never sent.
+
+    Same contract as database.release_reminders.
+    """
+    pool = await _get_pool()
+    await pool.executemany(
+        "DELETE FROM reminder_log WHERE date = $1 AND user_id = $2 AND status = 'pending'",
+        [(day, user_id) for user_id, day in entries]
+    )
+
+
+async def release_pending_reminders() -> int:
+    """Give back every claim still 'pending', left by a previous run.
+
+    Same contract as database.release_pending_reminders.
+    """
+    pool = await _get_pool()
+    return _rowcount(await pool.execute("DELETE FROM reminder_log WHERE status = 'pending'"))
+
+
+async def release_nudges(entries: list[tuple[int, date]]) -> None:
+    """Give back (user_id, date of their reminder) nudge claims never sent."""
+    pool = await _get_pool()
+    await pool.executemany(
+        "UPDATE reminder_log SET nudged_at = NULL WHERE date = $1 AND user_id = $2",
+        [(day, user_id) for user_id, day in entries]
+    )
+
+
+async def record_reminder_outcomes(outcomes: list[tuple[int, date, str, datetime]]) -> None:
+    """Store (user_id, date, status, sent_at) delivery outcomes of claimed reminders.
+
+    sent_at is the UTC instant the delivery finished, stored as naive UTC.
+    """
+    pool = await _get_pool()
+    await pool.executemany(
+        "UPDATE reminder_log SET status = $1, sent_at = $2 WHERE date = $3 AND user_id = $4",
+        [(status, sent_at.astimezone(timezone.utc).replace(tzinfo=None), day, user_id)
+         for user_id, day, status, sent_at in outcomes]
+    )
+
+
+async def prune_reminder_log(before: date, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Delete up to batch_size reminder_log rows dated before `before`.
+
+    Same contract as database.prune_reminder_log.
+    """
+    pool = await _get_pool()
+    status = await pool.execute(
+        """DELETE FROM reminder_log WHERE (date, user_id) IN (
+               SELECT date, user_id FROM reminder_log WHERE date < $1 LIMIT $2
+           )""",
+        before, batch_size
+    )
+    return _rowcount(status)
+
+
+async def vacuum_step(max_pages: int = 0) -> int:
+    """Nothing to do: autovacuum reclaims the space archiving frees."""
+    return 0
+
+
+async def get_today_all_progress(at: Optional[datetime] = None) -> list[dict]:
+    """Get today's progress for all users (for admin view).
+
+    "Today" is each user's local date at UTC instant `at` (default now).
+    """
+    at = (at or datetime.now(timezone.utc)).astimezone(timezone.utc).replace(tzinfo=None)
+    pool = await _get_pool()
+    rows = await pool.fetch(
+        """SELECT
+            u.username,
+            u.telegram_id,
+            p.quran_pages,
+            p.salawat_count,
+            p.tahajjud,
+            p.book_pages,
+            p.fasted
+           FROM users u
+           LEFT JOIN daily_progress p ON u.id = p.user_id
+               AND p.date = ($1::timestamp + u.utc_offset * INTERVAL '1 minute')::date
+           ORDER BY u.username NULLS FIRST""",
+        at
+    )
+    return [
+        {
+            "username": row["username"] or f"User_{row['telegram_id']}",
+            "quran_pages": row["quran_pages"],
+            "salawat_count": row["salawat_count"],
+            "tahajjud": row["tahajjud"],
+            "book_pages": row["book_pages"],
+            "fasted": row["fasted"],
+            "logged": row["quran_pages"] is not None
+        }
+        for row in rows
+    ]
+
+
+async def get_setting(key: str) -> Optional[str]:
+    """Read a setting, cached as in database.get_setting."""
+    cached = _settings_cache.get(key)
+    if cached is not None:
+        value, loaded_at = cached
+        if not SETTINGS_CACHE_TTL or time.monotonic() - loaded_at < SETTINGS_CACHE_TTL:
+            return value
+
+    version = _settings_version
+    pool = await _get_pool()
+    value = await pool.fetchval("SELECT value FROM settings WHERE key = $1", key)
+    # Don't overwrite a newer value stored by set_setting while we queried
+    if version == _settings_version:
+        _settings_cache[key] = (value, time.monotonic())
+    return value
+
+
+async def set_setting(key: str, value: str) -> None:
+    global _settings_version
+    pool = await _get_pool()
+    await pool.execute(
+        "INSERT INTO settings (key, value) VALUES ($1, $2) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+        key, value
+    )
+    _settings_version += 1
+    _settings_cache[key] = (value, time.monotonic())
+
+
+async def create_broadcast(message: str, admin_chat_id: int) -> Broadcast:
+    """Create a broadcast job addressed to every current user."""
+    pool = await _get_pool()
+    async with pool.acquire() as conn, conn.transaction():
+        row = await conn.fetchrow(
+            "INSERT INTO broadcasts (message, admin_chat_id) VALUES ($1, $2) RETURNING *",
+            message, admin_chat_id
+        )
+        await conn.execute(
+            """INSERT INTO broadcast_recipients (broadcast_id, telegram_id)
+               SELECT $1, telegram_id FROM users""",
+            row["id"]
+        )
+    return _row_to_broadcast(row)
+
+
+async def set_broadcast_status_message(broadcast_id: int, message_id: int) -> None:
+    pool = await _get_pool()
+    await pool.execute(
+        "UPDATE broadcasts SET status_message_id = $1 WHERE id = $2", message_id, broadcast_id
+    )
+
+
+async def get_unfinished_broadcasts() -> list[Broadcast]:
+    pool = await _get_pool()
+    rows = await pool.fetch("SELECT * FROM broadcasts WHERE NOT finished ORDER BY id")
+    return [_row_to_broadcast(row) for row in rows]
+
+
+async def get_pending_broadcast_recipients(broadcast_id: int) -> list[int]:
+    pool = await _get_pool()
+    rows = await pool.fetch(
+        "SELECT telegram_id FROM broadcast_recipients WHERE broadcast_id = $1 AND status = 'pending'",
+        broadcast_id
+    )
+    return [row["telegram_id"] for row in rows]
+
+
+async def record_broadcast_deliveries(broadcast_id: int, outcomes: list[tuple[int, str]]) -> None:
+    """Store (telegram_id, status) delivery outcomes in one transaction."""
+    pool = await _get_pool()
+    await pool.executemany(
+        "UPDATE broadcast_recipients SET status = $1 WHERE broadcast_id = $2 AND telegram_id = $3",
+        [(status, broadcast_id, telegram_id) for telegram_id, status in outcomes]
+    )
+
+
+async def get_broadcast_counts(broadcast_id: int) -> dict:
+    """Count recipients of a broadcast by delivery status."""
+    pool = await _get_pool()
+    rows = await pool.fetch(
+        """SELECT status, COUNT(*) AS count FROM broadcast_recipients
+           WHERE broadcast_id = $1 GROUP BY status""",
+        broadcast_id
+    )
+    return {row["status"]: row["count"] for row in rows}
+
+
+async def finish_broadcast(broadcast_id: int) -> None:
+    pool = await _get_pool()
+    await pool.execute("UPDATE broadcasts SET finished = TRUE WHERE id = $1", broadcast_id)
+
+
+async def load_persisted_user_data() -> dict[int, str]:
+    pool = await _get_pool()
+    rows = await pool.fetch("SELECT user_id, data FROM persisted_user_data")
+    return {row["user_id"]: row["data"] for row in rows}
+
+
+async def load_persisted_conversations(name: str) -> dict[str, str]:
+    pool = await _get_pool()
+    rows = await pool.fetch("SELECT key, state FROM persisted_conversations WHERE name = $1", name)
+    return {row["key"]: row["state"] for row in rows}
+
+
+async def save_persisted_state(
+    user_data: dict[int, Optional[str]],
+    conversations: dict[tuple[str, str], Optional[str]]
+) -> None:
+    """Write staged user_data and conversation changes in one transaction.
+
+    A value of None deletes the entry.
+    """
+    pool = await _get_pool()
+    async with pool.acquire() as conn, conn.transaction():
+        await conn.executemany(
+            """INSERT INTO persisted_user_data (user_id, data) VALUES ($1, $2)
+               ON CONFLICT (user_id) DO UPDATE SET data = excluded.data""",
+            [(user_id, data) for user_id, data in user_data.items() if data is not None]
+        )
+        await conn.executemany(
+            "DELETE FROM persisted_user_data WHERE user_id = $1",
+            [(user_id,) for user_id, data in user_data.items() if data is None]
+        )
+        await conn.executemany(
+            """INSERT INTO persisted_conversations (name, key, state) VALUES ($1, $2, $3)
+               ON CONFLICT (name, key) DO UPDATE SET state = excluded.state""",
+            [(name, key, state) for (name, key), state in conversations.items() if state is not None]
+        )
+        await conn.executemany(
+            "DELETE FROM persisted_conversations WHERE name = $1 AND key = $2",
+            [(name, key) for (name, key), state in conversations.items() if state is None]
+        )
+
+
+def _row_to_broadcast(row) -> Broadcast:
+    return Broadcast(
+        id=row["id"],
+        message=row["message"],
+        admin_chat_id=row["admin_chat_id"],
+        status_message_id=row["status_message_id"],
+        finished=row["finished"],
+        created_at=row["created_at"]
+    )
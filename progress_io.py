@@ -0,0 +1,203 @@
+"""Bulk export and import of daily progress as CSV or JSON Lines.
+
+Both directions stream: export writes rows as they are read from the
+database, and import parses the file lazily and writes it in large batches
+(see database.import_progress), so neither holds the whole history in
+memory. Rows are keyed by telegram_id rather than the internal user id, so
+a file can be moved between databases.
+
+Days already rolled into monthly totals (see ARCHIVE_AFTER_DAYS) come
+after the days, one row per user and month: the date is "YYYY-MM", the
+tahajjud and fasted columns count days, and days_logged is filled in.
+Day rows leave days_logged empty (CSV) or out (JSON Lines), so files
+without that column still import.
+
+SQLite backend only; a PostgreSQL database has COPY for this.
+
+Usage:
+    python progress_io.py export [--format csv|jsonl] [-o FILE]
+    python progress_io.py import FILE [--format csv|jsonl]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import date
+from typing import Iterator, Optional, TextIO
+
+import database as db
+from config import DATABASE_BACKEND
+
+FORMATS = ("csv", "jsonl")
+
+FIELDS = db.PROGRESS_EXPORT_FIELDS
+ARCHIVE_FIELDS = db.ARCHIVE_EXPORT_FIELDS
+TRUE_VALUES = ("1", "true", "yes", "y")
+FALSE_VALUES = ("0", "false", "no", "n", "")
+
+
+def export_progress(out: TextIO, fmt: str) -> int:
+    """Write all daily progress to `out`. Returns the number of rows."""
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(ARCHIVE_FIELDS)
+        for row in db.iter_progress():
+            if len(row) == len(ARCHIVE_FIELDS):
+                writer.writerow(row)
+            else:
+                writer.writerow(row[:4] + (int(row[4]), row[5], int(row[6]), ""))
+            count += 1
+    else:
+        for row in db.iter_progress():
+            if len(row) == len(ARCHIVE_FIELDS):
+                record = dict(zip(ARCHIVE_FIELDS, row))
+            else:
+                record = dict(zip(FIELDS, row))
+                record["tahajjud"] = bool(record["tahajjud"])
+                record["fasted"] = bool(record["fasted"])
+            out.write(json.dumps(record) + "\n")
+            count += 1
+    return count
+
+
+def export_file(path: str, fmt: str) -> int:
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        return export_progress(out, fmt)
+
+
+def import_progress(file: TextIO, fmt: str) -> int:
+    """Import rows from `file`. Returns the number of rows imported."""
+    return db.import_progress(read_rows(file, fmt))
+
+
+def read_rows(file: TextIO, fmt: str) -> Iterator[tuple]:
+    """Parse `file` lazily into PROGRESS_EXPORT_FIELDS tuples for days and
+    ARCHIVE_EXPORT_FIELDS tuples for archived months.
+
+    Raises ValueError naming the line of the first invalid row.
+    """
+    if fmt == "csv":
+        reader = csv.reader(file)
+        header = next(reader, None) or []
+        try:
+            positions = [header.index(field) for field in FIELDS]
+        except ValueError:
+            raise ValueError(f"line 1: CSV header must name {', '.join(FIELDS)}") from None
+        if "days_logged" in header:
+            positions.append(header.index("days_logged"))
+        lines = enumerate(reader, start=2)
+        extract = lambda row: [row[i] for i in positions]  # noqa: E731
+    else:
+        lines = enumerate(file, start=1)
+        extract = _jsonl_values
+
+    for line_number, line in lines:
+        if not line or isinstance(line, str) and line.isspace():
+            continue  # Blank line
+        try:
+            values = extract(line)
+            if len(values) > len(FIELDS) and values[-1] not in ("", None):
+                row = _parse_month_values(*values)
+            else:
+                row = _parse_values(*values[:len(FIELDS)])
+        except (IndexError, KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"line {line_number}: {e!r}") from None
+        yield row
+
+
+def _jsonl_values(line: str) -> list:
+    record = json.loads(line)
+    return [record[field] for field in FIELDS] + [record.get("days_logged")]
+
+
+def _parse_values(telegram_id, day, quran_pages, salawat_count, tahajjud, book_pages, fasted) -> tuple:
+    return (
+        int(telegram_id),
+        date.fromisoformat(day).isoformat(),
+        _parse_count(quran_pages),
+        _parse_count(salawat_count),
+        _parse_bool(tahajjud),
+        _parse_count(book_pages),
+        _parse_bool(fasted),
+    )
+
+
+def _parse_month_values(
+    telegram_id, month, quran_pages, salawat_count, tahajjud_days, book_pages, fasting_days, days_logged
+) -> tuple:
+    if len(month) != 7:
+        raise ValueError(f"not a YYYY-MM month: {month!r}")
+    date.fromisoformat(f"{month}-01")
+    return (
+        int(telegram_id),
+        month,
+        _parse_count(quran_pages),
+        _parse_count(salawat_count),
+        _parse_count(tahajjud_days),
+        _parse_count(book_pages),
+        _parse_count(fasting_days),
+        _parse_count(days_logged),
+    )
+
+
+def _parse_count(value) -> int:
+    count = int(value)
+    if count < 0:
+        raise ValueError(f"negative count: {value!r}")
+    return count
+
+
+def _parse_bool(value) -> int:
+    if isinstance(value, bool):
+        return int(value)
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return 1
+    if text in FALSE_VALUES:
+        return 0
+    raise ValueError(f"not a yes/no value: {value!r}")
+
+
+def guess_format(path: str, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    return "jsonl" if os.path.splitext(path)[1].lower() in (".jsonl", ".json") else "csv"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import daily progress.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="write all progress to a file or stdout")
+    export_parser.add_argument("--format", choices=FORMATS)
+    export_parser.add_argument("-o", "--output", help="file to write (default: stdout)")
+
+    import_parser = commands.add_parser("import", help="upsert progress from a file")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--format", choices=FORMATS)
+
+    args = parser.parse_args()
+    if DATABASE_BACKEND != "sqlite":
+        sys.exit("progress_io works on the SQLite database; with PostgreSQL use COPY")
+    db.init_db()
+
+    if args.command == "export":
+        if args.output:
+            count = export_file(args.output, guess_format(args.output, args.format))
+        else:
+            count = export_progress(sys.stdout, args.format or "csv")
+        print(f"Exported {count} rows", file=sys.stderr)
+    else:
+        fmt = guess_format(args.file, args.format)
+        with open(args.file, newline="", encoding="utf-8") as file:
+            try:
+                count = import_progress(file, fmt)
+            except ValueError as e:
+                sys.exit(f"Import stopped at {e}; earlier batches were kept")
+        print(f"Imported {count} rows", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,81 +1,429 @@
-from datetime import datetime
+import asyncio
+import functools
+import heapq
+import logging
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
 from zoneinfo import ZoneInfo
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
-from telegram import Bot
 
-import database as db
-from config import TIMEZONE
+import async_db as db
+import messages
+import metrics
+import timezones
+from config import ARCHIVE_AFTER_DAYS, REMINDER_ENGINE, REMINDER_GRACE_MINUTES, REMINDER_NUDGE_AFTER, TIMEZONE
+from delivery import SENT, SendQueue
+from models import User
+
+logger = logging.getLogger(__name__)
+
+# Pause between archive batches, vacuum steps and reminder_log pruning
+# batches, so reminders and /log writes get the database in between
+ARCHIVE_PAUSE = 0.05
+
+# How often the list of timezones in use is re-read (see _refresh_offsets),
+# and the timer engine's reminder minutes with it
+ZONE_RELOAD_INTERVAL = timedelta(hours=1)
+
+# UTC offsets, and so DST transitions, fall on quarter hours; the timer
+# engine wakes at least this often (in seconds) to notice them
+TRANSITION_CHECK_INTERVAL = 15 * 60
+
+# Missed reminder minutes within this window are caught up on, after a
+# restart or a stall. A timer may run late by the window plus the minute
+# it is checked in, like the cron engine's minute-by-minute catch-up.
+CATCH_UP_WINDOW = timedelta(minutes=REMINDER_GRACE_MINUTES)
+MAX_TIMER_DELAY = CATCH_UP_WINDOW.total_seconds() + 60
+
+# Days of reminder_log kept; only the last two matter for de-duplication
+REMINDER_LOG_DAYS = 7
+
+DAY_SECONDS = 24 * 60 * 60
 
 
 class ReminderScheduler:
-    def __init__(self, bot: Bot):
-        self.bot = bot
+    """Sends each user's daily reminder at their reminder time.
+
+    Two engines find who is due. "cron" checks every minute. "timer" keeps
+    the UTC minutes of the day that have reminders (or nudges, see
+    REMINDER_NUDGE_AFTER) in a heap ordered by their next firing, sleeps
+    until the first one and sends to everyone due then in one batch;
+    handlers call reschedule() when a user's reminder moves, so a new
+    minute gets a timer. Nudges follow when a reminder was actually sent,
+    so one sent late gets a timer of its own (see _add_nudge_timers).
+    """
+
+    def __init__(self, send_queue: SendQueue, engine: str = REMINDER_ENGINE):
+        self.send_queue = send_queue
+        self.engine = engine
         self.scheduler = AsyncIOScheduler(timezone=ZoneInfo(TIMEZONE))
-        self._scheduled_users: set[str] = set()
+        # User's local date -> ids of users reminded, the fast path in front
+        # of reminder_log; dates more than a day behind UTC are dropped
+        self._reminded: dict[date, set[int]] = {}
+        self._checked_until: Optional[datetime] = None
+        # Report tasks -> the deliveries they wait for
+        self._pending: dict[asyncio.Task, list[asyncio.Future]] = {}
+        # Timezone -> the UTC offset users' reminder minutes were last computed at
+        self._offsets: dict[Optional[str], Optional[int]] = {}
+        self._zones_loaded_at: Optional[datetime] = None
+        # Timer engine: UTC minutes of the day with reminders, and
+        # (timestamp, minute) of their next firing
+        self._minutes: set[int] = set()
+        self._timers: list[tuple[float, int]] = []
+        # Minute -> timestamp of nudge timers for reminders sent after their
+        # own minute, kept across reloads until they have fired
+        self._late_nudges: dict[int, float] = {}
+        self._timers_loaded_at: Optional[datetime] = None
+        self._wakeup = asyncio.Event()
+        self._timer_task: Optional[asyncio.Task] = None
 
     def start(self):
         """Start the scheduler and schedule initial jobs."""
-        # Run check every minute to handle user-specific times
+        if self.engine == "timer":
+            self._timer_task = asyncio.create_task(self._run_timers(), name="reminder_timers")
+        else:
+            # Run check every minute to handle user-specific times
+            self.scheduler.add_job(
+                self._check_and_send_reminders,
+                CronTrigger(minute="*"),
+                id="reminder_check",
+                replace_existing=True
+            )
         self.scheduler.add_job(
-            self._check_and_send_reminders,
-            CronTrigger(minute="*"),
-            id="reminder_check",
+            self._prune_reminder_log,
+            CronTrigger(hour=3, minute=15),
+            id="prune_reminder_log",
             replace_existing=True
         )
+        if ARCHIVE_AFTER_DAYS:
+            self.scheduler.add_job(
+                self._archive_old_progress,
+                CronTrigger(hour=3, minute=30),
+                id="archive_progress",
+                replace_existing=True
+            )
         self.scheduler.start()
 
-    def stop(self):
-        """Stop the scheduler."""
+    async def stop(self):
+        """Stop the scheduler, before the send queue.
+
+        Reminders and nudges still waiting in the queue are withdrawn and
+        their claims given back, so the next run sends them; ones already
+        being sent are waited for and recorded.
+        """
+        if self._timer_task:
+            self._timer_task.cancel()
+            await asyncio.gather(self._timer_task, return_exceptions=True)
         self.scheduler.shutdown()
+        for deliveries in self._pending.values():
+            self.send_queue.cancel(deliveries)
+        await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def reschedule(self, telegram_id: int):
+        """Make sure the timer engine fires at this user's reminder minute.
+
+        Call after a user's reminder time, timezone or DM permission
+        changes. Minutes nobody is due at any more are dropped at the
+        hourly reload, so only a new minute needs handling here.
+        """
+        if self._timer_task is None:
+            return
+        user = await db.get_user(telegram_id)
+        if not user or not user.can_dm:
+            return
+        now = time.time()
+        minute = timezones.utc_minute(user.reminder_time, timezones.utc_offset(user.timezone))
+        for minute in self._timer_minutes([minute]) - self._minutes:
+            self._minutes.add(minute)
+            heapq.heappush(self._timers, (self._next_firing(minute, now - now % 60), minute))
+            self._wakeup.set()
 
     async def _check_and_send_reminders(self):
-        """Check if any users should receive reminders at current time."""
-        now = datetime.now(ZoneInfo(TIMEZONE))
-        current_time = now.strftime("%H:%M")
-        today_str = now.date().isoformat()
-
-        # Clean old entries at the start of each check
-        self._scheduled_users = {
-            k for k in self._scheduled_users
-            if today_str in k
+        """Send reminders due this UTC minute, and any missed since the last check.
+
+        After a restart or a skipped tick, minutes back to CATCH_UP_WINDOW
+        ago are checked too; reminder_log keeps anyone reminded before the
+        restart from getting a second one.
+        """
+        now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        if self._checked_until is None:
+            await self._release_stale_claims()
+        await self._refresh_offsets(now)
+        minute = now - CATCH_UP_WINDOW
+        if self._checked_until is not None:
+            minute = max(minute, self._checked_until + timedelta(minutes=1))
+        while minute <= now:
+            await self._send_due(minute)
+            minute += timedelta(minutes=1)
+        self._checked_until = now
+
+    async def _run_timers(self):
+        """The timer engine: sleep until the next minute with reminders, then send them."""
+        while True:
+            self._wakeup.clear()
+            try:
+                wake_at = await self._fire_timers()
+            except Exception:
+                logger.exception("Reminder timers failed; retrying in a minute")
+                wake_at = time.time() + 60
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0.0, wake_at - time.time()))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire_timers(self) -> float:
+        """Send the reminders whose time has come; returns when to wake next."""
+        now = datetime.now(timezone.utc)
+        rescheduled = await self._refresh_offsets(now)
+        if self._timers_loaded_at is None:
+            # First load: minutes within the catch-up window are overdue
+            await self._release_stale_claims()
+            await self._load_timers(now, now - CATCH_UP_WINDOW)
+        elif rescheduled or now - self._timers_loaded_at >= ZONE_RELOAD_INTERVAL:
+            await self._load_timers(now, now)
+
+        while self._timers and self._timers[0][0] <= time.time():
+            fire_at, minute = heapq.heappop(self._timers)
+            late = time.time() - fire_at
+            if late > MAX_TIMER_DELAY:
+                logger.warning("Skipped reminders for %02d:%02d UTC, %.0fs late", *divmod(minute, 60), late)
+            else:
+                await self._send_due(datetime.fromtimestamp(fire_at, timezone.utc))
+            heapq.heappush(self._timers, (fire_at + DAY_SECONDS, minute))
+
+        now_ts = time.time()
+        next_check = now_ts - now_ts % TRANSITION_CHECK_INTERVAL + TRANSITION_CHECK_INTERVAL
+        return min(self._timers[0][0], next_check) if self._timers else next_check
+
+    async def _release_stale_claims(self):
+        """Make reminders a previous run claimed but never sent claimable again."""
+        released = await db.release_pending_reminders()
+        if released:
+            logger.info("Released %d reminders claimed but not sent before the restart", released)
+
+    async def _load_timers(self, now: datetime, since: datetime):
+        """Rebuild the timer heap from the reminder minutes in the database.
+
+        Each minute's timer is set for its first start from the beginning
+        of `since`'s minute on, so a timer loaded during its own minute, or
+        earlier ones when catching up, fire straight away; anyone already
+        reminded is skipped.
+        """
+        since_ts = since.timestamp() - since.timestamp() % 60
+        self._late_nudges = {
+            minute: fire_at for minute, fire_at in self._late_nudges.items() if fire_at >= since_ts
         }
+        self._minutes = self._timer_minutes(await db.get_reminder_minutes()) | set(self._late_nudges)
+        self._timers = [(self._next_firing(minute, since_ts), minute) for minute in self._minutes]
+        heapq.heapify(self._timers)
+        self._timers_loaded_at = now
 
-        # Only get users who can receive DMs
-        users = db.get_users_for_reminders()
+    def _add_nudge_timers(self, sent_at: list[datetime]):
+        """Make sure the timer engine fires REMINDER_NUDGE_AFTER minutes after each send.
 
+        Reminders sent in their own minute already have that timer (see
+        _timer_minutes); ones a long queue pushed into later minutes may not.
+        """
+        if self._timer_task is None or not REMINDER_NUDGE_AFTER:
+            return
+        for sent in {int(at.timestamp()) // 60 * 60 for at in sent_at}:
+            fire_at = sent + REMINDER_NUDGE_AFTER * 60
+            minute = fire_at % DAY_SECONDS // 60
+            if minute in self._minutes:
+                continue
+            self._minutes.add(minute)
+            self._late_nudges[minute] = fire_at
+            heapq.heappush(self._timers, (fire_at, minute))
+            self._wakeup.set()
+
+    @staticmethod
+    def _timer_minutes(reminder_minutes: list[int]) -> set[int]:
+        """UTC minutes that need a timer: the reminder minutes and their nudges."""
+        minutes = set(reminder_minutes)
+        if REMINDER_NUDGE_AFTER:
+            minutes |= {(minute + REMINDER_NUDGE_AFTER) % 1440 for minute in reminder_minutes}
+        return minutes
+
+    @staticmethod
+    def _next_firing(minute: int, since: float) -> float:
+        """The first timestamp at or after `since` that `minute` of the UTC day starts."""
+        fire_at = since - since % DAY_SECONDS + minute * 60
+        return fire_at if fire_at >= since else fire_at + DAY_SECONDS
+
+    async def _send_due(self, now: datetime):
+        """Send reminders, and nudges, due at `now`'s UTC minute."""
+        # Local dates run from a day behind UTC to a day ahead
+        oldest = now.date() - timedelta(days=1)
+        for day in [day for day in self._reminded if day < oldest]:
+            del self._reminded[day]
+
+        # Only users who can receive DMs, are due this minute and haven't
+        # logged yet today
+        current_time = now.strftime("%H:%M UTC")
+        users, nudges = await db.get_users_due_for_reminder(now, REMINDER_NUDGE_AFTER)
+        deliveries = await self._send_reminders(now, users) if users else []
+        nudged = await self._send_nudges(nudges) if nudges else []
+        if not deliveries and not nudged:
+            return
+
+        # Don't hold up the next tick while the queue drains
+        task = asyncio.create_task(self._report(current_time, deliveries, nudged))
+        self._pending[task] = [delivery for _, _, delivery in deliveries + nudged]
+        task.add_done_callback(self._pending.pop)
+
+    async def _send_reminders(self, now: datetime, users: list[User]) -> list[tuple[int, date, asyncio.Future]]:
+        """Submit reminders to `users`; returns (user_id, local date, delivery) for each sent."""
+        # Skip anyone already reminded today in their own timezone: first by
+        # what this process has sent, then by claiming the rest in
+        # reminder_log, which remembers reminders from before a restart
+        pending = []
         for user in users:
-            if user.reminder_time == current_time:
-                # Check if already reminded today
-                today_key = f"{user.telegram_id}_{today_str}"
-                if today_key in self._scheduled_users:
-                    continue
+            day = now.astimezone(user.zone).date()
+            if user.id in self._reminded.get(day, ()):
+                metrics.REMINDERS.inc("skipped")
+            else:
+                pending.append((user, day))
+        if not pending:
+            return []
+        claimed = set(await db.claim_reminders([(user.id, day) for user, day in pending]))
 
-                self._scheduled_users.add(today_key)
-                await self._send_reminder(user.telegram_id)
+        # One text per language, shared by everyone who reads it
+        book = await db.get_setting("current_book")
+        texts = {
+            locale: messages.render_cached("reminder", locale, book=book)
+            for locale in {user.locale for user, _ in pending}
+        }
+        scheduled_at = now.replace(second=0, microsecond=0).timestamp()
+        deliveries = []
+        for user, day in pending:
+            self._reminded.setdefault(day, set()).add(user.id)
+            if user.id not in claimed:
+                metrics.REMINDERS.inc("skipped")
+                continue
 
-    async def _send_reminder(self, telegram_id: int):
-        """Send a reminder to a specific user."""
-        book_name = db.get_setting("current_book") or "таңдалған кітап"
-
-        try:
-            await self.bot.send_message(
-                chat_id=telegram_id,
-                text=(
-                    "Ассаламу алейкум! Күнделікті прогресс уақыты келді.\n\n"
-                    "Прогресті жазу үшін /log басыңыз:\n"
-                    "- Құран беттері\n"
-                    "- Салауат саны\n"
-                    "- Тахажжуд намазы\n"
-                    f"- \"{book_name}\" беттері\n"
-                    "- Ораза"
+            delivery = self.send_queue.submit(user.telegram_id, texts[user.locale])
+            if metrics.ENABLED:
+                delivery.add_done_callback(functools.partial(self._observe_lag, scheduled_at))
+            deliveries.append((user.id, day, delivery))
+        return deliveries
+
+    async def _send_nudges(self, nudges: list[tuple[User, date]]) -> list[tuple[int, date, asyncio.Future]]:
+        """Submit nudges for (user, date of their reminder) pairs.
+
+        Returns (user_id, date of the reminder, delivery) for each sent.
+        """
+        claimed = set(await db.claim_nudges([(user.id, day) for user, day in nudges]))
+        texts = {locale: messages.render_cached("nudge", locale) for locale in {user.locale for user, _ in nudges}}
+        return [
+            (user.id, day, self.send_queue.submit(user.telegram_id, texts[user.locale]))
+            for user, day in nudges if user.id in claimed
+        ]
+
+    async def _refresh_offsets(self, now: datetime) -> int:
+        """Reschedule reminders in any timezone whose UTC offset has changed.
+
+        Checking the known zones is in memory, so a query only happens at a
+        DST transition. The zones in use are re-read every
+        ZONE_RELOAD_INTERVAL, which also brings in ones set with /settz since
+        (their users' reminders are already right) and, after a restart,
+        catches up on any transition missed while the bot was down.
+        Returns the number of users rescheduled.
+        """
+        if self._zones_loaded_at is None or now - self._zones_loaded_at >= ZONE_RELOAD_INTERVAL:
+            self._offsets = {zone: None for zone in await db.get_timezones()}
+            self._zones_loaded_at = now
+        rescheduled = 0
+        for zone, offset in self._offsets.items():
+            current = timezones.utc_offset(zone, now)
+            if current == offset:
+                continue
+            updated = await db.refresh_utc_offsets(zone, current)
+            self._offsets[zone] = current
+            if updated:
+                rescheduled += updated
+                logger.info(
+                    "Rescheduled %d reminders in %s for UTC offset %+d min",
+                    updated, zone or TIMEZONE, current
                 )
-            )
-        except Exception as e:
-            print(f"Failed to send reminder to {telegram_id}: {e}")
-            # Mark user as unable to receive DMs
-            db.set_can_dm(telegram_id, False)
+        return rescheduled
+
+    async def _prune_reminder_log(self):
+        """Delete reminder_log days older than REMINDER_LOG_DAYS."""
+        before = datetime.now(timezone.utc).date() - timedelta(days=REMINDER_LOG_DAYS)
+        while await db.prune_reminder_log(before):
+            await asyncio.sleep(ARCHIVE_PAUSE)
+
+    async def _archive_old_progress(self):
+        """Roll days older than ARCHIVE_AFTER_DAYS into monthly totals."""
+        before = datetime.now(ZoneInfo(TIMEZONE)).date() - timedelta(days=ARCHIVE_AFTER_DAYS)
+        archived = 0
+        while moved := await db.archive_progress(before):
+            archived += moved
+            await asyncio.sleep(ARCHIVE_PAUSE)
+        if not archived:
+            return
+
+        # Give the freed pages back to the filesystem a step at a time
+        while await db.vacuum_step():
+            await asyncio.sleep(ARCHIVE_PAUSE)
+        logger.info("Archived %d days of progress older than %s", archived, before)
+
+    @staticmethod
+    def _observe_lag(scheduled_at: float, delivery: asyncio.Future):
+        if not delivery.cancelled() and delivery.result() == SENT:
+            metrics.REMINDER_LAG.observe(time.time() - scheduled_at)
+
+    async def _report(
+        self,
+        current_time: str,
+        deliveries: list[tuple[int, date, asyncio.Future]],
+        nudges: list[tuple[int, date, asyncio.Future]],
+    ):
+        # When each reminder finished, which its nudge is timed from
+        finished_at: dict[asyncio.Future, datetime] = {}
+        for _, _, delivery in deliveries:
+            delivery.add_done_callback(lambda done: finished_at.setdefault(done, datetime.now(timezone.utc)))
+        # Deliveries withdrawn by stop() come back as CancelledError
+        outcomes = await asyncio.gather(*(delivery for _, _, delivery in deliveries), return_exceptions=True)
+        nudge_outcomes = await asyncio.gather(*(delivery for _, _, delivery in nudges), return_exceptions=True)
+        recorded, unsent = [], []
+        for (user_id, day, delivery), outcome in zip(deliveries, outcomes):
+            if isinstance(outcome, str):
+                metrics.REMINDERS.inc(outcome)
+                sent_at = finished_at.get(delivery) or datetime.now(timezone.utc)
+                recorded.append((user_id, day, outcome, sent_at))
+            else:
+                unsent.append((user_id, day))
+        unsent_nudges = []
+        for (user_id, day, _), outcome in zip(nudges, nudge_outcomes):
+            if isinstance(outcome, str):
+                metrics.NUDGES.inc(outcome)
+            else:
+                unsent_nudges.append((user_id, day))
+        if recorded:
+            await db.record_reminder_outcomes(recorded)
+            self._add_nudge_timers([sent_at for _, _, outcome, sent_at in recorded if outcome == SENT])
+        if unsent:
+            await db.release_reminders(unsent)
+        if unsent_nudges:
+            await db.release_nudges(unsent_nudges)
+        sent = sum(1 for outcome in outcomes if outcome == SENT)
+        nudged = sum(1 for outcome in nudge_outcomes if outcome == SENT)
+        stats = self.send_queue.stats
+        logger.info(
+            "Reminders for %s: %d/%d sent, %d/%d nudges (queue depth %d, avg latency %.2fs, max %.2fs)",
+            current_time, sent, len(outcomes), nudged, len(nudge_outcomes), self.send_queue.depth,
+            stats.latency_avg, stats.latency_max
+        )
+
+    async def _send_reminder(self, telegram_id: int) -> str:
+        """Send a reminder to a specific user."""
+        user = await db.get_user(telegram_id)
+        book = await db.get_setting("current_book")
+        return await self.send_queue.send(telegram_id, messages.render_cached("reminder", user and user.locale, book=book))
 
     async def send_reminder_to_user(self, telegram_id: int):
         """Manually trigger a reminder for testing."""
@@ -0,0 +1,40 @@
+"""Timezone helpers for per-user reminders and dates.
+
+A user's timezone is an IANA name such as "Europe/Moscow", or None for the
+bot's default TIMEZONE. Reminders are scheduled by UTC minute of the day
+(0-1439), computed from the local reminder time and the zone's current UTC
+offset. The scheduler recomputes them when an offset changes (DST).
+"""
+from datetime import datetime, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from config import TIMEZONE
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def get_zone(name: Optional[str]) -> ZoneInfo:
+    # ZoneInfo caches instances by name, so this is cheap to repeat
+    return ZoneInfo(name or TIMEZONE)
+
+
+def parse_zone(name: str) -> Optional[str]:
+    """The zone name if it's a known IANA timezone, else None."""
+    try:
+        ZoneInfo(name)
+    except (KeyError, ValueError, OSError):  # Not found, malformed, or a directory
+        return None
+    return name
+
+
+def utc_offset(name: Optional[str], at: Optional[datetime] = None) -> int:
+    """Minutes the zone is ahead of UTC at `at` (default now)."""
+    at = at or datetime.now(timezone.utc)
+    return int(at.astimezone(get_zone(name)).utcoffset().total_seconds()) // 60
+
+
+def utc_minute(reminder_time: str, offset: int) -> int:
+    """UTC minute of the day for a local HH:MM at the given offset."""
+    hours, minutes = reminder_time.split(":")
+    return (int(hours) * 60 + int(minutes) - offset) % MINUTES_PER_DAY
@@ -0,0 +1,92 @@
+"""Webhook mode: receive updates over HTTP instead of long polling.
+
+Telegram POSTs each update as JSON to WEBHOOK_PATH with the secret in the
+X-Telegram-Bot-Api-Secret-Token header. Valid updates are put on the
+application's update queue and acknowledged immediately; the application
+processes them concurrently in the background.
+
+If WEBHOOK_URL is empty the webhook is not registered with Telegram, which
+is how it can be driven locally by POSTing recorded update JSON (see
+benchmarks/replay_updates.py, and checks/check_webhook.py for a run
+with no network at all).
+"""
+import asyncio
+import hmac
+import json
+import logging
+import signal
+from http import HTTPStatus
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+from config import WEBHOOK_LISTEN, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_URL
+from http_server import HttpServer, Request, Response
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+
+def webhook_handler(application: Application, secret: str):
+    """Build the HTTP handler that feeds POSTed updates to `application`."""
+    expected = secret.encode()
+
+    async def handle(request: Request) -> Response:
+        token = request.headers.get(SECRET_HEADER, "").encode()
+        if not hmac.compare_digest(token, expected):
+            return Response(HTTPStatus.FORBIDDEN, b"Forbidden")
+        try:
+            data = json.loads(request.body)
+            update = Update.de_json(data, application.bot)
+        except (ValueError, TypeError, KeyError):
+            return Response(HTTPStatus.BAD_REQUEST, b"Invalid update")
+        if update is None:
+            return Response(HTTPStatus.BAD_REQUEST, b"Invalid update")
+        await application.update_queue.put(update)
+        return Response(HTTPStatus.OK, b"OK")
+
+    return handle
+
+
+def create_server(application: Application, host: str = WEBHOOK_LISTEN, port: int = WEBHOOK_PORT) -> HttpServer:
+    server = HttpServer(host, port)
+    server.route("POST", WEBHOOK_PATH, webhook_handler(application, WEBHOOK_SECRET))
+    return server
+
+
+async def run_webhook(application: Application, server: HttpServer, stop: Optional[asyncio.Event] = None) -> None:
+    """Run `application` fed by `server` until SIGINT/SIGTERM, or until `stop` is set if given.
+
+    Mirrors Application.run_polling's lifecycle, including the post_init,
+    post_stop and post_shutdown hooks.
+    """
+    if stop is None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    try:
+        if WEBHOOK_URL:
+            await application.bot.set_webhook(
+                url=WEBHOOK_URL + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES
+            )
+        await server.start()
+        logger.info("Webhook mode: listening on %s:%d%s", server.host, server.port, WEBHOOK_PATH)
+        await stop.wait()
+    finally:
+        await server.stop()
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)